@@ -0,0 +1,357 @@
+"""
+Benchmark end-to-end pipeline: parser → cleaner → loader → feature + KMeans.
+
+Chạy từ thư mục gốc:
+    python -m benchmarks.bench_pipeline --repeats 3 --threshold 20
+
+Kết quả lưu theo commit ở benchmarks/results/<commit>.json (không commit vào
+git). Baseline mặc định là kết quả của commit merge-base với nhánh master (hoặc
+HEAD~1) nếu máy này đã chạy ở commit đó, không thì benchmarks/baseline.json
+(có commit vào git, cập nhật bằng --update-baseline). Nếu một stage chậm hơn
+baseline quá --threshold %, lệnh trả về exit code 1; không có baseline nào thì
+chỉ ghi kết quả và trả về 0.
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from src.extract.trip_parser import parse_trip_from_container_and_rating_tab
+from src.transform.cleaning.cleaning import clean_vexere
+
+RESULTS_DIR = "benchmarks/results"
+BASELINE_PATH = "benchmarks/baseline.json"
+SAMPLE_HTML = "data/site/vexere_trips_raw_sample.html"
+RAW_GLOB = "data/raw/*_raw.csv"
+PROCESSED_GLOB = "data/processed/*_cleaned.csv"
+DEFAULT_THRESHOLD_PCT = 20.0
+BASE_BRANCH = "master"
+
+
+class StageSkipped(Exception):
+    """Stage không chạy được trên máy hiện tại (ví dụ không có Postgres)."""
+
+
+# ====================================
+#           STAGES
+# ====================================
+# Mỗi stage trả về (hàm chạy một lần, số dòng/chuyến được xử lý)
+def bench_parse(args) -> tuple[Callable, int]:
+    """Parse từng chuyến trong trang mẫu (container + toàn trang như khi crawl)."""
+    with open(SAMPLE_HTML, "r", encoding="utf-8") as f:
+        page_html = f.read()
+
+    soup = BeautifulSoup(page_html, "html.parser")
+    containers = [
+        str(c)
+        for c in soup.select("div.container")
+        if c.select_one(".bus-rating-button")
+    ][: args.parse_trips]
+
+    def run():
+        for container_html in containers:
+            parse_trip_from_container_and_rating_tab(container_html, page_html)
+
+    return run, len(containers)
+
+
+def bench_clean(args) -> tuple[Callable, int]:
+    """clean_vexere trên từng file data/raw."""
+    raw_dfs = [pd.read_csv(f) for f in sorted(glob.glob(RAW_GLOB))]
+
+    def run():
+        for df in raw_dfs:
+            clean_vexere(df.copy())
+
+    return run, sum(len(df) for df in raw_dfs)
+
+
+def bench_load(args) -> tuple[Callable, int]:
+    """insert_trips_from_dataframe vào Postgres local (database riêng cho benchmark)."""
+    try:
+        from src.database.db_manager import DatabaseManager
+        from src.database.migrate import apply_migrations
+        from src.load.loading import insert_trips_from_dataframe
+
+        db = DatabaseManager.from_config(database=args.bench_db)
+    except Exception as e:
+        raise StageSkipped(f"{type(e).__name__}: {e}")
+
+    # Tạo bảng nếu database benchmark còn trống
+    if db.fetch_one("SELECT to_regclass('public.trips')")[0] is None:
+        with open("src/sql/schema.sql", "r", encoding="utf-8") as f:
+            db.execute(f.read())
+    apply_migrations(db)
+
+    files = sorted(glob.glob(PROCESSED_GLOB))[: args.load_files]
+    df = pd.concat([pd.read_csv(f) for f in files], ignore_index=True)
+
+    def run():
+        db.execute(
+            "TRUNCATE trips, company_route_ratings, routes, cities, bus_companies "
+            "RESTART IDENTITY CASCADE"
+        )
+        insert_trips_from_dataframe(db, df)
+
+    return run, len(df)
+
+
+def bench_features_kmeans(args) -> tuple[Callable, int]:
+    """feature_engineering + RobustScaler + KMeans(K=3) trên toàn bộ data/processed."""
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import RobustScaler
+
+    from src.ml.features import feature_engineering
+
+    features = [
+        "wilson_score",
+        "log_price",
+        "fairness_index",
+        "trust_score",
+        "service_score",
+    ]
+    df = pd.concat(
+        [pd.read_csv(f) for f in sorted(glob.glob(PROCESSED_GLOB))],
+        ignore_index=True,
+    )
+
+    def run():
+        df_fe = feature_engineering(df)
+        X = df_fe[features].dropna().drop_duplicates()
+        X_scaled = RobustScaler().fit_transform(X)
+        KMeans(n_clusters=3, random_state=40, n_init=10).fit(X_scaled)
+
+    return run, len(df)
+
+
+def bench_features_scale(args) -> tuple[Callable, int]:
+    """feature_engineering trên --feature-rows dòng (lấy mẫu lặp từ data/processed)."""
+    import numpy as np
+
+    from src.ml.features import NUMERIC_COLS, feature_engineering
+
+    history = pd.concat(
+        [
+            pd.read_csv(f, usecols=NUMERIC_COLS)
+            for f in sorted(glob.glob(PROCESSED_GLOB))
+        ],
+        ignore_index=True,
+    )
+    rng = np.random.default_rng(0)
+    df = history.iloc[rng.integers(0, len(history), args.feature_rows)]
+    df = df.reset_index(drop=True)
+
+    def run():
+        feature_engineering(df)
+
+    return run, len(df)
+
+
+STAGES = {
+    "parse": bench_parse,
+    "clean": bench_clean,
+    "load": bench_load,
+    "features_kmeans": bench_features_kmeans,
+    "features_scale": bench_features_scale,
+}
+# Stage nặng (mặc định 10M dòng) chỉ chạy khi chỉ định qua --stages
+DEFAULT_STAGES = ["parse", "clean", "load", "features_kmeans"]
+
+
+# ====================================
+#           HARNESS
+# ====================================
+def git_commit() -> str:
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+        dirty = subprocess.check_output(
+            ["git", "status", "--porcelain", "-uno"], stderr=subprocess.DEVNULL
+        )
+        return f"{commit}-dirty" if dirty.strip() else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_stage(name: str, args) -> dict:
+    try:
+        run, rows = STAGES[name](args)
+    except StageSkipped as e:
+        print(f"[{name}] SKIPPED: {e}")
+        return {"status": "skipped", "reason": str(e)}
+
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run()
+        timings.append(time.perf_counter() - start)
+
+    median_s = statistics.median(timings)
+    print(
+        f"[{name}] median {median_s:.3f}s over {args.repeats} runs | "
+        f"{rows} rows | {rows / median_s:,.0f} rows/s"
+    )
+    return {
+        "status": "ok",
+        "median_s": median_s,
+        "runs_s": timings,
+        "rows": rows,
+        "rows_per_s": rows / median_s,
+    }
+
+
+def baseline_commit(base_branch: str = BASE_BRANCH) -> str | None:
+    """
+    Commit baseline mặc định: merge-base của HEAD với base_branch.
+
+    Nếu HEAD đã nằm trên base_branch (merge-base chính là HEAD) hoặc không có
+    base_branch thì dùng HEAD~1.
+    """
+
+    def rev(*args) -> str:
+        return subprocess.check_output(
+            ["git", *args], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+
+    try:
+        head = rev("rev-parse", "HEAD")
+        try:
+            base = rev("merge-base", "HEAD", base_branch)
+        except subprocess.CalledProcessError:
+            base = head
+        if base == head:
+            base = rev("rev-parse", "HEAD~1")
+        return rev("rev-parse", "--short", base)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def find_baseline(baseline: str | None, base_branch: str = BASE_BRANCH) -> dict | None:
+    """
+    Baseline: file / commit chỉ định qua --baseline (thiếu thì FileNotFoundError).
+
+    Mặc định: kết quả local của baseline_commit() nếu có, không thì
+    BASELINE_PATH (commit trong repo nên checkout mới / CI vẫn có); không có
+    cả hai thì None (chỉ ghi kết quả, không so sánh).
+    """
+    if baseline is not None:
+        path = (
+            baseline if baseline.endswith(".json") else f"{RESULTS_DIR}/{baseline}.json"
+        )
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"Chưa có kết quả baseline {path}: chạy benchmark ở commit {baseline} trước"
+            )
+    else:
+        commit = baseline_commit(base_branch)
+        path = f"{RESULTS_DIR}/{commit}.json"
+        if commit is None or not os.path.exists(path):
+            path = BASELINE_PATH
+        if not os.path.exists(path):
+            return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(current: dict, baseline: dict, threshold_pct: float) -> list[str]:
+    """Danh sách stage chậm hơn baseline quá threshold_pct %."""
+    regressions = []
+    for name, stage in current["stages"].items():
+        base = baseline["stages"].get(name)
+        if stage["status"] != "ok" or not base or base.get("status") != "ok":
+            continue
+        change_pct = (stage["median_s"] / base["median_s"] - 1) * 100
+        flag = "REGRESSION" if change_pct > threshold_pct else "ok"
+        print(
+            f"  {name:<16} {base['median_s']:.3f}s → {stage['median_s']:.3f}s "
+            f"({change_pct:+.1f}%) {flag}"
+        )
+        if change_pct > threshold_pct:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark pipeline Vexere")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=DEFAULT_STAGES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD_PCT)
+    parser.add_argument(
+        "--baseline",
+        help="commit hoặc đường dẫn file JSON baseline "
+        "(mặc định: kết quả merge-base của HEAD với --base-branch hoặc HEAD~1, "
+        f"không có thì {BASELINE_PATH})",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help=f"ghi kết quả lần chạy này vào {BASELINE_PATH} (commit file này vào git)",
+    )
+    parser.add_argument("--base-branch", default=BASE_BRANCH)
+    parser.add_argument("--parse-trips", type=int, default=5)
+    parser.add_argument("--load-files", type=int, default=1)
+    parser.add_argument("--bench-db", default="vexere_bench")
+    parser.add_argument("--feature-rows", type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    commit = git_commit()
+    result = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "machine": platform.platform(),
+        "stages": {name: run_stage(name, args) for name in args.stages},
+    }
+
+    # Chạy lại một vài stage trên cùng commit: giữ kết quả các stage còn lại
+    result_path = f"{RESULTS_DIR}/{commit}.json"
+    if os.path.exists(result_path):
+        with open(result_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        result["stages"] = previous["stages"] | result["stages"]
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Đã cập nhật baseline {BASELINE_PATH}")
+        return 0
+
+    try:
+        baseline = find_baseline(args.baseline, args.base_branch)
+    except FileNotFoundError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+    if baseline is None:
+        print(f"Chưa có baseline: chỉ ghi kết quả vào {result_path}")
+        return 0
+
+    print(f"So sánh với baseline {baseline['commit']} (ngưỡng {args.threshold}%):")
+    regressions = compare(result, baseline, args.threshold)
+    if regressions:
+        print(f"FAIL: {', '.join(regressions)} chậm hơn {args.threshold}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Load test cho HTTP scoring service (src/ml/serving.py) trên localhost.
+
+Chạy từ thư mục gốc (tự khởi động service trong process nếu không có --url):
+    python -m benchmarks.load_test_serving --requests 5000 --concurrency 8
+
+In p50 / p99 latency cho request một chuyến và request theo lô, đồng thời
+ghi vào benchmarks/results/<commit>.json cùng chỗ với bench_pipeline.
+"""
+
+import argparse
+import glob
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_pipeline import PROCESSED_GLOB, RESULTS_DIR, git_commit
+from src.ml.artifacts import MODEL_DIR, latest_artifact_path
+from src.ml.features import NUMERIC_COLS
+from src.ml.serving import make_server
+
+
+def sample_trips(n: int, seed: int = 0) -> list[dict]:
+    df = pd.concat(
+        [
+            pd.read_csv(f, usecols=NUMERIC_COLS)
+            for f in sorted(glob.glob(PROCESSED_GLOB))
+        ],
+        ignore_index=True,
+    )
+    rows = df.sample(n, replace=True, random_state=seed)
+    return rows.to_dict(orient="records")
+
+
+def run_load(host: str, port: int, bodies: list[bytes], concurrency: int) -> np.ndarray:
+    """Gửi toàn bộ bodies (mỗi worker một kết nối keep-alive), trả về latency (s)."""
+    latencies = np.empty(len(bodies))
+    headers = {"Content-Type": "application/json"}
+
+    def worker(worker_id: int):
+        conn = http.client.HTTPConnection(host, port)
+        for i in range(worker_id, len(bodies), concurrency):
+            start = time.perf_counter()
+            conn.request("POST", "/predict", bodies[i], headers)
+            response = conn.getresponse()
+            response.read()
+            latencies[i] = time.perf_counter() - start
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+        conn.close()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return latencies
+
+
+def summarize(name: str, latencies: np.ndarray, wall_s: float, trips: int) -> dict:
+    result = {
+        "status": "ok",
+        "requests": len(latencies),
+        "trips_per_request": trips,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "mean_ms": float(latencies.mean() * 1000),
+        "requests_per_s": len(latencies) / wall_s,
+        # median_s để bench_pipeline.compare kiểm tra regression như các stage khác
+        "median_s": float(np.percentile(latencies, 50)),
+    }
+    print(
+        f"[{name}] {result['requests']} requests x {trips} trips | "
+        f"p50 {result['p50_ms']:.2f} ms | p99 {result['p99_ms']:.2f} ms | "
+        f"{result['requests_per_s']:,.0f} req/s"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test scoring service")
+    parser.add_argument("--url", help="Service đang chạy, ví dụ http://127.0.0.1:8502")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url = urlparse(args.url)
+        host, port = url.hostname, url.port
+    else:
+        artifact_path = latest_artifact_path(MODEL_DIR)
+        if artifact_path is None:
+            parser.error("Chưa có artifact, chạy `python -m src.ml.artifacts` trước")
+        server = make_server(artifact_path, "127.0.0.1", 0)
+        host, port = server.server_address
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    trips = sample_trips(args.requests)
+    n_batches = max(args.requests // args.batch_size, 1)
+    cases = {
+        "serving_single": [json.dumps(trip).encode() for trip in trips],
+        "serving_batch": [
+            json.dumps({"trips": trips[i::n_batches]}).encode()
+            for i in range(n_batches)
+        ],
+    }
+
+    stages = {}
+    for name, bodies in cases.items():
+        run_load(host, port, bodies[: args.concurrency], args.concurrency)  # warm-up
+        start = time.perf_counter()
+        latencies = run_load(host, port, bodies, args.concurrency)
+        wall_s = time.perf_counter() - start
+        trips_per_request = 1 if name == "serving_single" else args.batch_size
+        stages[name] = summarize(name, latencies, wall_s, trips_per_request)
+
+    if server is not None:
+        server.shutdown()
+
+    commit = git_commit()
+    result_path = f"{RESULTS_DIR}/{commit}.json"
+    result = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "stages": stages,
+    }
+    if os.path.exists(result_path):
+        with open(result_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        result = previous | {"stages": previous["stages"] | stages}
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"- Đã lưu kết quả vào {result_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""
+Site giả lập vexere.com trên localhost để đo tốc độ crawl lặp lại được.
+
+Server phát lại trang đã ghi (data/site/vexere_trips_raw_sample.html) và giả
+lập đủ các phần crawler dùng, để set_search_filters, show_more_trips và
+crawl_and_parse_each_trip chạy nguyên vẹn:
+- ô #from_input / #to_input, lịch chọn ngày (section id "MM-YYYY", p.day),
+  nút .button-search -> /search?from=...&to=...&date=DD/MM/YYYY;
+- nút "Xem thêm chuyến" tải thêm PAGE_SIZE chuyến qua /api/trips?page=N,
+  tới --trips chuyến thì nút biến mất;
+- nút rating mở / đóng drawer (.detail-rating, .overall-rating) lấy từ
+  /api/rating?ticket=ID, điểm lấy theo rating của chính chuyến đó.
+Mọi request đều bị trễ --latency-ms (± --jitter) để mô phỏng mạng.
+
+Chạy từ thư mục gốc:
+    python -m benchmarks.replay_site --serve --port 8765      # chỉ chạy server
+    python -m benchmarks.replay_site --trips 100 --latency-ms 150 --runs 3
+
+Chế độ benchmark chạy crawl_vexere (Chrome headless) với base_url trỏ vào
+server, in số chuyến / phút và ghi stage "crawl_replay" vào
+benchmarks/results/<commit>.json cùng chỗ với bench_pipeline.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import threading
+import time
+from datetime import date, datetime
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bs4 import BeautifulSoup
+
+from benchmarks.bench_pipeline import RESULTS_DIR, SAMPLE_HTML, git_commit
+
+PAGE_SIZE = 20
+DEFAULT_TRIPS = 100
+DEFAULT_LATENCY_MS = 150
+WEEKDAYS = ["T2", "T3", "T4", "T5", "T6", "T7", "CN"]
+# Chỗ đánh dấu trong HTML đã tiền xử lý
+TICKETS_MARK = "<!--replay:tickets-->"
+TICKET_MARK = "__replay_ticket__"
+SCORE_MARK = "__replay_score__"
+WIDTH_MARK = "__replay_width__"
+FIELD_MARKS = {
+    "from": "__replay_from__",
+    "to": "__replay_to__",
+    "date_label": "__replay_date_label__",
+    "date": "__replay_date__",
+}
+
+# Hành vi trang: event delegation trên document nên áp dụng được cho cả các
+# chuyến / drawer chèn thêm sau này
+CLIENT_JS = """
+(function () {
+  var page = 1;
+  function pad(n) { return (n < 10 ? "0" : "") + n; }
+
+  function showCalendar(host) {
+    var cal = document.getElementById("replay-calendar");
+    if (cal) { cal.style.display = "block"; return; }
+    cal = document.createElement("div");
+    cal.id = "replay-calendar";
+    var now = new Date();
+    for (var m = 0; m < 3; m++) {
+      var first = new Date(now.getFullYear(), now.getMonth() + m, 1);
+      var last = new Date(first.getFullYear(), first.getMonth() + 1, 0).getDate();
+      var section = document.createElement("section");
+      section.id = pad(first.getMonth() + 1) + "-" + first.getFullYear();
+      for (var d = 1; d <= last; d++) {
+        var p = document.createElement("p");
+        p.className = "day";
+        p.textContent = d;
+        p.setAttribute("data-date", pad(d) + "/" + section.id.replace("-", "/"));
+        section.appendChild(p);
+      }
+      cal.appendChild(section);
+    }
+    host.parentNode.insertBefore(cal, host.nextSibling);
+  }
+
+  function loadMore(btn) {
+    if (btn.disabled) return;
+    btn.disabled = true;
+    fetch("/api/trips?page=" + (page + 1) + "&" + location.search.slice(1))
+      .then(function (r) {
+        var hasMore = r.headers.get("X-Has-More") === "1";
+        return r.text().then(function (html) { return [html, hasMore]; });
+      })
+      .then(function (res) {
+        page += 1;
+        var box = btn.closest(".load-more-container");
+        box.insertAdjacentHTML("beforebegin", res[0]);
+        if (res[1]) { btn.disabled = false; } else { box.remove(); }
+      });
+  }
+
+  function toggleRating(star) {
+    var box = star.closest(".bus-item, .container");
+    if (star.getAttribute("data-open") === "1") {
+      star.removeAttribute("data-open");
+      var drawer = box.querySelector(".replay-drawer");
+      if (drawer) drawer.remove();
+      return;
+    }
+    star.setAttribute("data-open", "1");
+    var ticket = star.closest("[id^=ticket-]").id;
+    fetch("/api/rating?ticket=" + encodeURIComponent(ticket))
+      .then(function (r) { return r.text(); })
+      .then(function (html) {
+        // Đã bấm đóng trước khi drawer tải xong -> bỏ
+        if (star.getAttribute("data-open") === "1") {
+          box.insertAdjacentHTML("beforeend", html);
+        }
+      });
+  }
+
+  document.addEventListener("click", function (e) {
+    var t = e.target;
+    var day = t.closest("p.day");
+    if (day) {
+      var parts = day.getAttribute("data-date").split("/");
+      var d = new Date(+parts[2], +parts[1] - 1, +parts[0]);
+      var label = ["CN", "T2", "T3", "T4", "T5", "T6", "T7"][d.getDay()];
+      var value = document.querySelector(".date-input-value");
+      value.textContent = label + ", " + day.getAttribute("data-date");
+      value.setAttribute("data-date", day.getAttribute("data-date"));
+      document.getElementById("replay-calendar").style.display = "none";
+      return;
+    }
+    var select = t.closest(".departure-date-select");
+    if (select) { showCalendar(select); return; }
+    if (t.closest(".button-search")) {
+      location.href = "/search?" + new URLSearchParams({
+        from: document.getElementById("from_input").value,
+        to: document.getElementById("to_input").value,
+        date: document.querySelector(".date-input-value").getAttribute("data-date"),
+      });
+      return;
+    }
+    var more = t.closest(".load-more");
+    if (more) { loadMore(more); return; }
+    var star = t.closest(".bus-rating-button");
+    if (star) toggleRating(star);
+  });
+})();
+"""
+
+
+def date_label(day: date) -> str:
+    """date(2025, 10, 11) -> "T7, 11/10/2025" (giống p.date-input-value)."""
+    return f"{WEEKDAYS[day.weekday()]}, {day:%d/%m/%Y}"
+
+
+def _bus_rating(ticket) -> float | None:
+    span = ticket.select_one(".bus-rating span")
+    match = re.match(r"\s*([\d.]+)", span.get_text() if span else "")
+    return float(match.group(1)) if match else None
+
+
+# ====================================
+#           SITE (HTML ĐÃ GHI)
+# ====================================
+class ReplaySite:
+    """
+    Trang đã ghi được tách một lần thành: khung trang (không script / link
+    ngoài / ảnh), các mẫu chuyến và một mẫu drawer rating. Chuyến thứ n là mẫu
+    n % số mẫu với id riêng, nên --trips lớn hơn trang ghi vẫn phát được.
+    """
+
+    def __init__(self, path: str = SAMPLE_HTML, trips: int = DEFAULT_TRIPS):
+        with open(path, "r", encoding="utf-8") as f:
+            soup = BeautifulSoup(f.read(), "html.parser")
+
+        for tag in soup.find_all(["script", "link", "iframe", "noscript"]):
+            tag.decompose()
+        for img in soup.find_all("img"):
+            img.attrs.pop("src", None)
+            img.attrs.pop("srcset", None)
+
+        # Drawer đang mở trong trang ghi -> mẫu drawer, rồi gỡ khỏi chuyến
+        drawers = soup.select("[class*=DetailInfo__DetailContainer]")
+        self.drawer_template = self._drawer_template(drawers[0])
+        for drawer in drawers:
+            drawer.decompose()
+
+        tickets = soup.select("#infinity-scroll [id^=ticket-]")
+        self.ratings = [_bus_rating(t) for t in tickets]
+        for ticket in tickets:
+            ticket["id"] = f"ticket-replay-{TICKET_MARK}"
+        self.templates = [str(t) for t in tickets]
+
+        scroll = soup.select_one("#infinity-scroll")
+        for child in list(scroll.children):
+            if getattr(child, "name", None):
+                child.decompose()
+        scroll.append(BeautifulSoup(TICKETS_MARK, "html.parser"))
+
+        script = soup.new_tag("script")
+        script.string = CLIENT_JS
+        soup.body.append(script)
+
+        soup.select_one("#from_input")["value"] = FIELD_MARKS["from"]
+        soup.select_one("#to_input")["value"] = FIELD_MARKS["to"]
+        date_value = soup.select_one("p.date-input-value")
+        date_value.string = FIELD_MARKS["date_label"]
+        date_value["data-date"] = FIELD_MARKS["date"]
+        self.shell = str(soup)
+        self.trips = trips
+
+    @staticmethod
+    def _drawer_template(drawer) -> str:
+        drawer["class"] = drawer.get("class", []) + ["replay-drawer"]
+        for score in drawer.select(".rate-title-score, .overall-rating p"):
+            score.string = SCORE_MARK
+        for bar in drawer.select(".detail-rating .progress"):
+            bar["style"] = f"width: {WIDTH_MARK}%;"
+        return str(drawer)
+
+    # ---------- PAGES ----------
+    def _page(self, start: str, dest: str, day: date, tickets: str) -> str:
+        html = self.shell
+        values = {
+            "from": start,
+            "to": dest,
+            "date_label": date_label(day),
+            "date": f"{day:%d/%m/%Y}",
+        }
+        for field, mark in FIELD_MARKS.items():
+            html = html.replace(mark, escape(values[field]), 1)
+        return html.replace(TICKETS_MARK, tickets, 1)
+
+    def home_page(self) -> str:
+        return self._page("", "", date.today(), "")
+
+    def search_page(self, start: str, dest: str, day: date) -> str:
+        html = self.trips_page(1)
+        if self.has_more(1):
+            html += (
+                '<div class="load-more-container"><button type="button" '
+                'class="ant-btn load-more ant-btn-primary">'
+                "<span>Xem thêm chuyến</span></button></div>"
+            )
+        return self._page(start, dest, day, html)
+
+    def trips_page(self, page: int) -> str:
+        first = (page - 1) * PAGE_SIZE
+        return "".join(
+            self.templates[n % len(self.templates)].replace(TICKET_MARK, str(n), 1)
+            for n in range(first, min(first + PAGE_SIZE, self.trips))
+        )
+
+    def has_more(self, page: int) -> bool:
+        return page * PAGE_SIZE < self.trips
+
+    def rating(self, ticket_id: str) -> str:
+        n = int(ticket_id.rsplit("-", 1)[-1])
+        score = self.ratings[n % len(self.ratings)] or 5.0
+        return self.drawer_template.replace(SCORE_MARK, f"{score:g}").replace(
+            WIDTH_MARK, f"{score * 20:g}"
+        )
+
+
+# ====================================
+#           HTTP SERVER
+# ====================================
+def make_server(
+    site: ReplaySite,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency_ms: float = DEFAULT_LATENCY_MS,
+    jitter: float = 0.3,
+    seed: int = 0,
+) -> ThreadingHTTPServer:
+    """Server phát lại site, mỗi request trễ latency_ms * U(1 - jitter, 1 + jitter)."""
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, body: str, status: int = 200, headers: dict | None = None):
+            with rng_lock:
+                delay = latency_ms * rng.uniform(1 - jitter, 1 + jitter)
+            time.sleep(max(delay, 0) / 1000)
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                if url.path == "/":
+                    self._send(site.home_page())
+                elif url.path == "/search":
+                    day = datetime.strptime(query["date"], "%d/%m/%Y").date()
+                    self._send(
+                        site.search_page(
+                            query.get("from", ""), query.get("to", ""), day
+                        )
+                    )
+                elif url.path == "/api/trips":
+                    page = int(query["page"])
+                    more = "1" if site.has_more(page) else "0"
+                    self._send(site.trips_page(page), headers={"X-Has-More": more})
+                elif url.path == "/api/rating":
+                    self._send(site.rating(query["ticket"]))
+                else:
+                    self._send("Not found", 404)
+            except (KeyError, ValueError) as e:
+                self._send(f"Bad request: {e}", 400)
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def start_server(site: ReplaySite, **kwargs) -> tuple[ThreadingHTTPServer, str]:
+    server = make_server(site, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/"
+
+
+# ====================================
+#           BENCHMARK
+# ====================================
+def bench_crawl(base_url: str, args) -> dict:
+    """Chạy crawl_vexere args.runs lần trên site giả lập, trả về stage crawl_replay."""
+    # Import ở đây để --serve chạy được cả khi máy không có selenium / Chrome
+    from src.extract.crawling import crawl_vexere
+
+    timings, trips = [], []
+    for run in range(args.runs):
+        start = time.perf_counter()
+        df = crawl_vexere(
+            args.start, args.dest, args.days, base_url=base_url, headless=True
+        )
+        timings.append(time.perf_counter() - start)
+        trips.append(len(df))
+        print(
+            f"[crawl_replay] run {run + 1}/{args.runs}: {len(df)}/{args.trips} chuyến, "
+            f"{timings[-1]:.1f}s"
+        )
+
+    median_s = statistics.median(timings)
+    result = {
+        "status": "ok",
+        "runs": args.runs,
+        "trips_served": args.trips,
+        "trips_parsed": int(statistics.median(trips)),
+        "latency_ms": args.latency_ms,
+        "median_s": median_s,
+        "trips_per_min": statistics.median(trips) / median_s * 60,
+    }
+    print(
+        f"[crawl_replay] median {median_s:.1f}s | "
+        f"{result['trips_per_min']:.1f} chuyến/phút (latency {args.latency_ms} ms)"
+    )
+    return result
+
+
+def save_stage(name: str, stage: dict):
+    commit = git_commit()
+    result_path = f"{RESULTS_DIR}/{commit}.json"
+    result = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "stages": {name: stage},
+    }
+    if os.path.exists(result_path):
+        with open(result_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        result = previous | {"stages": previous["stages"] | result["stages"]}
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"- Đã lưu kết quả vào {result_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Site vexere giả lập + đo tốc độ crawl"
+    )
+    parser.add_argument("--serve", action="store_true", help="Chỉ chạy server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--sample", default=SAMPLE_HTML)
+    parser.add_argument("--trips", type=int, default=DEFAULT_TRIPS)
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_LATENCY_MS)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--start", default="Sài Gòn")
+    parser.add_argument("--dest", default="Nha Trang")
+    parser.add_argument("--days", type=int, default=1)
+    args = parser.parse_args()
+
+    site = ReplaySite(args.sample, args.trips)
+    server, base_url = start_server(
+        site,
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        jitter=args.jitter,
+    )
+    print(f"Replay site: {base_url} ({args.trips} chuyến, {args.latency_ms} ms)")
+
+    if args.serve:
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+    else:
+        save_stage("crawl_replay", bench_crawl(base_url, args))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
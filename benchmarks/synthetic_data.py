@@ -0,0 +1,339 @@
+"""
+Sinh dữ liệu raw giả lập có cùng hình dạng với data/raw/*_raw.csv để thử tải.
+
+Profile (phân phối các cột và định dạng chuỗi) được học từ file raw thật:
+    - tuyến (start_point, destination) và tần suất
+    - theo từng tuyến: nhà xe + "4.7 (3485)" + loại ghế + 7 rating tiếng Việt,
+      điểm đón/trả, giờ đi "18:45", thời lượng "10h45m", giá "350.000đ",
+      tỉ lệ có khuyến mãi, mức giảm "-14%" và tiền tố "Từ "
+Giờ đến / "(13/11)" được tính lại từ giờ đi + thời lượng, ngày đi có dạng
+"T4, 12/11/2025". Dữ liệu được ghi ra đĩa theo chunk nên có thể sinh
+hàng trăm triệu dòng mà không giữ trong bộ nhớ; cùng seed cho cùng kết quả.
+
+Ví dụ:
+    python -m benchmarks.synthetic_data --rows 1000000 --out /tmp/big_raw.csv
+    python -m benchmarks.synthetic_data --rows 300000 --days 30 --out-dir /tmp/raw
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from src.transform.cleaning.rating_cleaner import RENAME_RATING_COLS
+
+RAW_GLOB = "data/raw/*_raw.csv"
+DEFAULT_CHUNKSIZE = 200_000
+RATING_TITLES = list(RENAME_RATING_COLS)
+RAW_COLUMNS = [
+    "company_name",
+    "bus_rating",
+    "seat_type",
+    "departure_time",
+    "pickup_point",
+    "arrival_date",
+    "arrival_time",
+    "dropoff_point",
+    "duration",
+    "price_original",
+    "price_discounted",
+    "percent_discount",
+    "departure_date",
+    "start_point",
+    "destination",
+    *RATING_TITLES,
+]
+WEEKDAYS = ["T2", "T3", "T4", "T5", "T6", "T7", "CN"]
+
+
+# ====================================
+#           HỌC PROFILE
+# ====================================
+def _parse_price(text) -> float:
+    digits = re.sub(r"[^0-9]", "", str(text))
+    return float(digits) if digits else np.nan
+
+
+def _duration_to_minutes(text: str) -> int:
+    hours = re.search(r"(\d+)h", text)
+    mins = re.search(r"(\d+)m", text)
+    return (int(hours.group(1)) if hours else 0) * 60 + (
+        int(mins.group(1)) if mins else 0
+    )
+
+
+def _pool(series: pd.Series) -> dict:
+    """Phân phối rời rạc {values, weights} của một cột (giữ nguyên chuỗi)."""
+    counts = series.value_counts(dropna=False)
+    return {
+        "values": [None if pd.isna(v) else v for v in counts.index.tolist()],
+        "weights": (counts / counts.sum()).round(8).tolist(),
+    }
+
+
+def learn_profile(raw_glob: str = RAW_GLOB) -> dict:
+    """Học profile phân phối từ các file raw thật."""
+    df = pd.concat(
+        [pd.read_csv(f) for f in sorted(glob.glob(raw_glob))], ignore_index=True
+    )
+    df = df.dropna(subset=["company_name", "departure_time", "duration"])
+
+    # Nhà xe + rating + loại ghế được lấy theo bộ để giữ tương quan giữa chúng
+    company_cols = ["company_name", "bus_rating", "seat_type", *RATING_TITLES]
+    df["company_key"] = pd.util.hash_pandas_object(df[company_cols], index=False)
+    companies = df.drop_duplicates("company_key").set_index("company_key")
+
+    original = df["price_original"].astype(str)
+    discounted = df["price_discounted"]
+    has_discount = discounted.notna() & df["price_original"].notna()
+
+    routes = []
+    for (start, dest), g in df.groupby(["start_point", "destination"]):
+        g_discount = g[has_discount.loc[g.index]]
+        ratio = (
+            g_discount["price_discounted"].map(_parse_price)
+            / g_discount["price_original"].map(_parse_price)
+        ).round(2)
+        routes.append(
+            {
+                "start_point": start,
+                "destination": dest,
+                "weight": len(g) / len(df),
+                "company": _pool(g["company_key"].astype(str)),
+                "pickup_point": _pool(g["pickup_point"]),
+                "dropoff_point": _pool(g["dropoff_point"]),
+                "departure_time": _pool(g["departure_time"]),
+                "duration": _pool(g["duration"]),
+                "price_original": _pool(g["price_original"].map(_parse_price)),
+                "discount_prob": float(len(g_discount) / len(g)),
+                "discount_ratio": (
+                    _pool(ratio) if len(ratio) else _pool(pd.Series([1.0]))
+                ),
+            }
+        )
+
+    return {
+        "learned_at": datetime.now().isoformat(timespec="seconds"),
+        "source_rows": int(len(df)),
+        "prefix_from_original": float(original.str.startswith("Từ").mean()),
+        "prefix_from_discounted": float(
+            discounted.dropna().astype(str).str.startswith("Từ").mean()
+        ),
+        "companies": {
+            str(key): [None if pd.isna(v) else v for v in row.tolist()]
+            for key, row in companies[company_cols].iterrows()
+        },
+        "company_cols": company_cols,
+        "routes": routes,
+    }
+
+
+# ====================================
+#           RENDER CHUỖI
+# ====================================
+def _render(values: np.ndarray, fmt) -> np.ndarray:
+    """Format theo giá trị duy nhất rồi map ngược (nhanh với cột ít giá trị)."""
+    uniques, inverse = np.unique(values, return_inverse=True)
+    return np.array([fmt(v) for v in uniques], dtype=object)[inverse]
+
+
+def format_price(value: float) -> str:
+    return f"{int(value):,}đ".replace(",", ".")
+
+
+def format_departure_date(day: date) -> str:
+    return f"{WEEKDAYS[day.weekday()]}, {day:%d/%m/%Y}"
+
+
+# ====================================
+#           SINH DỮ LIỆU
+# ====================================
+def _sample(rng, pool: dict, size: int) -> np.ndarray:
+    values = np.array(pool["values"], dtype=object)
+    weights = np.asarray(pool["weights"], dtype=float)
+    return values[rng.choice(len(values), size=size, p=weights / weights.sum())]
+
+
+def generate_chunk(profile: dict, n_rows: int, day: date, rng) -> pd.DataFrame:
+    """Sinh n_rows dòng raw cho một ngày khởi hành."""
+    routes = profile["routes"]
+    weights = np.array([r["weight"] for r in routes])
+    route_idx = rng.choice(len(routes), size=n_rows, p=weights / weights.sum())
+
+    parts = []
+    for r in np.unique(route_idx):
+        route = routes[r]
+        k = int((route_idx == r).sum())
+
+        company_rows = [
+            profile["companies"][key] for key in _sample(rng, route["company"], k)
+        ]
+        part = pd.DataFrame(company_rows, columns=profile["company_cols"])
+        part["start_point"] = route["start_point"]
+        part["destination"] = route["destination"]
+        part["pickup_point"] = _sample(rng, route["pickup_point"], k)
+        part["dropoff_point"] = _sample(rng, route["dropoff_point"], k)
+        part["departure_time"] = _sample(rng, route["departure_time"], k)
+        part["duration"] = _sample(rng, route["duration"], k)
+
+        # Giá gốc + khuyến mãi
+        original = pd.to_numeric(_sample(rng, route["price_original"], k)).astype(float)
+        discounted = np.where(
+            rng.random(k) < route["discount_prob"],
+            np.round(
+                original * _sample(rng, route["discount_ratio"], k).astype(float),
+                -3,
+            ),
+            np.nan,
+        )
+        discounted[np.isnan(original)] = np.nan
+        part["_original"] = original
+        part["_discounted"] = discounted
+        parts.append(part)
+
+    df = pd.concat(parts, ignore_index=True)
+    df = df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+    # Giờ đến = giờ đi + thời lượng; "(dd/mm)" khi sang ngày hôm sau
+    dep = pd.to_datetime(df["departure_time"], format="%H:%M")
+    minutes = (dep.dt.hour * 60 + dep.dt.minute).to_numpy()
+    duration = _render(df["duration"].to_numpy(dtype=str), _duration_to_minutes)
+    arrival = minutes + duration.astype(int)
+    df["arrival_time"] = _render(
+        arrival % 1440, lambda m: f"{int(m) // 60:02d}:{int(m) % 60:02d}"
+    )
+    df["arrival_date"] = _render(
+        arrival // 1440,
+        lambda d: f"({day + timedelta(days=int(d)):%d/%m})" if d else None,
+    )
+    df["departure_date"] = format_departure_date(day)
+
+    # Render giá theo đúng định dạng raw
+    has_original = ~np.isnan(df["_original"].to_numpy())
+    has_discount = ~np.isnan(df["_discounted"].to_numpy())
+    prefix_original = np.where(
+        rng.random(len(df)) < profile["prefix_from_original"], "Từ ", ""
+    ).astype(object)
+    prefix_discounted = np.where(
+        rng.random(len(df)) < profile["prefix_from_discounted"], "Từ ", ""
+    ).astype(object)
+
+    original = np.full(len(df), None, dtype=object)
+    original[has_original] = prefix_original[has_original] + _render(
+        df["_original"].to_numpy()[has_original], format_price
+    )
+    discounted = np.full(len(df), None, dtype=object)
+    discounted[has_discount] = prefix_discounted[has_discount] + _render(
+        df["_discounted"].to_numpy()[has_discount], format_price
+    )
+    percent = np.full(len(df), None, dtype=object)
+    percent[has_discount] = _render(
+        np.round(
+            (1 - df["_discounted"].to_numpy() / df["_original"].to_numpy())[
+                has_discount
+            ]
+            * 100
+        ),
+        lambda p: f"-{int(p)}%",
+    )
+
+    df["price_original"] = original
+    df["price_discounted"] = discounted
+    df["percent_discount"] = percent
+    return df[RAW_COLUMNS]
+
+
+def generate(
+    profile: dict,
+    rows: int,
+    seed: int = 0,
+    start_date: date = date(2025, 11, 12),
+    days: int = 1,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+):
+    """
+    Sinh (ngày, chunk DataFrame) lần lượt; số dòng chia đều cho các ngày.
+
+    Mỗi chunk dùng RNG riêng seed theo (seed, ngày, số thứ tự chunk) nên
+    kết quả chỉ phụ thuộc seed và chunksize.
+    """
+    rows_per_day = -(-rows // days)  # làm tròn lên
+    remaining = rows
+    for d in range(days):
+        day = start_date + timedelta(days=d)
+        day_rows = min(rows_per_day, remaining)
+        remaining -= day_rows
+        for c, offset in enumerate(range(0, day_rows, chunksize)):
+            rng = np.random.default_rng([seed, d, c])
+            yield day, generate_chunk(
+                profile, min(chunksize, day_rows - offset), day, rng
+            )
+
+
+def write_synthetic(
+    profile: dict,
+    rows: int,
+    out: str | None = None,
+    out_dir: str | None = None,
+    **kwargs,
+) -> list[str]:
+    """Ghi dữ liệu giả lập ra một file (out) hoặc mỗi ngày một file *_raw.csv (out_dir)."""
+    written: set[str] = set()
+    for day, chunk in generate(profile, rows, **kwargs):
+        path = out or os.path.join(out_dir, f"{day:%Y_%m_%d}_raw.csv")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        chunk.to_csv(
+            path,
+            mode="a" if path in written else "w",
+            header=path not in written,
+            index=False,
+        )
+        written.add(path)
+    return sorted(written)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu raw Vexere giả lập")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--start-date", default="2025-11-12", help="YYYY-MM-DD")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--raw-glob", default=RAW_GLOB)
+    parser.add_argument(
+        "--profile", help="File JSON profile (học từ --raw-glob nếu chưa có)"
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--out", help="Một file CSV duy nhất")
+    group.add_argument("--out-dir", help="Mỗi ngày một file YYYY_MM_DD_raw.csv")
+    args = parser.parse_args()
+
+    if args.profile and os.path.exists(args.profile):
+        with open(args.profile, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+    else:
+        profile = learn_profile(args.raw_glob)
+        if args.profile:
+            with open(args.profile, "w", encoding="utf-8") as f:
+                json.dump(profile, f, ensure_ascii=False)
+
+    paths = write_synthetic(
+        profile,
+        args.rows,
+        out=args.out,
+        out_dir=args.out_dir,
+        seed=args.seed,
+        start_date=datetime.strptime(args.start_date, "%Y-%m-%d").date(),
+        days=args.days,
+        chunksize=args.chunksize,
+    )
+    print(f"- Đã sinh {args.rows} dòng vào {len(paths)} file")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,65 +2,19 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 
-from sklearn.preprocessing import RobustScaler
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
 import matplotlib.pyplot as plt
-import os, glob
+import io, os, sys
+
+# Cho phép import src.* khi chạy `streamlit run demo/app.py` từ thư mục gốc
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 # =========================================================
 # 0. HÀM FEATURE ENGINEERING DÙNG CHUNG CHO TRAIN & PREDICT
 # =========================================================
-def feature_engineering(df_raw: pd.DataFrame) -> pd.DataFrame:
-    df = df_raw.copy()
-
-    # 1. Loại các dòng price_original = 0
-    df = df[df["price_original"] != 0].copy()
-
-    # 2. REAL PRICE
-    df["real_price"] = np.where(
-        df["price_discounted"] == 0,
-        df["price_original"],
-        df["price_discounted"],
-    )
-
-    # 3. LOG PRICE
-    df["log_price"] = np.log1p(df["real_price"])
-
-    # 4. DISCOUNT RATE
-    df["discount_rate"] = 1 - df["price_discounted"] / df["price_original"]
-
-    # 5. SERVICE SCORE
-    service_cols = ["rating_staff_attitude", "rating_service_quality", "rating_comfort"]
-    df["service_score"] = df[service_cols].mean(axis=1)
-
-    # 6. TRUST SCORE
-    trust_cols = ["rating_safety", "rating_punctuality", "rating_info_accuracy"]
-    df["trust_score"] = df[trust_cols].mean(axis=1)
-
-    # 7. WILSON SCORE
-    def wilson_lower_bound(p, n, z=1.96):
-        if n == 0:
-            return 0.0
-        denom = 1 + z**2 / n
-        centre = p + z * z / (2 * n)
-        margin = z * np.sqrt((p * (1 - p) + z * z / (4 * n)) / n)
-        return (centre - margin) / denom
-
-    df["p"] = df["rating_overall"] / 5.0
-    df["wilson_score"] = df.apply(
-        lambda r: wilson_lower_bound(r["p"], r["reviewer_count"]), axis=1
-    )
-    df.drop(columns=["p"], inplace=True)
-
-    # 8. PRICE–RATING RATIO (ổn định)
-    df["price_rating_ratio_stable"] = df["wilson_score"] / df["log_price"]
-
-    # 9. FAIRNESS INDEX
-    df["fairness_index"] = df["wilson_score"] / np.sqrt(df["real_price"])
-
-    return df
+from src.ml.artifacts import K, files_signature, load_or_train, training_files
+from src.ml.features import NUMERIC_COLS, feature_engineering
+from src.ml.neighbors import update_index
 
 
 # =========================================================
@@ -70,58 +24,47 @@ st.title("🚍 Phân cụm chuyến xe khách theo giá & chất lượng dịch
 
 
 # =========================================================
-# 2. LOAD DỮ LIỆU TRAIN TỪ CSV
+# 2. LOAD ARTIFACT MÔ HÌNH (CHỈ TRAIN LẠI KHI DỮ LIỆU ĐỔI)
 # =========================================================
 st.header("Huấn luyện mô hình KMeans từ dữ liệu gốc")
 
 folder_path = "data/processed"
-csv_files = glob.glob(os.path.join(folder_path, "*.csv"))
+csv_files = training_files(folder_path)
 
 if not csv_files:
     st.error(f"Không tìm thấy file CSV nào trong thư mục: {folder_path}")
     st.stop()
 
-dfs = []
-for f in csv_files:
-    tmp = pd.read_csv(f)
-    dfs.append(tmp)
-
-df_train_raw = pd.concat(dfs, ignore_index=True)
-
-st.write(f"Đã load {len(csv_files)} file CSV, tổng số dòng: {df_train_raw.shape[0]}")
-st.dataframe(df_train_raw.head())
-
-# Các cột số cần thiết (đÃ BỎ duration_minutes, number_of_seat)
-numeric_cols = [
-    "price_original",
-    "price_discounted",
-    "rating_overall",
-    "rating_safety",
-    "rating_info_accuracy",
-    "rating_staff_attitude",
-    "rating_comfort",
-    "rating_service_quality",
-    "rating_punctuality",
-    "reviewer_count",
-]
-
-df_train_raw[numeric_cols] = df_train_raw[numeric_cols].apply(
-    pd.to_numeric, errors="coerce"
-)
-df_train_raw = df_train_raw.dropna(subset=numeric_cols)
 
-if df_train_raw.shape[0] < 3:
-    st.error("Dữ liệu train sau khi làm sạch < 3 dòng, không đủ để phân cụm K=3.")
+@st.cache_resource(show_spinner="Đang tải / huấn luyện mô hình...")
+def get_artifact(signature: tuple) -> dict:
+    # signature (tên, size, mtime các file) chỉ dùng làm key cache
+    return load_or_train(folder_path)
+
+
+try:
+    artifact = get_artifact(files_signature(csv_files))
+except ValueError as e:
+    st.error(str(e))
     st.stop()
 
+scaler = artifact["scaler"]
+model = artifact["model"]
+features = artifact["features"]
+numeric_cols = NUMERIC_COLS
+
+st.write(
+    f"Đã load {len(artifact['files'])} file CSV, tổng số dòng: {artifact['n_rows']} "
+    f"(artifact `{artifact['fingerprint'][:16]}`, train lúc {artifact['trained_at']})"
+)
+st.dataframe(artifact["raw_preview"])
+
 # =========================================================
 # 3. FEATURE ENGINEERING CHO DỮ LIỆU TRAIN
 # =========================================================
-df_train_fe = feature_engineering(df_train_raw)
-
 st.subheader("📐 Một số feature đã tạo trên dữ liệu train")
 st.dataframe(
-    df_train_fe[
+    artifact["feature_preview"][
         [
             "real_price",
             "log_price",
@@ -130,57 +73,66 @@ st.dataframe(
             "wilson_score",
             "fairness_index",
         ]
-    ].head()
+    ]
 )
 
-# Feature dùng để phân cụm
-features = [
-    "wilson_score",
-    "log_price",
-    "fairness_index",
-    "trust_score",
-    "service_score",
-]
-
-df_cluster_train = df_train_fe[features].dropna().copy()
-df_cluster_train = df_cluster_train.drop_duplicates()
-
-if df_cluster_train.shape[0] <= 3:
-    st.error("Sau khi drop NaN/duplicates, dữ liệu train còn quá ít để phân cụm K=3.")
-    st.stop()
-
-# =========================================================
-# 4. SCALE + TRAIN KMEANS VỚI K = 3
-# =========================================================
-scaler = RobustScaler()
-X_train_scaled = scaler.fit_transform(df_cluster_train[features])
-
-K = 3
-model = KMeans(n_clusters=K, random_state=40, n_init=10)
-train_labels = model.fit_predict(X_train_scaled)
-
-df_cluster_train = df_cluster_train.copy()
-df_cluster_train["cluster"] = train_labels
-
-# Join cluster về lại df_train_fe (theo index)
-df_train_result = df_train_fe.join(df_cluster_train["cluster"], how="left")
 
 # =========================================================
 # 5. PCA TRÊN DỮ LIỆU TRAIN (OPTIONAL)
 # =========================================================
-if df_cluster_train.shape[0] >= 2:
-    st.subheader("📊 PCA 2D trên dữ liệu train")
+@st.cache_data(show_spinner=False)
+def render_pca_png(fingerprint: str, view: str, _artifact: dict) -> bytes:
+    # Vẽ một lần cho mỗi artifact + kiểu xem; số điểm / số ô cố định
+    projection = _artifact["projection"]
+    fig, ax = plt.subplots()
 
-    pca = PCA(n_components=2)
-    X_train_pca = pca.fit_transform(X_train_scaled)
+    if view == "Mẫu phân tầng theo cụm":
+        points = projection["sample_points"]
+        ax.scatter(
+            points[:, 0],
+            points[:, 1],
+            c=projection["sample_labels"],
+            cmap="viridis",
+            vmin=0,
+            vmax=K - 1,
+            s=8,
+        )
+    else:
+        # Màu = cụm chiếm đa số trong ô, độ đậm = log(số điểm)
+        counts = projection["density"]["counts"]
+        total = counts.sum(axis=0)
+        rgba = plt.get_cmap("viridis")(counts.argmax(axis=0) / max(K - 1, 1))
+        rgba[..., 3] = np.log1p(total) / max(np.log1p(total.max()), 1e-9)
+        ax.imshow(
+            rgba.transpose(1, 0, 2),
+            origin="lower",
+            extent=projection["density"]["extent"],
+            aspect="auto",
+            interpolation="nearest",
+        )
 
-    fig, ax = plt.subplots()
-    ax.scatter(X_train_pca[:, 0], X_train_pca[:, 1], c=train_labels, cmap="viridis")
     ax.set_xlabel("PCA 1")
     ax.set_ylabel("PCA 2")
-    ax.set_title("PCA Visualization (Train Data, K = 3)")
+    ax.set_title(f"PCA Visualization (Train Data, K = {K})")
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    plt.close(fig)
+    return buf.getvalue()
+
 
-    st.pyplot(fig)
+if artifact["n_train"] >= 2:
+    st.subheader("📊 PCA 2D trên dữ liệu train")
+    pca_view = st.radio(
+        "Kiểu hiển thị",
+        ["Mẫu phân tầng theo cụm", "Mật độ"],
+        horizontal=True,
+    )
+    st.image(render_pca_png(artifact["fingerprint"], pca_view, artifact))
+    st.caption(
+        f"{len(artifact['projection']['sample_points'])} / "
+        f"{artifact['projection']['n_points']} điểm train được vẽ"
+    )
 
 
 # =========================================================
@@ -243,6 +195,20 @@ reviewer_count = st.number_input(
     "Số lượng người đánh giá", min_value=1, max_value=100000, value=500, step=10
 )
 
+
+@st.cache_resource(show_spinner="Đang cập nhật chỉ mục chuyến tương tự...")
+def get_neighbor_index(signature: tuple):
+    # Chỉ index thêm các ngày mới so với lần trước
+    return update_index(folder_path, artifact=artifact)
+
+
+neighbor_index = get_neighbor_index(files_signature(csv_files))
+ALL_ROUTES = "Tất cả tuyến"
+route_label = st.selectbox(
+    "Tuyến để tìm chuyến tương tự",
+    [ALL_ROUTES] + [f"{start} → {dest}" for start, dest in neighbor_index.routes],
+)
+
 # ====== GIẢI THÍCH Ý NGHĨA CỤM ======
 cluster_meanings = {
     0: {
@@ -365,3 +331,9 @@ if st.button("🚀 Dự đoán cụm cho dữ liệu mới"):
                 st.markdown(f"### 🎯 Cluster {c} – {cluster_meanings[c]['name']}")
                 st.markdown(cluster_meanings[c]["description"])
                 idx_list = df_new_fe.index[df_new_fe["predicted_cluster"] == c]
+
+            # ======= CHUYẾN TƯƠNG TỰ TRONG LỊCH SỬ =======
+            st.subheader("🔎 Các chuyến thực tế gần nhất trong không gian feature")
+            route = None if route_label == ALL_ROUTES else tuple(route_label.split(" → "))
+            neighbors = neighbor_index.query_features(df_new_cluster, k=5, route=route)
+            st.dataframe(neighbors)
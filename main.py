@@ -2,11 +2,19 @@ from src.extract.crawling import (
     crawl_vexere,
 )
 from src.transform.cleaning.cleaning import clean_vexere
+from src.transform.cleaning.location_cleaner import ADDRESS_COLS
+from src.transform.cleaning.company_name_index import build_company_name_index
 from src.load.loading import insert_trips_from_dataframe
+from src.load.cdc import insert_trips_cdc
+from src.load.bi_export import export_bi
+from src.extract.scheduler import plan_crawl, update_state
+from src.pipeline.runner import run_pipeline
 
 from src.database.db_manager import DatabaseManager
-from src.utils.file_utils import load_routes
+from src.utils.file_utils import crawl_file_name, load_routes
+from src.utils.metrics_utils import write_run_report
 
+import os
 import pandas as pd
 import time
 from datetime import datetime, timedelta
@@ -16,8 +24,17 @@ import json
 #                 PARAMETERS
 # ===============================================
 DAYSOFF = 2
-target_date = datetime.today() + timedelta(days=DAYSOFF)
-file_name = str(target_date.date()).replace("-", "_")
+crawl_day = datetime.today().date()
+file_name = crawl_file_name(crawl_day + timedelta(days=DAYSOFF), DAYSOFF)
+# "snapshot": lưu toàn bộ mỗi lần crawl | "cdc": chỉ lưu giá trị thay đổi
+LOAD_MODE = "snapshot"
+# None: crawl mọi tuyến cho ngày DAYSOFF | số N: chỉ crawl N cặp (tuyến, ngày đi)
+# biến động nhiều nhất theo src/extract/scheduler.py; mỗi ngày đi ghi ra file
+# riêng, offset khác DAYSOFF có hậu tố _d<offset> (vd. 2025_11_20_d5_raw.csv)
+CRAWL_BUDGET = None
+# True: crawl / clean / load chồng lấn theo từng tuyến (src/pipeline/runner.py)
+# False: crawl hết các tuyến rồi mới clean, rồi load
+PIPELINED = True
 
 # database config
 with open("src/database/config.json", "r", encoding="utf-8") as f:
@@ -28,37 +45,89 @@ routes = load_routes("routes.json")
 # ===============================================
 # STEP 1: CRAWLING
 # ===============================================
-all_trips_raw = []
-for from_city, to_city in routes:
-    df = crawl_vexere(start_city=from_city, dest_city=to_city, days=DAYSOFF)
-    all_trips_raw.append(df)
-    time.sleep(8)
+if CRAWL_BUDGET is None:
+    crawl_plan = [(from_city, to_city, DAYSOFF) for from_city, to_city in routes]
+else:
+    crawl_plan = [
+        (item["from_city"], item["to_city"], item["days_offset"])
+        for item in plan_crawl(update_state(), routes, CRAWL_BUDGET)
+    ]
 
-if all_trips_raw:
-    df = pd.concat(all_trips_raw, axis=0)
-    df.to_csv(f"./data/raw/{file_name}_raw.csv", index=False)
+if PIPELINED:
+    # STEP 1-3 chồng lấn: tuyến vừa crawl xong được clean + load trong lúc
+    # trình duyệt crawl tuyến tiếp theo
+    # Kết nối DB chỉ được mở khi frame đầu tiên tới stage load
+    stats = run_pipeline(
+        crawl_plan,
+        connect=lambda: DatabaseManager(
+            database=db_config["DATABASE"],
+            user=db_config["USER"],
+            password=db_config["PASSWORD"],
+        ),
+        load_mode=LOAD_MODE,
+        crawl_day=crawl_day,
+    )
+    if not stats["raw_rows"]:
+        print("Không có dữ liệu nào được crawl.")
+        exit()
 else:
-    print("Không có dữ liệu nào được crawl.")
-    exit()
+    # Theo days_offset: mỗi ngày đi một file
+    all_trips_raw = {}
+    for from_city, to_city, days in crawl_plan:
+        df = crawl_vexere(start_city=from_city, dest_city=to_city, days=days)
+        all_trips_raw.setdefault(days, []).append(df)
+        time.sleep(8)
+
+    if all_trips_raw:
+        for days, frames in all_trips_raw.items():
+            name = crawl_file_name(crawl_day + timedelta(days=days), days)
+            df = pd.concat(frames, axis=0)
+            df.to_csv(f"./data/raw/{name}_raw.csv", index=False)
+    else:
+        print("Không có dữ liệu nào được crawl.")
+        exit()
+
+    for days in all_trips_raw:
+        name = crawl_file_name(crawl_day + timedelta(days=days), days)
+        # ===============================================
+        # STEP 2: CLEANING
+        # ===============================================
+        df = pd.read_csv(f"./data/raw/{name}_raw.csv")
+        if not df.empty:
+            # CDC cần thêm địa chỉ gốc làm khóa chuyến (không ghi vào file processed)
+            df = clean_vexere(df, keep_address=LOAD_MODE == "cdc")
+        df.drop(columns=list(ADDRESS_COLS.values()), errors="ignore").to_csv(
+            f"./data/processed/{name}_cleaned.csv", index=False
+        )
+
+        # ===============================================
+        # STEP 3: LOADING
+        # ===============================================
+        with DatabaseManager(
+            database=db_config["DATABASE"],
+            user=db_config["USER"],
+            password=db_config["PASSWORD"],
+        ) as db:
+            if LOAD_MODE == "cdc":
+                insert_trips_cdc(db, df)
+            else:
+                df = pd.read_csv(f"./data/processed/{name}_cleaned.csv")
+                insert_trips_from_dataframe(db, df)
 
 # ===============================================
-# STEP 2: CLEANING
+# STEP 4: HỌC TÊN NHÀ XE MỚI VÀO INDEX
 # ===============================================
-df = pd.read_csv(f"./data/raw/{file_name}_raw.csv")
-if not df.empty:
-    df = clean_vexere(df)
-df.to_csv(f"./data/processed/{file_name}_cleaned.csv", index=False)
+# Cleaning chỉ đọc index; tên mới của hôm nay được gộp từ lần clean sau
+processed_today = [
+    f"./data/processed/{crawl_file_name(crawl_day + timedelta(days=days), days)}_cleaned.csv"
+    for days in sorted({days for _, _, days in crawl_plan})
+]
+build_company_name_index([path for path in processed_today if os.path.exists(path)])
 
 # ===============================================
-# STEP 3: LOADING
+# STEP 5: EXPORT CHO POWER BI (chỉ partition mới)
 # ===============================================
-df = pd.read_csv(f"./data/processed/{file_name}_cleaned.csv")
-
-with DatabaseManager(
-    database=db_config["DATABASE"],
-    user=db_config["USER"],
-    password=db_config["PASSWORD"],
-) as db:
-    insert_trips_from_dataframe(db, df)
+export_bi()
 
+write_run_report(file_name)
 print("DONE ✅")
@@ -0,0 +1,464 @@
+import argparse
+import glob
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.ml.feature_store import file_sha256
+from src.transform.cleaning.cleaning import read_trips_with_address
+from src.utils.file_utils import crawl_date_from_file_path
+from src.utils.log_utils import log
+
+STORE_PATH = "data/indexes/price_curves.joblib"
+PROCESSED_FOLDER = "data/processed"
+# Danh tính ổn định của một chuyến qua các lần crawl (giống khóa trip_keys của
+# CDC); địa chỉ đón/trả gốc lấy từ file raw (read_trips_with_address)
+TRIP_KEY_COLS = [
+    "start_point",
+    "destination",
+    "company_name",
+    "departure_date",
+    "departure_time",
+    "pickup_point",
+    "dropoff_point",
+    "pickup_address",
+    "dropoff_address",
+    "number_of_seat",
+]
+# Tăng khi đổi cách lấy giá trị khóa chuyến để store cũ được build lại
+# (2: địa chỉ gốc lấy từ file raw thay vì cột của file processed)
+KEY_VERSION = 2
+GROUP_COLS = ["route", "company"]
+EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def _days(values) -> np.ndarray:
+    """Ngày -> số ngày kể từ 1970-01-01 (int32), để trừ ra lead time."""
+    return (
+        pd.to_datetime(pd.Series(values).astype(str))
+        .to_numpy()
+        .astype("datetime64[D]")
+        .astype(np.int32)
+    )
+
+
+# ====================================
+#           STORE
+# ====================================
+class PriceCurveStore:
+    """
+    Chuỗi quan sát giá (ngày crawl, price_original, price_discounted) của từng
+    chuyến qua nhiều lần crawl, để xem giá đổi thế nào khi ngày đi tới gần.
+
+    Mỗi chuyến có id int theo TRIP_KEY_COLS; quan sát lưu dạng cột NumPy
+    (trip, crawl_day, giá, file nguồn), nạp thêm theo khối. Khi cần tính, các
+    khối được gộp và sắp theo (trip, crawl_day) thành dạng CSR: quan sát của
+    chuyến t nằm trong [offsets[t], offsets[t + 1]) -> mọi phép tính trên
+    toàn bộ chuyến là thao tác mảng, không self-join lịch sử CSV.
+    """
+
+    def __init__(self):
+        self.trip_ids: dict[str, int] = {}
+        self.routes: list[str] = []
+        self.companies: list[str] = []
+        self._route_codes: dict[str, int] = {}
+        self._company_codes: dict[str, int] = {}
+        # Thuộc tính từng chuyến (theo trip id) và quan sát, dạng list các khối
+        self.trip_chunks: list[dict] = []
+        self.obs_chunks: list[dict] = []
+        self.files: dict[str, str] = {}
+        self.file_codes: dict[str, int] = {}
+        # Số dòng trùng khóa chuyến trong từng file (bỏ qua, giữ dòng đầu)
+        self.collisions: dict[str, dict[str, int]] = {}
+        self.key_cols = list(TRIP_KEY_COLS)
+        self.key_version = KEY_VERSION
+        self._compacted = None
+
+    # ---------- BUILD ----------
+    @staticmethod
+    def _encode(values: pd.Series, table: list, codes: dict) -> np.ndarray:
+        for value in values.unique():
+            if value not in codes:
+                codes[value] = len(table)
+                table.append(value)
+        return values.map(codes).to_numpy(np.int32)
+
+    def add_frame(self, df: pd.DataFrame, crawl_day, source: str = "") -> int:
+        """
+        Thêm một lần crawl (DataFrame processed) đã crawl ngày crawl_day.
+
+        Dòng trùng khóa chuyến với dòng trước đó trong cùng frame bị bỏ qua
+        (giữ dòng đầu như CDC) và được đếm vào collisions[source].
+
+        Returns:
+            int: số chuyến mới (chưa từng thấy).
+        """
+        keys = (
+            df.reindex(columns=TRIP_KEY_COLS, fill_value="")
+            .astype(str)
+            .agg("|".join, axis=1)
+        )
+        first = ~keys.duplicated(keep="first")
+        prices = df[["price_original", "price_discounted"]]
+        first_prices = prices.groupby(keys.to_numpy()).transform("first")
+        self.collisions[source] = {
+            "rows": int((~first).sum()),
+            "price": int((~first & (prices != first_prices).any(axis=1)).sum()),
+        }
+        df, keys = df[first], keys[first]
+        new_keys = keys[~keys.isin(self.trip_ids.keys())]
+        if len(new_keys):
+            start = len(self.trip_ids)
+            self.trip_ids.update(zip(new_keys, range(start, start + len(new_keys))))
+            new_rows = df.loc[new_keys.index]
+            route = (
+                new_rows["start_point"].astype(str)
+                + " → "
+                + new_rows["destination"].astype(str)
+            )
+            self.trip_chunks.append(
+                {
+                    "route": self._encode(route, self.routes, self._route_codes),
+                    "company": self._encode(
+                        new_rows["company_name"].astype(str),
+                        self.companies,
+                        self._company_codes,
+                    ),
+                    "departure_day": _days(new_rows["departure_date"]),
+                }
+            )
+
+        file_code = self.file_codes.setdefault(source, len(self.file_codes))
+        self.obs_chunks.append(
+            {
+                "trip": keys.map(self.trip_ids).to_numpy(np.int32),
+                "crawl_day": np.full(len(df), _days([crawl_day])[0], np.int32),
+                "price_original": df["price_original"].to_numpy(np.int32),
+                "price_discounted": df["price_discounted"].to_numpy(np.int32),
+                "file": np.full(len(df), file_code, np.int16),
+            }
+        )
+        self._compacted = None
+        return len(new_keys)
+
+    def drop_source(self, source: str):
+        """Bỏ quan sát của một file (file processed đã đổi nội dung / bị xóa)."""
+        code = self.file_codes.get(source)
+        if code is None:
+            return
+        for chunk in self.obs_chunks:
+            keep = chunk["file"] != code
+            if not keep.all():
+                for col in chunk:
+                    chunk[col] = chunk[col][keep]
+        self.obs_chunks = [c for c in self.obs_chunks if len(c["trip"])]
+        self.collisions.pop(source, None)
+        self._compacted = None
+
+    def add_file(self, path: str) -> bool:
+        name = os.path.basename(path)
+        digest = file_sha256(path)
+        if self.files.get(name) == digest:
+            return False
+        if name in self.files:
+            self.drop_source(name)
+
+        crawl_day = crawl_date_from_file_path(path)
+        new_trips = self.add_frame(read_trips_with_address(path), crawl_day, name)
+        self.files[name] = digest
+        collisions = self.collisions[name]
+        log(
+            f"Price curves {name}: {new_trips} chuyến mới, "
+            f"{collisions['rows']} dòng trùng khóa bị bỏ qua "
+            f"({collisions['price']} khác giá)"
+        )
+        return True
+
+    # ---------- COMPACT ----------
+    def _concat(self, chunks: list[dict]) -> dict:
+        if not chunks:
+            return {}
+        return {col: np.concatenate([c[col] for c in chunks]) for col in chunks[0]}
+
+    def compact(self) -> dict:
+        """
+        Gộp các khối và trả về dạng CSR (cache tới lần add tiếp theo):
+        quan sát sắp theo (trip, crawl_day), một quan sát / chuyến / ngày crawl
+        (crawl lại trong ngày -> giữ lần nạp sau), offsets theo trip id.
+        """
+        if self._compacted is not None:
+            return self._compacted
+
+        trips = self._concat(self.trip_chunks) or {
+            col: np.empty(0, np.int32) for col in ("route", "company", "departure_day")
+        }
+        self.trip_chunks = [trips]
+        obs = self._concat(self.obs_chunks) or {
+            col: np.empty(0, np.int32)
+            for col in ("trip", "crawl_day", "price_original", "price_discounted")
+        }
+        self.obs_chunks = [obs] if len(obs["trip"]) else []
+        n_trips = len(self.trip_ids)
+
+        # Sắp ổn định theo (trip, crawl_day): bản nạp sau đứng sau trong cùng ngày
+        order = np.lexsort((obs["crawl_day"], obs["trip"]))
+        trip = obs["trip"][order]
+        crawl_day = obs["crawl_day"][order]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = (trip[1:] != trip[:-1]) | (crawl_day[1:] != crawl_day[:-1])
+        order = order[last]
+
+        series = {
+            col: obs[col][order]
+            for col in ("trip", "crawl_day", "price_original", "price_discounted")
+        }
+        counts = np.bincount(series["trip"], minlength=n_trips)
+        offsets = np.zeros(n_trips + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        series["lead_days"] = (
+            trips["departure_day"][series["trip"]] - series["crawl_day"]
+        ).astype(np.int16)
+
+        self._compacted = {"trips": trips, "obs": series, "offsets": offsets}
+        return self._compacted
+
+    # ---------- QUERY ----------
+    def __len__(self) -> int:
+        return len(self.trip_ids)
+
+    def series(self, trip_key: str) -> pd.DataFrame:
+        """Chuỗi quan sát của một chuyến (khóa "start|dest|company|...")."""
+        data = self.compact()
+        t = self.trip_ids[trip_key]
+        lo, hi = data["offsets"][t], data["offsets"][t + 1]
+        frame = pd.DataFrame({col: v[lo:hi] for col, v in data["obs"].items()})
+        frame["crawl_date"] = EPOCH + frame.pop("crawl_day").to_numpy()
+        return frame.drop(columns="trip")
+
+    def _observations(self, min_obs: int = 1) -> pd.DataFrame:
+        """Mọi quan sát kèm route / company và giá cuối cùng (gần ngày đi nhất)."""
+        data = self.compact()
+        obs, trips, offsets = data["obs"], data["trips"], data["offsets"]
+        counts = np.diff(offsets)
+        trip = obs["trip"]
+
+        # Giá lần quan sát cuối của mỗi chuyến = mốc so sánh của đường cong
+        final_price = np.zeros(len(counts), dtype=np.float64)
+        has_obs = counts > 0
+        final_price[has_obs] = obs["price_discounted"][offsets[1:][has_obs] - 1]
+        price_orig = obs["price_original"].astype(np.float64)
+        price_disc = obs["price_discounted"].astype(np.float64)
+
+        frame = pd.DataFrame(
+            {
+                "route": pd.Categorical.from_codes(trips["route"][trip], self.routes),
+                "company": pd.Categorical.from_codes(
+                    trips["company"][trip], self.companies
+                ),
+                "trip": trip,
+                "lead_days": obs["lead_days"],
+                "price_original": obs["price_original"],
+                "price_discounted": obs["price_discounted"],
+                "discount_rate": np.divide(
+                    price_orig - price_disc,
+                    price_orig,
+                    out=np.zeros_like(price_orig),
+                    where=price_orig > 0,
+                ),
+                "price_vs_final": np.divide(
+                    price_disc,
+                    final_price[trip],
+                    out=np.ones_like(price_disc),
+                    where=final_price[trip] > 0,
+                ),
+            }
+        )
+        return frame[counts[trip] >= min_obs]
+
+    def lead_time_curves(
+        self, by: tuple[str, ...] = ("route", "company"), min_obs: int = 2
+    ) -> pd.DataFrame:
+        """
+        Đường cong giá theo số ngày trước khi đi (lead_days) cho từng nhóm `by`.
+
+        price_vs_final: giá tại lead_days / giá lần quan sát cuối của cùng
+        chuyến (gần ngày đi nhất), trung bình trên các chuyến -> > 1 nghĩa là
+        giá giảm dần khi tới gần ngày đi. Mặc định chỉ lấy chuyến được quan
+        sát ít nhất min_obs lần.
+        """
+        by = list(by)
+        frame = self._observations(min_obs)
+        frame["discounted"] = frame["discount_rate"] > 0
+        return (
+            frame.groupby(by + ["lead_days"], observed=True)
+            .agg(
+                trips=("trip", "size"),
+                price_median=("price_discounted", "median"),
+                price_mean=("price_discounted", "mean"),
+                price_original_mean=("price_original", "mean"),
+                discount_rate_mean=("discount_rate", "mean"),
+                discounted_share=("discounted", "mean"),
+                price_vs_final=("price_vs_final", "mean"),
+            )
+            .reset_index()
+            .sort_values(by + ["lead_days"], ascending=[True] * len(by) + [False])
+            .reset_index(drop=True)
+        )
+
+    def discount_onset(
+        self, by: tuple[str, ...] = ("route", "company"), min_obs: int = 2
+    ) -> pd.DataFrame:
+        """
+        Thống kê thời điểm bắt đầu giảm giá của các chuyến trong từng nhóm.
+
+        Với mỗi chuyến (quan sát >= min_obs lần, theo thứ tự ngày crawl):
+        - onset_lead: lead_days của lần đầu thấy giảm giá (price_discounted <
+          price_original), bỏ qua chuyến đã giảm giá ngay lần quan sát đầu
+          (không biết bắt đầu khi nào -> đếm vào already_discounted);
+        - onset_depth: mức giảm (%) tại lần đó.
+        """
+        data = self.compact()
+        obs, trips, offsets = data["obs"], data["trips"], data["offsets"]
+        counts = np.diff(offsets)
+        valid = np.flatnonzero(counts >= min_obs)
+        if not len(valid):
+            return pd.DataFrame()
+
+        discounted = obs["price_discounted"] < obs["price_original"]
+        # Vị trí lần giảm giá đầu tiên trong mỗi đoạn (không có -> len(obs))
+        positions = np.where(discounted, np.arange(len(discounted)), len(discounted))
+        first_disc = np.minimum.reduceat(positions, offsets[:-1][valid])
+        first_disc = np.minimum(first_disc, offsets[1:][valid])
+        ever = first_disc < offsets[1:][valid]
+        already = ever & (first_disc == offsets[:-1][valid])
+        onset = ever & ~already
+
+        idx = np.minimum(first_disc, len(discounted) - 1)
+        price_orig = obs["price_original"][idx].astype(np.float64)
+        depth = np.divide(
+            price_orig - obs["price_discounted"][idx],
+            price_orig,
+            out=np.zeros_like(price_orig),
+            where=price_orig > 0,
+        )
+        frame = pd.DataFrame(
+            {
+                "route": pd.Categorical.from_codes(trips["route"][valid], self.routes),
+                "company": pd.Categorical.from_codes(
+                    trips["company"][valid], self.companies
+                ),
+                "ever_discounted": ever,
+                "already_discounted": already,
+                "onset_lead": np.where(onset, obs["lead_days"][idx], np.nan),
+                "onset_depth": np.where(onset, depth, np.nan),
+            }
+        )
+        return (
+            frame.groupby(list(by), observed=True)
+            .agg(
+                trips=("ever_discounted", "size"),
+                ever_discounted=("ever_discounted", "sum"),
+                already_discounted=("already_discounted", "sum"),
+                onsets=("onset_lead", "count"),
+                onset_lead_median=("onset_lead", "median"),
+                onset_lead_mean=("onset_lead", "mean"),
+                onset_depth_mean=("onset_depth", "mean"),
+            )
+            .reset_index()
+        )
+
+    # ---------- PERSIST ----------
+    def save(self, path: str = STORE_PATH):
+        self.compact()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        state = dict(vars(self), _compacted=None)
+        joblib.dump(state, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = STORE_PATH) -> "PriceCurveStore":
+        store = cls.__new__(cls)
+        store.__dict__.update(joblib.load(path))
+        return store
+
+
+def update_store(
+    folder: str = PROCESSED_FOLDER, path: str = STORE_PATH, rebuild: bool = False
+) -> PriceCurveStore:
+    """Load store đã lưu và chỉ nạp file processed mới / đã đổi, bỏ file đã xóa."""
+    store = None
+    if os.path.exists(path) and not rebuild:
+        store = PriceCurveStore.load(path)
+        # Store dựng với khóa chuyến khác -> id chuyến không dùng lại được
+        if (
+            getattr(store, "key_cols", None) != TRIP_KEY_COLS
+            or getattr(store, "key_version", 1) != KEY_VERSION
+        ):
+            log(f"{path} dùng khóa chuyến cũ, build lại")
+            store = None
+    if store is None:
+        store = PriceCurveStore()
+
+    files = sorted(glob.glob(os.path.join(folder, "*_cleaned.csv")))
+    removed = set(store.files) - {os.path.basename(f) for f in files}
+    for name in removed:
+        store.drop_source(name)
+        del store.files[name]
+    added = [f for f in files if store.add_file(f)]
+    if added or removed or not os.path.exists(path):
+        store.save(path)
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Đường cong giá theo số ngày trước khi đi qua nhiều lần crawl"
+    )
+    parser.add_argument("--folder", default=PROCESSED_FOLDER)
+    parser.add_argument("--store", default=STORE_PATH)
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument(
+        "--by", nargs="+", default=["route", "company"], choices=GROUP_COLS
+    )
+    parser.add_argument("--route", help='Lọc theo tuyến, ví dụ "Sài Gòn → Đà Lạt"')
+    parser.add_argument("--min-obs", type=int, default=2)
+    parser.add_argument(
+        "--onset", action="store_true", help="Thống kê bắt đầu giảm giá"
+    )
+    parser.add_argument("--out", help="Ghi kết quả ra CSV")
+    args = parser.parse_args()
+
+    start_load = time.perf_counter()
+    store = update_store(args.folder, args.store, args.rebuild)
+    data = store.compact()
+    print(
+        f"Store: {len(store)} chuyến, {len(data['obs']['trip'])} quan sát "
+        f"({time.perf_counter() - start_load:.2f}s)"
+    )
+    for name, collisions in sorted(store.collisions.items()):
+        if collisions["rows"]:
+            print(
+                f"- {name}: {collisions['rows']} dòng trùng khóa chuyến "
+                f"({collisions['price']} khác giá)"
+            )
+
+    start = time.perf_counter()
+    if args.onset:
+        result = store.discount_onset(args.by, args.min_obs)
+    else:
+        result = store.lead_time_curves(args.by, args.min_obs)
+    print(f"Tính xong trong {time.perf_counter() - start:.3f}s")
+
+    if args.route and not result.empty and "route" in result:
+        result = result[result["route"] == args.route]
+    if result.empty:
+        print(f"Chưa có chuyến nào được quan sát >= {args.min_obs} lần")
+    elif args.out:
+        result.to_csv(args.out, index=False)
+        print(f"- Đã lưu {len(result)} dòng vào {args.out}")
+    else:
+        print(result.to_string(index=False))
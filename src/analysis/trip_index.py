@@ -0,0 +1,296 @@
+import argparse
+import glob
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.extract.scheduler import match_route, route_key
+from src.ml.feature_store import file_sha256
+from src.transform.cleaning.dtype_cleaner import ratings_as_float64
+from src.utils.file_utils import crawl_date_from_file_path, read_processed_csv
+from src.utils.log_utils import log
+
+INDEX_PATH = "data/indexes/trip_index.joblib"
+PROCESSED_FOLDER = "data/processed"
+# Cột số lưu trong mỗi bucket (đã sắp theo price_discounted)
+NUMERIC_FIELDS = {
+    "price_discounted": np.int32,
+    "price_original": np.int32,
+    "rating_overall": np.float64,
+    "reviewer_count": np.int32,
+    "number_of_seat": np.int16,
+    "duration_minutes": np.int16,
+    "departure_minute": np.int16,
+}
+# Cột văn bản lưu dạng mã int32 trỏ vào bảng chuỗi dùng chung của index
+TEXT_FIELDS = ["company_name", "pickup_point", "dropoff_point"]
+
+
+def _minutes(times: pd.Series) -> np.ndarray:
+    """ "18:45:00" -> 1125"""
+    parts = times.astype(str).str.split(":", expand=True)
+    return (parts[0].astype(int) * 60 + parts[1].astype(int)).to_numpy(np.int16)
+
+
+# ====================================
+#           INDEX
+# ====================================
+class TripIndex:
+    """
+    Chỉ mục chuyến theo bucket (start_point, destination, departure_date).
+
+    Mỗi bucket là các mảng NumPy song song đã sắp tăng dần theo giá
+    (price_discounted) nên:
+    - top-k rẻ nhất = k phần tử đầu (lọc rating bằng một mask),
+    - khoảng giá = hai lần searchsorted,
+    không phải lọc toàn bộ lịch sử bằng pandas.
+
+    Một bucket là ảnh chụp của lần crawl mới nhất cho tuyến + ngày đó: file
+    mới hơn thay bucket cũ, file cũ hơn (nạp lại không theo thứ tự) bị bỏ qua.
+    """
+
+    def __init__(self):
+        self.buckets: dict[tuple[str, str, str], dict] = {}
+        self.strings: list[str] = []
+        self._codes: dict[str, int] = {}
+        self.files: dict[str, str] = {}
+
+    # ---------- BUILD ----------
+    def _encode(self, values: pd.Series) -> np.ndarray:
+        for value in values.unique():
+            if value not in self._codes:
+                self._codes[value] = len(self.strings)
+                self.strings.append(value)
+        return values.map(self._codes).to_numpy(np.int32)
+
+    def add_frame(self, df: pd.DataFrame, crawl_day: str = "") -> int:
+        """
+        Thêm / thay các bucket từ một DataFrame processed, trả về số bucket đã ghi.
+
+        crawl_day (YYYY_MM_DD ngày crawl của file) để bucket chỉ bị thay bởi lần
+        crawl mới hơn.
+        """
+        df = ratings_as_float64(df).assign(
+            departure_minute=_minutes(df["departure_time"])
+        )
+        keys = ["start_point", "destination", "departure_date"]
+        written = 0
+        for key, group in df.groupby(keys, observed=True, sort=False):
+            key = tuple(str(k) for k in key)
+            old = self.buckets.get(key)
+            if old is not None and old["crawl_day"] > crawl_day:
+                continue
+
+            order = np.argsort(group["price_discounted"].to_numpy(), kind="stable")
+            bucket = {
+                field: group[field].to_numpy(dtype)[order]
+                for field, dtype in NUMERIC_FIELDS.items()
+            }
+            for field in TEXT_FIELDS:
+                bucket[field] = self._encode(group[field].astype(str))[order]
+            bucket["crawl_day"] = crawl_day
+            self.buckets[key] = bucket
+            written += 1
+        return written
+
+    def add_file(self, path: str) -> bool:
+        name = os.path.basename(path)
+        digest = file_sha256(path)
+        if self.files.get(name) == digest:
+            return False
+
+        crawl_day = f"{crawl_date_from_file_path(path):%Y_%m_%d}"
+        written = self.add_frame(read_processed_csv(path), crawl_day)
+        self.files[name] = digest
+        log(f"Trip index {name}: {written} bucket")
+        return True
+
+    # ---------- QUERY ----------
+    def __len__(self) -> int:
+        return sum(len(b["price_discounted"]) for b in self.buckets.values())
+
+    def routes(self) -> list[tuple[str, str]]:
+        return sorted({(start, dest) for start, dest, _ in self.buckets})
+
+    def resolve_route(self, start: str, dest: str) -> tuple[str, str] | None:
+        """
+        Tên tuyến như trong routes.json ("Sài Gòn", "Đà Lạt") -> tuyến lưu trong
+        index ("Sài Gòn", "Đà Lạt - Lâm Đồng") bằng scheduler.match_route;
+        None nếu index không có tuyến nào khớp.
+        """
+        routes = self.routes()
+        if (start, dest) in routes:
+            return start, dest
+        key = match_route(start, dest, [route_key(s, t) for s, t in routes])
+        return tuple(key.split("|")) if key else None
+
+    def _bucket(self, start: str, dest: str, departure_date: str) -> dict | None:
+        bucket = self.buckets.get((start, dest, departure_date))
+        if bucket is None:
+            route = self.resolve_route(start, dest)
+            if route is not None:
+                bucket = self.buckets.get((*route, departure_date))
+        return bucket
+
+    def dates(self, start: str, dest: str) -> list[str]:
+        start, dest = self.resolve_route(start, dest) or (start, dest)
+        return sorted(d for s, t, d in self.buckets if (s, t) == (start, dest))
+
+    def _records(self, bucket: dict, idx: np.ndarray) -> list[dict]:
+        # Lấy từng cột một lần (tolist) rồi ghép, nhanh hơn đọc từng phần tử NumPy
+        columns = {field: bucket[field][idx].tolist() for field in NUMERIC_FIELDS}
+        for field in TEXT_FIELDS:
+            columns[field] = [self.strings[c] for c in bucket[field][idx].tolist()]
+        columns["departure_time"] = [
+            f"{m // 60:02d}:{m % 60:02d}" for m in columns.pop("departure_minute")
+        ]
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    def cheapest(
+        self,
+        start: str,
+        dest: str,
+        departure_date: str,
+        k: int = 5,
+        min_rating: float | None = None,
+        max_price: int | None = None,
+    ) -> list[dict]:
+        """
+        k chuyến rẻ nhất của tuyến trong ngày, tùy chọn rating >= min_rating.
+
+        Tên tuyến được resolve như resolve_route ("Đà Lạt" -> "Đà Lạt - Lâm Đồng").
+        """
+        bucket = self._bucket(start, dest, departure_date)
+        if bucket is None:
+            return []
+        prices = bucket["price_discounted"]
+        end = (
+            len(prices)
+            if max_price is None
+            else np.searchsorted(prices, max_price, "right")
+        )
+        if min_rating is None:
+            return self._records(bucket, np.arange(min(k, end)))
+        idx = np.flatnonzero(bucket["rating_overall"][:end] >= min_rating)[:k]
+        return self._records(bucket, idx)
+
+    def price_range(
+        self,
+        start: str,
+        dest: str,
+        departure_date: str,
+        low: int,
+        high: int,
+        min_rating: float | None = None,
+    ) -> list[dict]:
+        """Các chuyến có giá trong [low, high], sắp theo giá (tên tuyến như cheapest)."""
+        bucket = self._bucket(start, dest, departure_date)
+        if bucket is None:
+            return []
+        prices = bucket["price_discounted"]
+        lo = np.searchsorted(prices, low, "left")
+        hi = np.searchsorted(prices, high, "right")
+        idx = np.arange(lo, hi)
+        if min_rating is not None:
+            idx = idx[bucket["rating_overall"][lo:hi] >= min_rating]
+        return self._records(bucket, idx)
+
+    # ---------- PERSIST ----------
+    def save(self, path: str = INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        # Lưu dạng dict để load được dù ghi từ `python -m src.analysis.trip_index`
+        joblib.dump(dict(vars(self)), tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = INDEX_PATH) -> "TripIndex":
+        index = cls.__new__(cls)
+        index.__dict__.update(joblib.load(path))
+        return index
+
+
+def update_index(
+    folder: str = PROCESSED_FOLDER, path: str = INDEX_PATH, rebuild: bool = False
+) -> TripIndex:
+    """Load index đã lưu và chỉ nạp các file processed mới / đã đổi nội dung."""
+    if os.path.exists(path) and not rebuild:
+        index = TripIndex.load(path)
+        # Index ghi với kiểu cột cũ (ví dụ rating float32) -> build lại
+        if any(
+            bucket[field].dtype != dtype
+            for bucket in index.buckets.values()
+            for field, dtype in NUMERIC_FIELDS.items()
+        ):
+            index = TripIndex()
+    else:
+        index = TripIndex()
+
+    files = sorted(glob.glob(os.path.join(folder, "*_cleaned.csv")))
+    added = [f for f in files if index.add_file(f)]
+    if added or not os.path.exists(path):
+        index.save(path)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build / truy vấn chỉ mục chuyến theo tuyến + ngày đi"
+    )
+    parser.add_argument("--folder", default=PROCESSED_FOLDER)
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument("--route", nargs=2, metavar=("FROM", "TO"))
+    parser.add_argument("--date", help="YYYY-MM-DD")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--min-rating", type=float, default=None)
+    parser.add_argument(
+        "--bench", type=int, default=0, help="Đo latency N truy vấn ngẫu nhiên"
+    )
+    args = parser.parse_args()
+
+    start_load = time.perf_counter()
+    index = update_index(args.folder, args.index, args.rebuild)
+    print(
+        f"Index: {len(index)} chuyến, {len(index.buckets)} bucket, "
+        f"{len(index.routes())} tuyến ({time.perf_counter() - start_load:.2f}s)"
+    )
+
+    if args.route and args.date:
+        route = index.resolve_route(*args.route)
+        if route is None:
+            print(
+                f"Không có tuyến {' → '.join(args.route)} trong index. Các tuyến: "
+                + ", ".join(f"{s} → {t}" for s, t in index.routes())
+            )
+        elif args.date not in index.dates(*route):
+            print(
+                f"Tuyến {' → '.join(route)} không có ngày đi {args.date}. "
+                f"Các ngày: {', '.join(index.dates(*route))}"
+            )
+        else:
+            rows = index.cheapest(*route, args.date, args.k, args.min_rating)
+            print(f"Tuyến {' → '.join(route)}, ngày đi {args.date}:")
+            print(pd.DataFrame(rows).to_string(index=False))
+
+    if args.bench:
+        rng = np.random.default_rng(0)
+        keys = list(index.buckets)
+        timings = {"cheapest": [], "price_range": []}
+        for _ in range(args.bench):
+            key = keys[rng.integers(len(keys))]
+            t0 = time.perf_counter()
+            index.cheapest(*key, k=5, min_rating=4.5)
+            t1 = time.perf_counter()
+            index.price_range(*key, 200_000, 300_000)
+            t2 = time.perf_counter()
+            timings["cheapest"].append(t1 - t0)
+            timings["price_range"].append(t2 - t1)
+        for name, values in timings.items():
+            print(
+                f"{name}: p50 {np.percentile(values, 50) * 1e6:.1f} µs, "
+                f"p99 {np.percentile(values, 99) * 1e6:.1f} µs"
+            )
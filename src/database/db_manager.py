@@ -1,6 +1,110 @@
+import json
 import psycopg2
 from typing import Optional, Dict, Any
 
+# ==================== CHANGE-DATA CAPTURE SQL ====================
+TRIP_KEY_COLS = [
+    "company_id",
+    "route_id",
+    "departure_date",
+    "departure_time",
+    "pickup_point",
+    "dropoff_point",
+    # Địa chỉ gốc: pickup/dropoff_point chỉ còn 3 loại nên không đủ phân biệt
+    "pickup_address",
+    "dropoff_address",
+    "number_of_seat",
+]
+TRIP_VALUE_CASTS = {
+    "arrival_time": "time",
+    "duration_minutes": "integer",
+    "price_original": "numeric(10,0)",
+    "price_discounted": "numeric(10,0)",
+}
+RATING_VALUE_CASTS = {
+    "reviewer_count": "integer",
+    "rating_overall": "numeric(3,2)",
+    "rating_safety": "numeric(3,2)",
+    "rating_info_accuracy": "numeric(3,2)",
+    "rating_info_completeness": "numeric(3,2)",
+    "rating_staff_attitude": "numeric(3,2)",
+    "rating_comfort": "numeric(3,2)",
+    "rating_service_quality": "numeric(3,2)",
+    "rating_punctuality": "numeric(3,2)",
+}
+
+
+def _version_sql(table: str, key_cols: list[str], casts: Dict[str, str]) -> list[str]:
+    """
+    Ba câu lệnh ghi phiên bản (chạy theo thứ tự trong cùng transaction):
+
+    1. Cùng ngày crawl với phiên bản hiện tại nhưng giá trị khác -> sửa tại chỗ.
+    2. Phiên bản hiện tại cũ hơn và giá trị khác -> đóng lại (valid_to = ngày crawl).
+    3. Không còn phiên bản hiện tại -> thêm phiên bản mới từ ngày crawl.
+
+    Crawl cũ hơn phiên bản hiện tại (nạp không theo thứ tự ngày) không đổi gì.
+    """
+    key = " AND ".join(f"{col} = %({col})s" for col in key_cols)
+    cols = ", ".join(casts)
+    changed = (
+        f"({cols}) IS DISTINCT FROM "
+        f"({', '.join(f'%({col})s::{cast}' for col, cast in casts.items())})"
+    )
+    return [
+        f"""
+        UPDATE {table} SET {", ".join(f"{col} = %({col})s" for col in casts)}
+        WHERE {key} AND valid_to IS NULL AND valid_from = %(crawl_date)s
+          AND {changed}
+        """,
+        f"""
+        UPDATE {table} SET valid_to = %(crawl_date)s
+        WHERE {key} AND valid_to IS NULL AND valid_from < %(crawl_date)s
+          AND {changed}
+        """,
+        f"""
+        INSERT INTO {table} ({", ".join(key_cols)}, valid_from, {cols})
+        SELECT {", ".join(f"%({col})s" for col in key_cols)}, %(crawl_date)s,
+               {", ".join(f"%({col})s" for col in casts)}
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {table} WHERE {key} AND valid_to IS NULL
+        )
+        """,
+    ]
+
+
+TRIP_VERSION_SQL = _version_sql("trip_versions", ["trip_key_id"], TRIP_VALUE_CASTS)
+RATING_VERSION_SQL = _version_sql(
+    "company_route_rating_versions", ["company_id", "route_id"], RATING_VALUE_CASTS
+)
+
+_VALID_AT = (
+    "{t}.valid_from <= %(as_of)s AND ({t}.valid_to IS NULL OR {t}.valid_to > %(as_of)s)"
+)
+STATE_AS_OF_SQL = f"""
+    SELECT
+        bc.company_name, sc.city_name AS start_point, dc.city_name AS destination,
+        tk.departure_date, tk.departure_time, tv.arrival_time,
+        tk.pickup_point, tk.dropoff_point, tk.pickup_address, tk.dropoff_address,
+        tk.number_of_seat, tv.duration_minutes,
+        tv.price_original, tv.price_discounted, tv.valid_from AS price_valid_from,
+        rv.reviewer_count, rv.rating_overall, rv.rating_safety,
+        rv.rating_info_accuracy, rv.rating_info_completeness,
+        rv.rating_staff_attitude, rv.rating_comfort, rv.rating_service_quality,
+        rv.rating_punctuality, rv.valid_from AS rating_valid_from
+    FROM trip_keys tk
+    JOIN trip_versions tv
+        ON tv.trip_key_id = tk.trip_key_id AND {_VALID_AT.format(t="tv")}
+    JOIN bus_companies bc ON bc.company_id = tk.company_id
+    JOIN routes r ON r.route_id = tk.route_id
+    JOIN cities sc ON sc.city_id = r.start_city_id
+    JOIN cities dc ON dc.city_id = r.destination_city_id
+    LEFT JOIN company_route_rating_versions rv
+        ON rv.company_id = tk.company_id AND rv.route_id = tk.route_id
+       AND {_VALID_AT.format(t="rv")}
+    ORDER BY sc.city_name, dc.city_name, tk.departure_date, tk.departure_time,
+             bc.company_name
+"""
+
 
 class DatabaseManager:
     """Quản lý kết nối và thao tác với PostgreSQL."""
@@ -18,6 +122,22 @@ class DatabaseManager:
         )
         self.cur = self.conn.cursor()
 
+    @classmethod
+    def from_config(
+        cls, config_path: str = "src/database/config.json", database: str = None
+    ) -> "DatabaseManager":
+        """Tạo kết nối từ mục DB_CONNECTION trong config.json (có thể đổi database)."""
+        with open(config_path, "r", encoding="utf-8") as f:
+            db_config = json.load(f)["DB_CONNECTION"]
+
+        return cls(
+            database=database or db_config["DATABASE"],
+            user=db_config["USER"],
+            password=db_config["PASSWORD"],
+            host=db_config.get("HOST", "localhost"),
+            port=db_config.get("PORT", 5432),
+        )
+
     # ==================== CORE ====================
 
     def execute(self, query: str, params: tuple = None) -> bool:
@@ -105,7 +225,7 @@ class DatabaseManager:
     def insert_company_route_rating(
         self, company_id: int, route_id: int, data: Dict[str, Any], crawl_date: str
     ) -> bool:
-        """Lưu rating theo tuyến và ngày."""
+        """Lưu rating theo tuyến và ngày (nạp lại cùng ngày crawl -> ghi đè)."""
         query = """
             INSERT INTO company_route_ratings (
                 company_id, route_id, crawl_date, reviewer_count,
@@ -114,7 +234,16 @@ class DatabaseManager:
                 rating_comfort, rating_service_quality, rating_punctuality
             )
             VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            ON CONFLICT (company_id, route_id, crawl_date) DO NOTHING
+            ON CONFLICT (company_id, route_id, crawl_date) DO UPDATE SET
+                reviewer_count = EXCLUDED.reviewer_count,
+                rating_overall = EXCLUDED.rating_overall,
+                rating_safety = EXCLUDED.rating_safety,
+                rating_info_accuracy = EXCLUDED.rating_info_accuracy,
+                rating_info_completeness = EXCLUDED.rating_info_completeness,
+                rating_staff_attitude = EXCLUDED.rating_staff_attitude,
+                rating_comfort = EXCLUDED.rating_comfort,
+                rating_service_quality = EXCLUDED.rating_service_quality,
+                rating_punctuality = EXCLUDED.rating_punctuality
         """
         params = (
             company_id,
@@ -140,9 +269,9 @@ class DatabaseManager:
                 company_id, route_id, number_of_seat,
                 departure_date, departure_time, arrival_time,
                 duration_minutes, pickup_point, dropoff_point,
-                price_original, price_discounted
+                price_original, price_discounted, crawl_date
             )
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,COALESCE(%s, CURRENT_DATE))
             RETURNING trip_id
         """
         params = (
@@ -157,9 +286,134 @@ class DatabaseManager:
             trip.get("dropoff_point"),
             trip["price_original"],
             trip["price_discounted"],
+            trip.get("crawl_date"),
         )
         return self.execute_returning_id(query, params)
 
+    def delete_trips(self, crawl_date: str, departure_dates: list[str]) -> int:
+        """Xóa các chuyến của một lần crawl (để nạp lại không bị trùng dòng)."""
+        query = """
+            DELETE FROM trips
+            WHERE crawl_date = %s AND departure_date = ANY(%s::date[])
+        """
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(query, (crawl_date, list(departure_dates)))
+                deleted = cur.rowcount
+            self.conn.commit()
+            return deleted
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error deleting trips: {e}")
+            raise
+
+    # ==================== CHANGE-DATA CAPTURE ====================
+
+    def get_or_insert_trip_key(self, key: Dict[str, Any]) -> int:
+        """Định danh ổn định của chuyến theo TRIP_KEY_COLS (địa chỉ đón/trả gốc, số ghế...)."""
+        query = f"""
+            SELECT trip_key_id FROM trip_keys
+            WHERE {" AND ".join(f"{col} = %({col})s" for col in TRIP_KEY_COLS)}
+            LIMIT 1
+        """
+        result = self.fetch_one(query, key)
+        if result:
+            return result[0]
+
+        insert_q = f"""
+            INSERT INTO trip_keys ({", ".join(TRIP_KEY_COLS)})
+            VALUES ({", ".join(f"%({col})s" for col in TRIP_KEY_COLS)})
+            RETURNING trip_key_id
+        """
+        return self.execute_returning_id(insert_q, key)
+
+    def close_missing_trip_versions(
+        self,
+        route_id: int,
+        departure_date: str,
+        seen_trip_key_ids: list[int],
+        crawl_date: str,
+    ) -> int:
+        """
+        Đóng (valid_to = crawl_date) phiên bản hiện tại của các chuyến cùng
+        tuyến + ngày đi không còn trong lần crawl này (bị gỡ khỏi danh sách).
+
+        Returns:
+            int: số chuyến bị đóng.
+        """
+        query = """
+            UPDATE trip_versions tv SET valid_to = %s
+            FROM trip_keys tk
+            WHERE tv.trip_key_id = tk.trip_key_id
+              AND tv.valid_to IS NULL AND tv.valid_from < %s
+              AND tk.route_id = %s AND tk.departure_date = %s
+              AND NOT (tk.trip_key_id = ANY(%s))
+        """
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    query,
+                    (
+                        crawl_date,
+                        crawl_date,
+                        route_id,
+                        departure_date,
+                        list(seen_trip_key_ids),
+                    ),
+                )
+                closed = cur.rowcount
+            self.conn.commit()
+            return closed
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error closing trip versions: {e}")
+            raise
+
+    def _write_version(self, statements: list[str], params: Dict[str, Any]) -> bool:
+        """Chạy các câu lệnh version trong một transaction; True nếu có thay đổi được ghi."""
+        try:
+            changed = 0
+            with self.conn.cursor() as cur:
+                for query in statements:
+                    cur.execute(query, params)
+                    changed += cur.rowcount
+            self.conn.commit()
+            return changed > 0
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error writing version: {e}")
+            raise
+
+    def upsert_trip_version(
+        self, trip_key_id: int, data: Dict[str, Any], crawl_date: str
+    ) -> bool:
+        """Ghi giá / giờ đến của chuyến nếu khác phiên bản hiện tại."""
+        params = {**data, "trip_key_id": trip_key_id, "crawl_date": crawl_date}
+        return self._write_version(TRIP_VERSION_SQL, params)
+
+    def upsert_company_route_rating_version(
+        self, company_id: int, route_id: int, data: Dict[str, Any], crawl_date: str
+    ) -> bool:
+        """Ghi rating theo tuyến nếu khác phiên bản hiện tại."""
+        params = {
+            **data,
+            "company_id": company_id,
+            "route_id": route_id,
+            "crawl_date": crawl_date,
+        }
+        return self._write_version(RATING_VERSION_SQL, params)
+
+    def get_state_as_of(self, as_of: str) -> tuple[list[str], list[tuple]]:
+        """
+        Dựng lại trạng thái (giá chuyến + rating tuyến) đúng như tại ngày as_of.
+
+        Returns:
+            (tên cột, danh sách dòng)
+        """
+        self.cur.execute(STATE_AS_OF_SQL, {"as_of": as_of})
+        columns = [desc[0] for desc in self.cur.description]
+        return columns, self.cur.fetchall()
+
     # ==================== CLEANUP ====================
 
     def close(self):
@@ -0,0 +1,42 @@
+import argparse
+import glob
+import os
+
+from src.database.db_manager import DatabaseManager
+from src.utils.log_utils import log
+
+MIGRATIONS_DIR = "src/sql/migrations"
+
+
+def apply_migrations(db: DatabaseManager, folder: str = MIGRATIONS_DIR) -> list[str]:
+    """
+    Chạy lần lượt các file migration (*.sql, theo tên) trên database đã có.
+
+    Mỗi file viết idempotent (IF NOT EXISTS) nên chạy lại không lỗi và không
+    cần bảng ghi nhận phiên bản. Database mới tạo từ schema.sql đã có sẵn các
+    thay đổi này. Lỗi ở một file dừng ngay (rollback) thay vì bỏ qua.
+    """
+    applied = []
+    for path in sorted(glob.glob(os.path.join(folder, "*.sql"))):
+        with open(path, "r", encoding="utf-8") as f:
+            sql = f.read()
+        try:
+            db.cur.execute(sql)
+            db.conn.commit()
+        except Exception:
+            db.conn.rollback()
+            raise
+        applied.append(os.path.basename(path))
+        log(f"Migration {os.path.basename(path)}: OK")
+    return applied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cập nhật schema database đã có theo src/sql/migrations"
+    )
+    parser.add_argument("--database", help="Mặc định: DATABASE trong config.json")
+    args = parser.parse_args()
+
+    with DatabaseManager.from_config(database=args.database) as db:
+        apply_migrations(db)
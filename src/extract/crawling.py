@@ -4,19 +4,24 @@ from .trip_actions import (
     set_search_filters,
     show_more_trips,
 )
+from src.utils.metrics_utils import timed
 from src.utils.selenium_utils import create_driver
 import time
 
 
-def crawl_vexere(start_city, dest_city, days=0):
-    driver = create_driver(headless=False)
-    driver.get("https://vexere.com/")
+@timed("crawl.crawl_vexere")
+def crawl_vexere(
+    start_city, dest_city, days=0, base_url="https://vexere.com/", headless=False
+):
+    """base_url / headless cho phép chạy trên site giả lập (benchmarks/replay_site.py)"""
+    driver = create_driver(headless=headless)
+    driver.get(base_url)
 
     set_search_filters(driver, start_city, dest_city, days)
     click_search_button(driver)
     time.sleep(2)
     show_more_trips(driver, max_click=6)
 
-    df = crawl_and_parse_each_trip(driver)
+    df = crawl_and_parse_each_trip(driver, route=f"{start_city} → {dest_city}")
     driver.quit()
     return df
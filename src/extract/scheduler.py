@@ -0,0 +1,234 @@
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import unicodedata
+from datetime import date, timedelta
+
+import pandas as pd
+
+from src.utils.file_utils import crawl_date_from_file_path, load_routes
+from src.utils.log_utils import log
+
+STATE_PATH = "data/scheduler_state.json"
+DEFAULT_OFFSETS = list(range(1, 8))
+# Một chuyến "giống nhau" giữa hai lần crawl
+SLOT_COLS = [
+    "company_name",
+    "departure_time",
+    "pickup_point",
+    "dropoff_point",
+    "number_of_seat",
+]
+# Prior Gamma(a, b) cho tốc độ thay đổi (lần / chuyến / ngày): tuyến chưa có
+# lịch sử được coi là thay đổi 0.5 lần/ngày và luôn được ưu tiên thử
+PRIOR_CHANGES = 1.0
+PRIOR_EXPOSURE = 2.0
+DEFAULT_TRIPS = 100
+# Ngày đi chưa crawl lần nào được coi như đã crawl cách đây ngần này ngày
+# (để tuyến ít biến động không chiếm hết ngân sách chỉ vì có ngày chưa xem)
+UNSEEN_AGE_DAYS = 7
+TRIPS_EMA = 0.3
+
+
+# ====================================
+#           HELPERS
+# ====================================
+def _compact(name: str) -> str:
+    """ "Sa Pa - Lào Cai" -> "sapalaocai" (bỏ dấu, khoảng trắng, dấu câu)."""
+    text = unicodedata.normalize("NFD", name.casefold()).replace("đ", "d")
+    return re.sub(
+        r"[^a-z0-9]", "", "".join(c for c in text if not unicodedata.combining(c))
+    )
+
+
+def route_key(start: str, dest: str) -> str:
+    return f"{start}|{dest}"
+
+
+def match_route(start: str, dest: str, known: list[str]) -> str | None:
+    """
+    Tên tuyến trong routes.json ("Nha Trang", "SaPa") -> khóa tuyến trong
+    data/processed ("Nha Trang - Khánh Hòa", "Sa Pa - Lào Cai").
+    """
+    start_c, dest_c = _compact(start), _compact(dest)
+    for key in known:
+        known_start, known_dest = key.split("|")
+        if _compact(known_start) == start_c and dest_c in _compact(known_dest):
+            return key
+    return None
+
+
+def load_state(path: str = STATE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {"files": [], "routes": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: dict, path: str = STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# ====================================
+#           THỐNG KÊ THEO TUYẾN
+# ====================================
+def _compare(prev: dict, slots: dict) -> tuple[int, int]:
+    """(số chuyến đổi giá / xuất hiện / biến mất, số chuyến so sánh)."""
+    union = prev.keys() | slots.keys()
+    changed = sum(prev.get(k) != slots.get(k) for k in union)
+    return changed, len(union)
+
+
+def observe(stats: dict, departure_date: str, crawl_date: date, slots: dict):
+    """
+    Ghi một lần crawl (tuyến, ngày đi) vào stats của tuyến.
+
+    Chỉ so với lần crawl trước của cùng ngày đi (crawl lại): ngày đi khác có
+    lịch / giá khác hẳn nên không tính là thay đổi; ngày đi chưa crawl lần nào
+    do prior Gamma lo. Số thay đổi chia cho khoảng cách ngày crawl -> tốc độ
+    thay đổi theo ngày.
+    """
+    observed = stats.setdefault("observed", {})
+    prev = observed.get(departure_date)
+
+    if prev is not None:
+        gap = (crawl_date - date.fromisoformat(prev["crawl_date"])).days
+        if gap > 0:
+            changed, compared = _compare(prev["slots"], slots)
+            stats["changes"] = stats.get("changes", 0) + changed
+            stats["exposure"] = stats.get("exposure", 0) + compared * gap
+
+    observed[departure_date] = {"crawl_date": str(crawl_date), "slots": slots}
+    stats["trips"] = round(
+        TRIPS_EMA * len(slots) + (1 - TRIPS_EMA) * stats.get("trips", len(slots)), 1
+    )
+    stats["last_crawl"] = max(stats.get("last_crawl", ""), str(crawl_date))
+
+    # Chỉ giữ ngày đi chưa qua (không còn được crawl lại)
+    for day in [d for d in observed if d < stats["last_crawl"]]:
+        del observed[day]
+
+
+def update_state(folder: str = "data/processed", path: str = STATE_PATH) -> dict:
+    """Cập nhật thống kê từ các file processed mới (theo thứ tự ngày crawl) và lưu lại."""
+    state = load_state(path)
+    seen = set(state["files"])
+    # Tên file theo ngày đi ("<ngày đi>_d<offset>"): sắp theo ngày crawl suy ra
+    # từ tên, không theo tên file
+    files = sorted(
+        (
+            f
+            for f in glob.glob(os.path.join(folder, "*.csv"))
+            if os.path.basename(f) not in seen
+        ),
+        key=lambda f: (crawl_date_from_file_path(f), os.path.basename(f)),
+    )
+    for file_path in files:
+        crawl_date = crawl_date_from_file_path(file_path)
+        df = pd.read_csv(
+            file_path,
+            usecols=SLOT_COLS
+            + ["start_point", "destination", "departure_date", "price_discounted"],
+        )
+        df["slot"] = df[SLOT_COLS].astype(str).agg("|".join, axis=1)
+        groups = df.groupby(["start_point", "destination", "departure_date"])
+        for (start, dest, departure_date), g in groups:
+            stats = state["routes"].setdefault(route_key(start, dest), {})
+            slots = dict(zip(g["slot"], g["price_discounted"].astype(float)))
+            observe(stats, departure_date, crawl_date, slots)
+        state["files"].append(os.path.basename(file_path))
+
+    if files:
+        save_state(state, path)
+        log(f"Scheduler: cập nhật {len(files)} file, {len(state['routes'])} tuyến")
+    return state
+
+
+def change_rate(stats: dict) -> float:
+    """Tốc độ thay đổi ước lượng (lần / chuyến / ngày), trung bình hậu nghiệm Gamma."""
+    return (stats.get("changes", 0) + PRIOR_CHANGES) / (
+        stats.get("exposure", 0) + PRIOR_EXPOSURE
+    )
+
+
+# ====================================
+#           LẬP KẾ HOẠCH CRAWL
+# ====================================
+def plan_crawl(
+    state: dict,
+    routes: list[tuple[str, str]],
+    budget: int,
+    offsets: list[int] = DEFAULT_OFFSETS,
+    today: date | None = None,
+) -> list[dict]:
+    """
+    Chọn budget cặp (tuyến, ngày đi) nên crawl lại (mỗi cặp = một phiên trình duyệt).
+
+    Điểm của một cặp = số chuyến dự kiến đã thay đổi kể từ lần crawl trước:
+    trips * (1 - exp(-rate * tuổi)), với tuổi tính bằng ngày (chưa crawl ngày đi
+    đó -> UNSEEN_AGE_DAYS).
+
+    Returns:
+        list[dict]: from_city, to_city, days_offset, departure_date, rate, age_days,
+        expected_changes; sắp theo điểm giảm dần.
+    """
+    today = today or date.today()
+    known = list(state["routes"])
+    candidates = []
+
+    for start, dest in routes:
+        key = match_route(start, dest, known)
+        stats = state["routes"].get(key, {}) if key else {}
+        rate = change_rate(stats)
+        trips = stats.get("trips", DEFAULT_TRIPS)
+        observed = stats.get("observed", {})
+
+        for offset in offsets:
+            departure_date = str(today + timedelta(days=offset))
+            last = observed.get(departure_date)
+            if last is None:
+                age = UNSEEN_AGE_DAYS
+            else:
+                age = (today - date.fromisoformat(last["crawl_date"])).days
+            stale = 1 - math.exp(-rate * age)
+            candidates.append(
+                {
+                    "from_city": start,
+                    "to_city": dest,
+                    "days_offset": offset,
+                    "departure_date": departure_date,
+                    "rate": round(rate, 4),
+                    "age_days": age,
+                    "expected_changes": round(trips * stale, 2),
+                }
+            )
+
+    # Cùng điểm thì ưu tiên ngày đi gần hơn
+    candidates.sort(key=lambda c: (-c["expected_changes"], c["days_offset"]))
+    return candidates[:budget]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Chọn các cặp (tuyến, ngày đi) nên crawl lại trong một ngân sách"
+    )
+    parser.add_argument("--budget", type=int, default=24, help="Số phiên crawl")
+    parser.add_argument("--offsets", type=int, nargs="+", default=DEFAULT_OFFSETS)
+    parser.add_argument("--routes", default="routes.json")
+    parser.add_argument("--folder", default="data/processed")
+    parser.add_argument("--state", default=STATE_PATH)
+    parser.add_argument("--today", type=date.fromisoformat, help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    state = update_state(args.folder, args.state)
+    plan = plan_crawl(
+        state, load_routes(args.routes), args.budget, args.offsets, args.today
+    )
+    print(pd.DataFrame(plan).to_string(index=False))
@@ -0,0 +1,469 @@
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from src.utils.file_utils import crawl_file_name
+from src.utils.log_utils import log
+from src.utils.metrics_utils import RUN_REPORT, write_run_report
+
+QUEUE_PATH = "data/queue/crawl_tasks.sqlite"
+SINK_DIR = "data/queue/results"
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+# Thử lại sau RETRY_BACKOFF * 2^(lần thử - 1) giây
+RETRY_BACKOFF = 60
+POLL_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id        INTEGER PRIMARY KEY,
+    from_city      TEXT NOT NULL,
+    to_city        TEXT NOT NULL,
+    departure_date TEXT NOT NULL,
+    status         TEXT NOT NULL DEFAULT 'pending',
+    attempts       INTEGER NOT NULL DEFAULT 0,
+    max_attempts   INTEGER NOT NULL,
+    available_at   REAL NOT NULL DEFAULT 0,
+    lease_owner    TEXT,
+    lease_expires  REAL,
+    last_error     TEXT,
+    result_path    TEXT,
+    rows           INTEGER,
+    crawl_date     TEXT,
+    updated_at     REAL,
+    UNIQUE (from_city, to_city, departure_date)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, available_at);
+"""
+
+
+# ====================================
+#           QUEUE
+# ====================================
+class CrawlTaskQueue:
+    """
+    Hàng đợi task crawl (một task = một cặp tuyến + ngày đi) trên một file SQLite.
+
+    Không cần broker: mọi máy worker mở cùng file (ổ chia sẻ có khóa file hoạt
+    động đúng, ví dụ SMB / NFSv4 có lock). Mỗi thao tác là một transaction
+    BEGIN IMMEDIATE nên hai worker không thể nhận cùng một task.
+
+    Vòng đời task: pending -> leased -> done, hoặc quay lại pending (thử lại có
+    backoff) khi lỗi / hết hạn lease mà không heartbeat; hết MAX_ATTEMPTS -> failed.
+    """
+
+    def __init__(self, path: str = QUEUE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            conn.executescript(SCHEMA)
+            # File hàng đợi tạo trước khi có cột crawl_date
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+            if "crawl_date" not in columns:
+                conn.execute("ALTER TABLE tasks ADD COLUMN crawl_date TEXT")
+                conn.commit()
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # ---------- PRODUCER ----------
+    def enqueue(
+        self, tasks: list[tuple[str, str, str]], max_attempts: int = MAX_ATTEMPTS
+    ) -> int:
+        """Thêm các task (from_city, to_city, departure_date); task đã có bị bỏ qua."""
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO tasks
+                    (from_city, to_city, departure_date, max_attempts, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [(*task, max_attempts, time.time()) for task in tasks],
+            )
+            return conn.total_changes - before
+
+    # ---------- WORKER ----------
+    def lease(self, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> dict | None:
+        """Nhận task sẵn sàng có ngày đi gần nhất, hoặc None nếu hết việc."""
+        now = time.time()
+        today = str(date.today())
+        with self._transaction() as conn:
+            # Lease hết hạn (worker chết / mất mạng) -> trả lại hàng đợi
+            conn.execute(
+                """
+                UPDATE tasks
+                SET status = CASE WHEN attempts >= max_attempts
+                                  THEN 'failed' ELSE 'pending' END,
+                    last_error = 'lease expired', lease_owner = NULL, updated_at = ?
+                WHERE status = 'leased' AND lease_expires < ?
+                """,
+                (now, now),
+            )
+            conn.execute(
+                """
+                UPDATE tasks SET status = 'failed', last_error = 'departure passed',
+                    updated_at = ?
+                WHERE status = 'pending' AND departure_date < ?
+                """,
+                (now, today),
+            )
+            row = conn.execute(
+                """
+                SELECT * FROM tasks
+                WHERE status = 'pending' AND available_at <= ?
+                ORDER BY departure_date, task_id
+                LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                """
+                UPDATE tasks
+                SET status = 'leased', attempts = attempts + 1, lease_owner = ?,
+                    lease_expires = ?, updated_at = ?
+                WHERE task_id = ?
+                """,
+                (worker_id, now + lease_seconds, now, row["task_id"]),
+            )
+        return {**dict(row), "attempts": row["attempts"] + 1}
+
+    def heartbeat(
+        self, task_id: int, worker_id: str, lease_seconds: int = LEASE_SECONDS
+    ) -> bool:
+        """Gia hạn lease; False nếu worker đã mất task (lease hết hạn, bị nhận lại)."""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                """
+                UPDATE tasks SET lease_expires = ?, updated_at = ?
+                WHERE task_id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                (time.time() + lease_seconds, time.time(), task_id, worker_id),
+            )
+            return cur.rowcount == 1
+
+    def complete(
+        self,
+        task_id: int,
+        worker_id: str,
+        result_path: str,
+        rows: int,
+        crawl_date: str | None = None,
+    ) -> bool:
+        """Đánh dấu task xong; crawl_date (YYYY-MM-DD) là ngày bắt đầu crawl task."""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                """
+                UPDATE tasks
+                SET status = 'done', result_path = ?, rows = ?, crawl_date = ?,
+                    lease_owner = NULL, last_error = NULL, updated_at = ?
+                WHERE task_id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                (result_path, rows, crawl_date, time.time(), task_id, worker_id),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, task_id: int, worker_id: str, error: str) -> str | None:
+        """Ghi lỗi; trả về trạng thái mới ('pending' nếu còn lượt thử, 'failed')."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM tasks "
+                "WHERE task_id = ? AND status = 'leased' AND lease_owner = ?",
+                (task_id, worker_id),
+            ).fetchone()
+            if row is None:
+                return None
+            status = "failed" if row["attempts"] >= row["max_attempts"] else "pending"
+            conn.execute(
+                """
+                UPDATE tasks
+                SET status = ?, last_error = ?, lease_owner = NULL,
+                    available_at = ?, updated_at = ?
+                WHERE task_id = ?
+                """,
+                (
+                    status,
+                    error[:500],
+                    now + RETRY_BACKOFF * 2 ** (row["attempts"] - 1),
+                    now,
+                    task_id,
+                ),
+            )
+        return status
+
+    # ---------- INSPECT ----------
+    def counts(self) -> dict[str, int]:
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS n FROM tasks GROUP BY status"
+            ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def tasks(self, status: str | None = None) -> list[dict]:
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT * FROM tasks WHERE ? IS NULL OR status = ? ORDER BY task_id",
+                (status, status),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+# ====================================
+#           SINK
+# ====================================
+def result_path(task: dict, sink_dir: str = SINK_DIR) -> str:
+    return os.path.join(sink_dir, f"task_{task['task_id']:06d}.csv")
+
+
+def write_result(df: pd.DataFrame, task: dict, sink_dir: str = SINK_DIR) -> str:
+    """
+    Ghi kết quả một task vào sink (thư mục chia sẻ) qua file tạm + rename:
+    người đọc không bao giờ thấy file ghi dở, và một task chạy trùng chỉ ghi đè
+    đúng file của nó.
+    """
+    os.makedirs(sink_dir, exist_ok=True)
+    path = result_path(task, sink_dir)
+    tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def task_crawl_date(task: dict) -> date:
+    """Ngày crawl của task đã xong (task cũ chưa ghi crawl_date -> ngày hoàn thành)."""
+    if task.get("crawl_date"):
+        return date.fromisoformat(task["crawl_date"])
+    return datetime.fromtimestamp(task["updated_at"]).date()
+
+
+def merge_results(queue: CrawlTaskQueue, out_dir: str = "data/raw") -> dict[str, int]:
+    """
+    Gộp kết quả các task đã xong thành file raw, mỗi (ngày crawl, days_offset)
+    một file <crawl_file_name>_raw.csv như main.py / run_pipeline, để
+    crawl_date_from_file_path và các bước theo ngày nhận đúng ngày của từng
+    dòng. File cùng tên đã có bị ghi đè.
+
+    Returns:
+        dict: tên file -> số dòng.
+    """
+    groups: dict[tuple[date, int], list[str]] = {}
+    for task in queue.tasks("done"):
+        if not task["result_path"]:
+            continue
+        departure = date.fromisoformat(task["departure_date"])
+        crawl_day = task_crawl_date(task)
+        key = (departure, (departure - crawl_day).days)
+        groups.setdefault(key, []).append(task["result_path"])
+
+    os.makedirs(out_dir, exist_ok=True)
+    written = {}
+    for (departure, days_offset), paths in sorted(groups.items()):
+        dfs = [pd.read_csv(p) for p in paths if os.path.getsize(p) > 1]
+        df = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+        name = f"{crawl_file_name(departure, days_offset)}_raw.csv"
+        out_path = os.path.join(out_dir, name)
+        tmp_path = f"{out_path}.tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, out_path)
+        written[name] = len(df)
+    return written
+
+
+# ====================================
+#           WORKER
+# ====================================
+class _Heartbeat(threading.Thread):
+    """Gia hạn lease định kỳ trong lúc crawl (mỗi lease_seconds / 3)."""
+
+    def __init__(self, queue: CrawlTaskQueue, task_id: int, worker_id: str, lease: int):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.lease = lease
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        while not self.stopped.wait(self.lease / 3):
+            try:
+                alive = self.queue.heartbeat(self.task_id, self.worker_id, self.lease)
+            except Exception as e:
+                # Vd. "database is locked": không gia hạn được thì coi như mất lease
+                log(
+                    f"WARNING heartbeat task #{self.task_id} lỗi: "
+                    f"{type(e).__name__}: {e}"
+                )
+                alive = False
+            if not alive:
+                self.lost = True
+                return
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def run_worker(
+    queue: CrawlTaskQueue,
+    crawl=None,
+    worker_id: str | None = None,
+    sink_dir: str = SINK_DIR,
+    lease_seconds: int = LEASE_SECONDS,
+    max_tasks: int | None = None,
+    wait: bool = False,
+) -> int:
+    """
+    Nhận và chạy task cho tới khi hết việc (hoặc max_tasks), trả về số task xong.
+
+    crawl(start_city, dest_city, days) -> DataFrame, mặc định crawl_vexere.
+    wait=True: khi hết task sẵn sàng thì chờ POLL_SECONDS (task đang backoff / của worker khác).
+    """
+    if crawl is None:
+        from src.extract.crawling import crawl_vexere as crawl
+
+    worker_id = worker_id or default_worker_id()
+    done = 0
+    while max_tasks is None or done < max_tasks:
+        task = queue.lease(worker_id, lease_seconds)
+        if task is None:
+            counts = queue.counts()
+            if wait and counts.get("pending", 0) + counts.get("leased", 0):
+                time.sleep(POLL_SECONDS)
+                continue
+            break
+
+        crawl_day = date.today()
+        days = (date.fromisoformat(task["departure_date"]) - crawl_day).days
+        label = f"{task['from_city']} → {task['to_city']} {task['departure_date']}"
+        heartbeat = _Heartbeat(queue, task["task_id"], worker_id, lease_seconds)
+        heartbeat.start()
+        try:
+            df = crawl(task["from_city"], task["to_city"], days)
+            path = write_result(df, task, sink_dir)
+        except Exception as e:
+            heartbeat.stopped.set()
+            status = queue.fail(task["task_id"], worker_id, f"{type(e).__name__}: {e}")
+            RUN_REPORT.add_stats("queue.worker", failed=1)
+            log(f"ERROR {label} (lần {task['attempts']}): {e} -> {status}")
+            continue
+        heartbeat.stopped.set()
+
+        if queue.complete(task["task_id"], worker_id, path, len(df), str(crawl_day)):
+            done += 1
+            RUN_REPORT.add_stats("queue.worker", done=1, rows=len(df))
+            log(f"Done {label}: {len(df)} chuyến")
+        else:
+            # Lease đã mất (crawl quá lâu không heartbeat được): task được worker
+            # khác chạy lại và ghi đè đúng file kết quả này
+            RUN_REPORT.add_stats("queue.worker", lost_lease=1)
+            log(f"WARNING mất lease {label}, kết quả có thể bị ghi đè")
+    return done
+
+
+# ====================================
+#           CLI
+# ====================================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Hàng đợi task crawl dùng chung giữa nhiều máy (SQLite)"
+    )
+    parser.add_argument("--queue", default=QUEUE_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enq = sub.add_parser("enqueue", help="Thêm task (tuyến x ngày đi)")
+    enq.add_argument("--routes", default="routes.json")
+    enq.add_argument("--offsets", type=int, nargs="+", default=[2])
+    enq.add_argument(
+        "--budget", type=int, help="Chỉ thêm N cặp theo src/extract/scheduler.py"
+    )
+    enq.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+
+    work = sub.add_parser("worker", help="Chạy worker crawl")
+    work.add_argument("--id", default=None)
+    work.add_argument("--sink", default=SINK_DIR)
+    work.add_argument("--lease", type=int, default=LEASE_SECONDS)
+    work.add_argument("--max-tasks", type=int, default=None)
+    work.add_argument("--wait", action="store_true")
+
+    sub.add_parser("status", help="Số task theo trạng thái + các task lỗi")
+
+    merge = sub.add_parser(
+        "merge", help="Gộp kết quả thành file raw theo ngày crawl + ngày đi"
+    )
+    merge.add_argument("--out-dir", default="data/raw")
+    args = parser.parse_args()
+
+    queue = CrawlTaskQueue(args.queue)
+
+    if args.command == "enqueue":
+        from src.utils.file_utils import load_routes
+
+        routes = load_routes(args.routes)
+        if args.budget:
+            from src.extract.scheduler import plan_crawl, update_state
+
+            plan = plan_crawl(update_state(), routes, args.budget, args.offsets)
+            tasks = [(p["from_city"], p["to_city"], p["departure_date"]) for p in plan]
+        else:
+            tasks = [
+                (start, dest, str(date.today() + timedelta(days=offset)))
+                for start, dest in routes
+                for offset in args.offsets
+            ]
+        added = queue.enqueue(tasks, args.max_attempts)
+        print(f"- Thêm {added}/{len(tasks)} task vào {args.queue}")
+
+    elif args.command == "worker":
+        worker_id = args.id or default_worker_id()
+        done = run_worker(
+            queue,
+            worker_id=worker_id,
+            sink_dir=args.sink,
+            lease_seconds=args.lease,
+            max_tasks=args.max_tasks,
+            wait=args.wait,
+        )
+        write_run_report(f"queue_worker_{worker_id}")
+        print(f"- Worker {worker_id}: {done} task")
+
+    elif args.command == "status":
+        print(queue.counts())
+        for task in queue.tasks("failed"):
+            print(
+                f"  failed #{task['task_id']} {task['from_city']} → {task['to_city']} "
+                f"{task['departure_date']}: {task['last_error']}"
+            )
+
+    elif args.command == "merge":
+        for name, rows in merge_results(queue, args.out_dir).items():
+            print(f"- Đã gộp {rows} dòng vào {os.path.join(args.out_dir, name)}")
+
+
+if __name__ == "__main__":
+    main()
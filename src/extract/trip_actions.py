@@ -1,3 +1,4 @@
+from collections import Counter
 from datetime import datetime, timedelta
 import time
 import pandas as pd
@@ -9,6 +10,7 @@ from selenium.common.exceptions import TimeoutException, WebDriverException
 
 from .trip_parser import parse_trip_from_container_and_rating_tab
 from src.utils.log_utils import log, log_exception
+from src.utils.metrics_utils import RUN_REPORT, timed
 from src.utils.selenium_utils import (
     wait_for_present,
     wait_for_clickable,
@@ -18,6 +20,7 @@ from src.utils.selenium_utils import (
 
 
 # ========= CORE ACTIONS =========
+@timed("crawl.show_more_trips")
 def show_more_trips(driver, max_click=6):
     click_count = 0
     for i in range(max_click):
@@ -39,6 +42,7 @@ def show_more_trips(driver, max_click=6):
     log(f"SHOW MORE TRIP COMPLETE")
 
 
+@timed("crawl.click_search_button")
 def click_search_button(driver):
     """Click vào button tìm kiếm sau quá trình fill start_point, destination, departure_date"""
     try:
@@ -61,6 +65,7 @@ def get_target_date_components(days_offset=0):
     }
 
 
+@timed("crawl.set_search_filters")
 def set_search_filters(driver, start_city, dest_city, days_offset=0):
 
     try:
@@ -102,74 +107,156 @@ def set_search_filters(driver, start_city, dest_city, days_offset=0):
 
 
 # ========= MAIN PARSE FLOW =========
-def crawl_and_parse_each_trip(driver):
-    stars = driver.find_elements(By.CSS_SELECTOR, ".ant-btn.bus-rating-button")
-    total_rating_btns = len(stars)
-    log(f"Total ratings button: {total_rating_btns}")
+# Chuyến lỗi được thử lại ở cuối tuyến (trang vẫn đang mở), tối đa RETRY_ROUNDS
+# vòng; vòng r chờ RETRY_BACKOFF_S * 2**r giây trước khi bắt đầu
+RETRY_ROUNDS = 2
+RETRY_BACKOFF_S = 1.0
+# Parse ra rỗng là do chính HTML của chuyến -> thử lại cũng vậy
+NOT_RETRYABLE = {"empty"}
 
-    all_dfs = []
 
-    for i in range(total_rating_btns):
-        try:
-            # Re-fetch lại danh sách button mỗi vòng để tránh stale element
-            stars = driver.find_elements(By.CSS_SELECTOR, ".ant-btn.bus-rating-button")
-            if i >= len(stars):
-                break
+def _rating_tab_open(driver) -> bool:
+    # Dùng JS thay find_elements để không phải chờ implicit wait khi không có
+    return driver.execute_script("return !!document.querySelector('.overall-rating');")
 
-            star = stars[i]
-            click_button(driver, star)
-            log(f"Opened rating tab: {i+1}/{total_rating_btns}")
 
-            # Chờ phần đánh giá hiện ra
-            try:
-                wait_for_present(driver, ".overall-rating")
-            except TimeoutException:
-                log(f"⚠️ Timeout waiting for .overall-rating (trip {i+1})")
-                continue
+def _close_rating_tab(driver, star) -> bool:
+    try:
+        click_button(driver, star)
+        wait_for_invisible(driver, ".overall-rating", timeout=3)
+        return True
+    except Exception:
+        return False
 
-            # Lấy HTML một cách an toàn (tránh serialize lỗi)
-            try:
-                container_html = driver.execute_script(
-                    """
-                    const el = arguments[0].closest('.bus-item, .container');
-                    if (!el) return '';
-                    const html = el.outerHTML;
-                    return html.length > 60000 ? html.substring(0, 60000) : html;
-                """,
-                    star,
-                )
-            except WebDriverException as e:
-                log(f"[WARN] Serialize DOM lỗi ở chuyến {i+1}: {str(e)[:80]}...")
-                container_html = ""
 
-            # Lấy snapshot toàn trang
-            page_html = driver.page_source
-            df_trip = parse_trip_from_container_and_rating_tab(
-                container_html, page_html
-            )
+def parse_one_trip(driver, i):
+    """
+    Mở tab rating của chuyến thứ i, parse chuyến rồi đóng tab.
 
-            if not df_trip.empty:
-                all_dfs.append(df_trip)
-                log(f"Parsed trip: {i+1}")
-            else:
-                log(f"Không tìm thấy dữ liệu cho chuyến {i+1}")
+    Returns:
+        tuple: (DataFrame, None) nếu thành công, (None, lý do lỗi) nếu không:
+        "rating_timeout" (không hiện .overall-rating), "timeout", "webdriver",
+        "missing" (không còn nút thứ i), "empty" (parse ra rỗng), "error".
+    """
+    try:
+        # Re-fetch lại danh sách button mỗi lần để tránh stale element
+        stars = driver.find_elements(By.CSS_SELECTOR, ".ant-btn.bus-rating-button")
+        if i >= len(stars):
+            return None, "missing"
 
+        star = stars[i]
+        click_button(driver, star)
+        log(f"Opened rating tab: {i+1}/{len(stars)}")
+
+        # Chờ phần đánh giá hiện ra
+        try:
+            wait_for_present(driver, ".overall-rating")
+        except TimeoutException:
+            # Tab có thể mở muộn -> đóng để rating không lẫn sang chuyến sau
+            if _rating_tab_open(driver):
+                _close_rating_tab(driver, star)
+            return None, "rating_timeout"
+
+        try:
+            # Lấy HTML một cách an toàn (tránh serialize lỗi)
+            container_html = driver.execute_script(
+                """
+                const el = arguments[0].closest('.bus-item, .container');
+                if (!el) return '';
+                const html = el.outerHTML;
+                return html.length > 60000 ? html.substring(0, 60000) : html;
+            """,
+                star,
+            )
+            # Lấy snapshot toàn trang
+            page_html = driver.page_source
+        finally:
             # Đóng tab rating
-            try:
-                click_button(driver, star)
-                wait_for_invisible(driver, ".overall-rating", timeout=3)
-            except Exception:
+            if not _close_rating_tab(driver, star):
                 log(f"Không đóng được tab rating: {i+1}")
 
-        except TimeoutException:
-            log(f"Timeout ở chuyến {i+1}")
-            continue
-        except WebDriverException as e:
-            log(f"[ERROR] WebDriverException ở chuyến {i+1}: {str(e)[:100]}")
-            continue
-        except Exception as e:
-            log_exception("crawl_and_parse_each_trip", e)
-            continue
+        df_trip = parse_trip_from_container_and_rating_tab(container_html, page_html)
+        if df_trip.empty:
+            return None, "empty"
+        return df_trip, None
+
+    except TimeoutException:
+        return None, "timeout"
+    except WebDriverException as e:
+        log(f"[ERROR] WebDriverException ở chuyến {i+1}: {str(e)[:100]}")
+        return None, "webdriver"
+    except Exception as e:
+        log_exception("parse_one_trip", e)
+        return None, "error"
+
+
+@timed("crawl.crawl_and_parse_each_trip")
+def crawl_and_parse_each_trip(driver, route=None):
+    """
+    Parse lần lượt từng chuyến trên trang kết quả.
+
+    Chuyến lỗi (timeout, WebDriverException, không hiện rating) được đưa vào
+    hàng đợi retry kèm lý do và thử lại ở cuối tuyến, thay vì bỏ qua.
+    Thống kê yield / retry cộng vào RUN_REPORT ("crawl.trips" và
+    "crawl.trips <route>" nếu truyền route).
+    """
+    stars = driver.find_elements(By.CSS_SELECTOR, ".ant-btn.bus-rating-button")
+    total_rating_btns = len(stars)
+    log(f"Total ratings button: {total_rating_btns}")
+
+    all_dfs = []
+    failed = {}
+
+    for i in range(total_rating_btns):
+        df_trip, reason = parse_one_trip(driver, i)
+        if df_trip is not None:
+            all_dfs.append(df_trip)
+            log(f"Parsed trip: {i+1}")
+        else:
+            failed[i] = reason
+            log(f"⚠️ Lỗi chuyến {i+1}: {reason}")
+
+    # ---------- RETRY QUEUE ----------
+    retry_queue = {i: r for i, r in failed.items() if r not in NOT_RETRYABLE}
+    retries, recovered = 0, 0
+    for round_ in range(RETRY_ROUNDS):
+        if not retry_queue:
+            break
+        delay = RETRY_BACKOFF_S * 2**round_
+        log(
+            f"Retry {len(retry_queue)} chuyến lỗi "
+            f"(vòng {round_ + 1}/{RETRY_ROUNDS}, chờ {delay:.0f}s)"
+        )
+        time.sleep(delay)
+        for i in sorted(retry_queue):
+            retries += 1
+            df_trip, reason = parse_one_trip(driver, i)
+            if df_trip is not None:
+                all_dfs.append(df_trip)
+                recovered += 1
+                del retry_queue[i]
+                log(f"Parsed trip (retry): {i+1}")
+            else:
+                retry_queue[i] = reason
+
+    stats = {
+        "buttons": total_rating_btns,
+        "parsed": len(all_dfs),
+        "failed": len(failed),
+        "retries": retries,
+        "recovered": recovered,
+        "lost": total_rating_btns - len(all_dfs),
+        **Counter(f"failed_{reason}" for reason in failed.values()),
+    }
+    RUN_REPORT.add_stats("crawl.trips", **stats)
+    if route:
+        RUN_REPORT.add_stats(f"crawl.trips {route}", **stats)
+    if total_rating_btns:
+        log(
+            f"Yield {len(all_dfs)}/{total_rating_btns} "
+            f"({len(all_dfs) / total_rating_btns:.0%}), retry cứu được "
+            f"{recovered}/{len(failed)} chuyến lỗi, mất {stats['lost']}"
+        )
 
     if not all_dfs:
         log("Không thu được dữ liệu nào.")
@@ -1,6 +1,8 @@
 import pandas as pd
 from bs4 import BeautifulSoup
 
+from src.utils.metrics_utils import timed
+
 
 def safe_text(elem, default=""):
     return elem.get_text(strip=True) if elem else default
@@ -157,6 +159,7 @@ def parse_trip_rating_from_rating_tab(page_soup: BeautifulSoup) -> dict:
     return rating_dict
 
 
+@timed("parse.trip_from_container_and_rating_tab")
 def parse_trip_from_container_and_rating_tab(
     container_html: str, page_html: str
 ) -> pd.DataFrame:
@@ -0,0 +1,327 @@
+import argparse
+import json
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from src.ml.feature_store import file_sha256
+from src.transform.cleaning.dtype_cleaner import RATING_COLS, ratings_as_float64
+from src.utils.file_utils import crawl_date_from_file_path, read_processed_csv
+from src.utils.log_utils import log
+from src.utils.metrics_utils import RUN_REPORT, span
+
+BI_DIR = "data/bi"
+PROCESSED_FOLDER = "data/processed"
+# Tăng khi đổi cột / cách tính của các bảng fact -> export lại toàn bộ partition
+EXPORT_VERSION = 1
+FACT_TABLES = ["fact_trips", "fact_route_daily", "fact_rating_snapshot"]
+WEEKDAYS = ["Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7", "Chủ nhật"]
+
+
+def route_name(start: str, dest: str) -> str:
+    return f"{start} → {dest}"
+
+
+def date_key(values) -> pd.Series:
+    """ "2025-11-20" -> 20251120 (khóa của dim_date)."""
+    return pd.to_datetime(pd.Series(values)).dt.strftime("%Y%m%d").astype("int32")
+
+
+# ====================================
+#           SURROGATE KEYS
+# ====================================
+class KeyRegistry:
+    """
+    Khóa thay thế (int) ổn định cho city / company / route, lưu trong keys.json.
+
+    Chỉ thêm, không bao giờ đánh số lại: partition fact đã export trước đó vẫn
+    join đúng với dimension mới mà Power BI không phải tải lại.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.keys = {"city": {}, "company": {}, "route": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.keys = json.load(f)
+
+    def get(self, kind: str, name: str) -> int:
+        table = self.keys[kind]
+        if name not in table:
+            table[name] = len(table) + 1
+        return table[name]
+
+    def map(self, kind: str, names: pd.Series) -> pd.Series:
+        mapping = {name: self.get(kind, name) for name in names.unique()}
+        return names.map(mapping).astype("int32")
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.keys, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+# ====================================
+#           FACT TABLES
+# ====================================
+def build_facts(df: pd.DataFrame, crawl_date: date, keys: KeyRegistry) -> dict:
+    """Ba bảng fact của một file processed, đã thay tên bằng khóa thay thế."""
+    df = ratings_as_float64(df)
+    start = df["start_point"].astype(str)
+    dest = df["destination"].astype(str)
+    keys.map("city", start)
+    keys.map("city", dest)
+    route_names = pd.Series(
+        [route_name(s, d) for s, d in zip(start, dest)], index=df.index
+    )
+
+    base = pd.DataFrame(
+        {
+            "date_key": date_key(df["departure_date"].astype(str)).values,
+            "crawl_date_key": np.int32(int(f"{crawl_date:%Y%m%d}")),
+            "route_key": keys.map("route", route_names).values,
+            "company_key": keys.map("company", df["company_name"].astype(str)).values,
+        }
+    )
+
+    price_original = df["price_original"].to_numpy(dtype=np.float64)
+    price_discounted = df["price_discounted"].to_numpy(dtype=np.float64)
+    trips = base.assign(
+        departure_time=df["departure_time"].astype(str).str[:5].values,
+        arrival_time=df["arrival_time"].astype(str).str[:5].values,
+        pickup_point=df["pickup_point"].astype("category").values,
+        dropoff_point=df["dropoff_point"].astype("category").values,
+        number_of_seat=df["number_of_seat"].astype("int16").values,
+        duration_minutes=df["duration_minutes"].astype("int16").values,
+        price_original=price_original.astype(np.int32),
+        price_discounted=price_discounted.astype(np.int32),
+        discount_rate=np.divide(
+            price_original - price_discounted,
+            price_original,
+            out=np.zeros_like(price_original),
+            where=price_original > 0,
+        ).astype(np.float32),
+    )
+
+    route_daily = (
+        trips.assign(rating_overall=df["rating_overall"].to_numpy(np.float64))
+        .groupby(["date_key", "crawl_date_key", "route_key"], observed=True)
+        .agg(
+            trips=("company_key", "size"),
+            companies=("company_key", "nunique"),
+            seats=("number_of_seat", "sum"),
+            price_min=("price_discounted", "min"),
+            price_median=("price_discounted", "median"),
+            price_mean=("price_discounted", "mean"),
+            price_max=("price_discounted", "max"),
+            discount_rate_mean=("discount_rate", "mean"),
+            rating_overall_mean=("rating_overall", "mean"),
+        )
+        .reset_index()
+        .astype({"trips": "int32", "companies": "int16", "seats": "int32"})
+    )
+
+    # Rating theo company-tuyến tại ngày crawl (giống company_route_ratings trong DB)
+    ratings = (
+        base[["crawl_date_key", "route_key", "company_key"]]
+        .assign(
+            reviewer_count=df["reviewer_count"].astype("int32").values,
+            **{col: df[col].to_numpy(np.float64) for col in RATING_COLS},
+        )
+        .drop_duplicates(["crawl_date_key", "route_key", "company_key"])
+        .reset_index(drop=True)
+    )
+
+    return {
+        "fact_trips": trips,
+        "fact_route_daily": route_daily,
+        "fact_rating_snapshot": ratings,
+    }
+
+
+# ====================================
+#           DIMENSIONS
+# ====================================
+def build_dimensions(keys: KeyRegistry, date_keys: set[int]) -> dict:
+    """Dimension nhỏ nên được ghi lại toàn bộ mỗi lần (khóa không đổi)."""
+    city = pd.DataFrame(
+        {
+            "city_key": list(keys.keys["city"].values()),
+            "city_name": list(keys.keys["city"]),
+        }
+    )
+    company = pd.DataFrame(
+        {
+            "company_key": list(keys.keys["company"].values()),
+            "company_name": list(keys.keys["company"]),
+        }
+    )
+
+    routes = list(keys.keys["route"])
+    start, dest = zip(*(name.split(" → ") for name in routes)) if routes else ((), ())
+    route = pd.DataFrame(
+        {
+            "route_key": list(keys.keys["route"].values()),
+            "route_name": routes,
+            "start_point": start,
+            "destination": dest,
+            "start_city_key": [keys.keys["city"][s] for s in start],
+            "destination_city_key": [keys.keys["city"][d] for d in dest],
+        }
+    )
+
+    # Bảng ngày liên tục (yêu cầu của time intelligence trong Power BI);
+    # chưa có ngày nào (thư mục processed rỗng) -> bảng rỗng cùng schema
+    if date_keys:
+        bounds = pd.to_datetime(
+            [str(min(date_keys)), str(max(date_keys))], format="%Y%m%d"
+        )
+        days = pd.date_range(bounds[0], bounds[1], freq="D")
+    else:
+        days = pd.DatetimeIndex([])
+    dim_date = pd.DataFrame(
+        {
+            "date_key": days.strftime("%Y%m%d").astype("int32"),
+            "date": days.date,
+            "year": days.year.astype("int16"),
+            "month": days.month.astype("int8"),
+            "day": days.day.astype("int8"),
+            "weekday": pd.Categorical(
+                [WEEKDAYS[d] for d in days.weekday], categories=WEEKDAYS, ordered=True
+            ),
+            "is_weekend": days.weekday >= 5,
+        }
+    )
+    return {
+        "dim_city": city,
+        "dim_company": company,
+        "dim_route": route,
+        "dim_date": dim_date,
+    }
+
+
+# ====================================
+#           EXPORT (INCREMENTAL)
+# ====================================
+def _write_parquet(df: pd.DataFrame, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def load_manifest(bi_dir: str = BI_DIR) -> dict:
+    path = os.path.join(bi_dir, "manifest.json")
+    if not os.path.exists(path):
+        return {"export_version": EXPORT_VERSION, "files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("export_version") != EXPORT_VERSION:
+        log(
+            f"BI export version {manifest.get('export_version')} -> {EXPORT_VERSION}, export lại toàn bộ"
+        )
+        return {"export_version": EXPORT_VERSION, "files": {}}
+    return manifest
+
+
+def save_manifest(manifest: dict, bi_dir: str = BI_DIR):
+    path = os.path.join(bi_dir, "manifest.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def export_bi(folder: str = PROCESSED_FOLDER, bi_dir: str = BI_DIR) -> dict:
+    """
+    Export star schema cho Power BI (data/bi/*.parquet).
+
+    Mỗi file processed là một partition của mỗi bảng fact
+    (fact_trips/2025_11_20.parquet, ...); chỉ file mới hoặc đã đổi nội dung
+    (SHA-256, ví dụ sau backfill) được export lại. Power BI đọc cả thư mục
+    (Folder connector / incremental refresh theo tên file) nên lần refresh chỉ
+    tải partition mới cùng các dimension nhỏ.
+
+    Returns:
+        dict: manifest (file nguồn -> sha256, số dòng từng bảng).
+    """
+    os.makedirs(bi_dir, exist_ok=True)
+    manifest = load_manifest(bi_dir)
+    keys = KeyRegistry(os.path.join(bi_dir, "keys.json"))
+    sources = sorted(
+        os.path.join(folder, name)
+        for name in os.listdir(folder)
+        if name.endswith("_cleaned.csv")
+    )
+    exported = 0
+
+    # File processed đã bị xóa -> bỏ partition tương ứng
+    removed = set(manifest["files"]) - {os.path.basename(f) for f in sources}
+    for name in removed:
+        partition = name.removesuffix("_cleaned.csv")
+        for table in FACT_TABLES:
+            path = os.path.join(bi_dir, table, f"{partition}.parquet")
+            if os.path.exists(path):
+                os.remove(path)
+        del manifest["files"][name]
+
+    for source in sources:
+        name = os.path.basename(source)
+        digest = file_sha256(source)
+        entry = manifest["files"].get(name)
+        if entry is not None and entry["source_sha256"] == digest:
+            continue
+
+        # Partition theo tên file: 2025_11_23 hoặc 2025_11_23_d5 (CRAWL_BUDGET)
+        partition = name.removesuffix("_cleaned.csv")
+        crawl_date = crawl_date_from_file_path(source)
+        df = read_processed_csv(source)
+        with span("bi.export_partition", rows_in=len(df)) as s:
+            facts = build_facts(df, crawl_date, keys)
+            for table, fact in facts.items():
+                _write_parquet(
+                    fact, os.path.join(bi_dir, table, f"{partition}.parquet")
+                )
+            s.rows_out = len(facts["fact_trips"])
+
+        crawl_key = int(f"{crawl_date:%Y%m%d}")
+        manifest["files"][name] = {
+            "source_sha256": digest,
+            "date_keys": sorted({crawl_key, *facts["fact_trips"]["date_key"].tolist()}),
+            **{table: len(fact) for table, fact in facts.items()},
+        }
+        exported += 1
+
+    if (
+        exported
+        or removed
+        or not os.path.exists(os.path.join(bi_dir, "dim_date.parquet"))
+    ):
+        keys.save()
+        date_keys = {k for e in manifest["files"].values() for k in e["date_keys"]}
+        for table, dim in build_dimensions(keys, date_keys).items():
+            _write_parquet(dim, os.path.join(bi_dir, f"{table}.parquet"))
+        save_manifest(manifest, bi_dir)
+
+    RUN_REPORT.add_stats("bi.export", partitions=exported, files=len(manifest["files"]))
+    log(
+        f"BI export: {exported} partition mới / {len(manifest['files'])} ngày -> {bi_dir}"
+    )
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export star schema (fact + dimension Parquet) cho Power BI"
+    )
+    parser.add_argument("--folder", default=PROCESSED_FOLDER)
+    parser.add_argument("--bi-dir", default=BI_DIR)
+    args = parser.parse_args()
+
+    manifest = export_bi(args.folder, args.bi_dir)
+    for table in FACT_TABLES:
+        rows = sum(e[table] for e in manifest["files"].values())
+        print(f"- {table}: {rows} dòng")
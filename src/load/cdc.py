@@ -0,0 +1,244 @@
+import argparse
+from datetime import date
+from typing import Any, Dict
+
+import pandas as pd
+
+from src.database.db_manager import (
+    RATING_VALUE_CASTS,
+    TRIP_VALUE_CASTS,
+    DatabaseManager,
+)
+from src.load.loading import BATCH_SIZE
+from src.transform.cleaning.cleaning import read_trips_with_address
+from src.transform.cleaning.dtype_cleaner import ratings_as_float64
+from src.utils.log_utils import log
+from src.utils.metrics_utils import RUN_REPORT, span
+
+
+# ====================================
+#           HELPERS
+# ====================================
+def _value(v):
+    """NaN -> None để lưu NULL (và so sánh IS DISTINCT FROM đúng)."""
+    return None if pd.isna(v) else v
+
+
+class _IdCache:
+    """Cache id company / city / route trong một lần nạp (tránh SELECT lặp lại)."""
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+        self.companies: dict[str, int] = {}
+        self.cities: dict[str, int] = {}
+        self.routes: dict[tuple[str, str], int] = {}
+
+    def company(self, name: str) -> int:
+        if name not in self.companies:
+            self.companies[name] = self.db.get_or_insert_company(name)
+        return self.companies[name]
+
+    def city(self, name: str) -> int:
+        if name not in self.cities:
+            self.cities[name] = self.db.get_or_insert_city(name)
+        return self.cities[name]
+
+    def route(self, start: str, dest: str) -> int:
+        if (start, dest) not in self.routes:
+            self.routes[(start, dest)] = self.db.get_or_insert_route(
+                self.city(start), self.city(dest)
+            )
+        return self.routes[(start, dest)]
+
+
+# ====================================
+#           LOAD (CDC)
+# ====================================
+def insert_trips_cdc(
+    db: DatabaseManager,
+    df: pd.DataFrame,
+    crawl_date: str | None = None,
+    batch_size: int = BATCH_SIZE,
+) -> dict:
+    """
+    Nạp một lần crawl theo kiểu change-data capture.
+
+    So sánh từng chuyến (trip_keys) và rating từng company-tuyến với phiên bản
+    hiện tại trong DB, chỉ ghi khi giá trị thay đổi: phiên bản cũ được đóng
+    (valid_to = crawl_date) và phiên bản mới bắt đầu từ crawl_date. Chuyến
+    cùng tuyến + ngày đi có trong df nhưng không còn trong lần crawl này cũng
+    được đóng (bỏ qua nếu có dòng lỗi, vì không biết dòng lỗi là chuyến nào).
+    Các ngày crawl phải được nạp theo thứ tự tăng dần.
+
+    df cần cột pickup_address / dropoff_address (clean_vexere với
+    keep_address=True hoặc read_trips_with_address); thiếu thì khóa dùng "".
+
+    Returns:
+        dict: số chuyến, số thay đổi giá chuyến, số thay đổi rating, số chuyến
+        bị đóng, số lỗi.
+    """
+    crawl_date = crawl_date or str(date.today())
+    df = ratings_as_float64(df)
+    ids = _IdCache(db)
+    seen_trips: dict[tuple, tuple] = {}
+    seen_ratings: set[tuple[int, int]] = set()
+    # (route_id, departure_date) -> trip_key_id đã thấy trong lần crawl
+    seen_keys: dict[tuple[int, str], list[int]] = {}
+    stats = {
+        "trips": 0,
+        "trip_changes": 0,
+        "rating_changes": 0,
+        # Chuyến không còn trong danh sách -> đóng phiên bản hiện tại
+        "trips_closed": 0,
+        # Dòng trùng khóa chuyến với một dòng trước đó trong cùng lần crawl
+        # (bỏ qua, chỉ giữ dòng đầu) / trong đó giá khác nhau
+        "collisions": 0,
+        "collisions_price": 0,
+        "errors": 0,
+    }
+
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start : start + batch_size]
+        with span("load.cdc_batch", rows_in=len(batch)) as s:
+            s.rows_out = insert_trip_batch_cdc(
+                db, batch, crawl_date, ids, seen_trips, seen_ratings, seen_keys, stats
+            )
+
+    if stats["errors"]:
+        log(
+            f"[WARN] CDC {crawl_date}: {stats['errors']} dòng lỗi, "
+            "không đóng các chuyến vắng mặt"
+        )
+    else:
+        with span("load.cdc_close_missing", rows_in=len(seen_keys)) as s:
+            for (route_id, departure_date), key_ids in seen_keys.items():
+                stats["trips_closed"] += db.close_missing_trip_versions(
+                    route_id, departure_date, key_ids, crawl_date
+                )
+            s.rows_out = stats["trips_closed"]
+
+    RUN_REPORT.add_stats("load.cdc", **stats)
+    log(
+        f"CDC {crawl_date}: {stats['trips']} chuyến, "
+        f"{stats['trip_changes']} thay đổi giá, "
+        f"{stats['rating_changes']} thay đổi rating, "
+        f"{stats['trips_closed']} chuyến không còn bán"
+    )
+    if stats["collisions"]:
+        log(
+            f"[WARN] CDC {crawl_date}: {stats['collisions']} dòng trùng khóa chuyến "
+            f"bị bỏ qua ({stats['collisions_price']} dòng khác giá)"
+        )
+    return stats
+
+
+def insert_trip_batch_cdc(
+    db: DatabaseManager,
+    df: pd.DataFrame,
+    crawl_date: str,
+    ids: _IdCache,
+    seen_trips: dict,
+    seen_ratings: set,
+    seen_keys: dict,
+    stats: dict,
+) -> int:
+    """Ghi thay đổi của một batch, trả về số chuyến xử lý thành công."""
+    processed = 0
+
+    # to_dict trả về kiểu Python thuần (psycopg2 không adapt được numpy.int64)
+    for idx, row in zip(df.index, df.to_dict("records")):
+        try:
+            company_id = ids.company(row["company_name"])
+            route_id = ids.route(row["start_point"], row["destination"])
+
+            # Rating theo tuyến: một lần crawl chỉ lấy giá trị gặp đầu tiên
+            if (company_id, route_id) not in seen_ratings:
+                seen_ratings.add((company_id, route_id))
+                rating_data: Dict[str, Any] = {
+                    col: _value(row.get(col)) for col in RATING_VALUE_CASTS
+                }
+                if db.upsert_company_route_rating_version(
+                    company_id, route_id, rating_data, crawl_date
+                ):
+                    stats["rating_changes"] += 1
+
+            # Chuyến: khóa ổn định + giá trị theo thời gian
+            key: Dict[str, Any] = {
+                "company_id": company_id,
+                "route_id": route_id,
+                "departure_date": row["departure_date"],
+                "departure_time": row["departure_time"],
+                "pickup_point": _value(row.get("pickup_point")) or "",
+                "dropoff_point": _value(row.get("dropoff_point")) or "",
+                # Frame không có địa chỉ gốc (file processed) -> ""
+                "pickup_address": _value(row.get("pickup_address")) or "",
+                "dropoff_address": _value(row.get("dropoff_address")) or "",
+                "number_of_seat": int(_value(row.get("number_of_seat")) or 0),
+            }
+            trip_data: Dict[str, Any] = {
+                col: _value(row.get(col)) for col in TRIP_VALUE_CASTS
+            }
+            price = (trip_data["price_original"], trip_data["price_discounted"])
+            trip_key = tuple(key.values())
+            if trip_key in seen_trips:
+                stats["collisions"] += 1
+                stats["collisions_price"] += seen_trips[trip_key] != price
+                continue
+            seen_trips[trip_key] = price
+
+            trip_key_id = db.get_or_insert_trip_key(key)
+            seen_keys.setdefault((route_id, str(row["departure_date"])), []).append(
+                trip_key_id
+            )
+            if db.upsert_trip_version(trip_key_id, trip_data, crawl_date):
+                stats["trip_changes"] += 1
+            stats["trips"] += 1
+            processed += 1
+
+        except Exception as e:
+            db.conn.rollback()
+            stats["errors"] += 1
+            print(f"Error loading row {idx}: {e}")
+
+    return processed
+
+
+# ====================================
+#           AS-OF QUERY
+# ====================================
+def state_as_of(db: DatabaseManager, as_of: str) -> pd.DataFrame:
+    """Giá chuyến và rating tuyến đúng như DB biết tại ngày as_of (YYYY-MM-DD)."""
+    columns, rows = db.get_state_as_of(as_of)
+    return pd.DataFrame(rows, columns=columns)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Nạp file processed theo kiểu CDC hoặc dựng lại trạng thái tại một ngày"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    load_p = sub.add_parser(
+        "load",
+        help="Nạp thay đổi từ file processed (địa chỉ gốc lấy từ file raw cùng tên)",
+    )
+    load_p.add_argument("path")
+    load_p.add_argument("--crawl-date", required=True, help="YYYY-MM-DD")
+
+    asof_p = sub.add_parser("as-of", help="Trạng thái tại một ngày")
+    asof_p.add_argument("date", help="YYYY-MM-DD")
+    asof_p.add_argument("--out", help="Ghi CSV (mặc định in vài dòng đầu)")
+    args = parser.parse_args()
+
+    with DatabaseManager.from_config() as db:
+        if args.command == "load":
+            insert_trips_cdc(
+                db, read_trips_with_address(args.path), crawl_date=args.crawl_date
+            )
+        else:
+            df_state = state_as_of(db, args.date)
+            if args.out:
+                df_state.to_csv(args.out, index=False)
+                print(f"- Đã lưu {len(df_state)} chuyến vào {args.out}")
+            else:
+                print(df_state.head(20).to_string())
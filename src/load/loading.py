@@ -2,11 +2,53 @@ import pandas as pd
 from typing import Any, Dict
 from datetime import date
 from src.database.db_manager import DatabaseManager
+from src.transform.cleaning.dtype_cleaner import ratings_as_float64
+from src.utils.log_utils import log
+from src.utils.metrics_utils import span
 
+BATCH_SIZE = 500
 
-def insert_trips_from_dataframe(db: DatabaseManager, df: pd.DataFrame):
-    """Duyệt DataFrame và insert toàn bộ dữ liệu chuyến xe + lưu lịch sử rating."""
-    crawl_date = str(date.today())
+
+def insert_trips_from_dataframe(
+    db: DatabaseManager,
+    df: pd.DataFrame,
+    crawl_date: str | None = None,
+    batch_size: int = BATCH_SIZE,
+    replace: bool = False,
+):
+    """
+    Duyệt DataFrame và insert toàn bộ dữ liệu chuyến xe + lưu lịch sử rating.
+
+    crawl_date mặc định là hôm nay; khi nạp lại dữ liệu cũ (backfill)
+    cần truyền ngày crawl thật của file. replace=True xóa trước các chuyến
+    cùng crawl_date và ngày đi có trong df, nên nạp lại (hoặc chạy tiếp sau
+    khi bị ngắt giữa chừng) không tạo dòng trùng; rating theo ngày crawl luôn
+    được ghi đè. Mỗi batch được đo trong span "load.batch".
+    """
+    crawl_date = crawl_date or str(date.today())
+    df = ratings_as_float64(df)
+    if replace and len(df):
+        departure_dates = sorted(df["departure_date"].astype(str).unique())
+        deleted = db.delete_trips(crawl_date, departure_dates)
+        if deleted:
+            log(f"Xóa {deleted} chuyến đã nạp của lần crawl {crawl_date}")
+
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start : start + batch_size]
+        with span("load.batch", rows_in=len(batch)) as s:
+            s.rows_out = insert_trip_batch(db, batch, crawl_date)
+
+
+def insert_trip_batch(db: DatabaseManager, df: pd.DataFrame, crawl_date: str) -> int:
+    """
+    Insert một batch chuyến xe, trả về số dòng insert thành công.
+
+    Dòng lỗi lẻ tẻ chỉ được in ra và bỏ qua; nếu cả batch đều lỗi (thường do
+    schema database cũ, xem `python -m src.database.migrate`) thì raise để lần
+    nạp dừng lại thay vì báo thành công với 0 dòng.
+    """
+    inserted = 0
+    first_error = None
 
     for idx, row in df.iterrows():
         try:
@@ -48,9 +90,18 @@ def insert_trips_from_dataframe(db: DatabaseManager, df: pd.DataFrame):
                 "dropoff_point": row.get("dropoff_point"),
                 "number_of_seat": row.get("number_of_seat"),
                 "duration_minutes": row.get("duration_minutes"),
+                "crawl_date": crawl_date,
             }
             db.insert_trip(trip_data)
+            inserted += 1
 
         except Exception as e:
             db.conn.rollback()
             print(f"Error inserting row {idx}: {e}")
+            first_error = first_error or e
+
+    if len(df) and inserted == 0:
+        raise RuntimeError(
+            f"Không insert được dòng nào trong batch {len(df)} dòng: {first_error}"
+        ) from first_error
+    return inserted
@@ -0,0 +1,178 @@
+import argparse
+import glob
+import hashlib
+import os
+from datetime import datetime
+
+import joblib
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import RobustScaler
+
+from src.ml.feature_store import ensure_features, read_entries, read_features
+from src.ml.features import DERIVED_COLS, FEATURE_VERSION, FEATURES
+from src.ml.projection import project
+from src.utils.log_utils import log
+
+# Tăng khi đổi cách train / nội dung artifact để artifact cũ không được dùng lại
+ARTIFACT_VERSION = 2
+MODEL_DIR = "models"
+PROCESSED_FOLDER = "data/processed"
+
+K = 3
+RANDOM_STATE = 40
+N_INIT = 10
+PREVIEW_ROWS = 5
+
+
+# ====================================
+#           FINGERPRINT
+# ====================================
+def training_files(folder: str = PROCESSED_FOLDER) -> list[str]:
+    return sorted(glob.glob(os.path.join(folder, "*.csv")))
+
+
+def files_signature(files: list[str]) -> tuple:
+    """Chữ ký rẻ (tên, kích thước, mtime) để phát hiện file thay đổi mà không đọc nội dung."""
+    return tuple(
+        (os.path.basename(f), os.stat(f).st_size, os.stat(f).st_mtime_ns) for f in files
+    )
+
+
+def fingerprint_files(files: list[str]) -> str:
+    """SHA-256 trên tên + nội dung các file train (không phụ thuộc mtime)."""
+    digest = hashlib.sha256(f"v{ARTIFACT_VERSION}-f{FEATURE_VERSION}".encode())
+    for f in files:
+        digest.update(os.path.basename(f).encode())
+        with open(f, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_path(fingerprint: str, model_dir: str = MODEL_DIR) -> str:
+    return os.path.join(
+        model_dir, f"kmeans_v{ARTIFACT_VERSION}_{fingerprint[:16]}.joblib"
+    )
+
+
+def latest_artifact_path(model_dir: str = MODEL_DIR) -> str | None:
+    """Artifact (đúng ARTIFACT_VERSION) được ghi gần nhất, None nếu chưa có."""
+    paths = glob.glob(os.path.join(model_dir, f"kmeans_v{ARTIFACT_VERSION}_*.joblib"))
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+# ====================================
+#           TRAIN
+# ====================================
+def feature_table(files: list[str]) -> pd.DataFrame:
+    """Bảng FEATURES dùng để phân cụm (đã dropna + drop_duplicates) của các file."""
+    df_fe = read_features(files, columns=FEATURES)
+    return df_fe.dropna().drop_duplicates()
+
+
+def train_artifact(files: list[str], fingerprint: str | None = None) -> dict:
+    """
+    Train RobustScaler + KMeans(K=3) + PCA 2D trên các file processed.
+
+    Returns:
+        dict: Artifact gồm scaler, model, pca, danh sách feature, fingerprint
+        và dữ liệu hiển thị sẵn cho app (preview, projection PCA 2D).
+    """
+    if not files:
+        raise ValueError("Không có file CSV nào để train")
+
+    # Feature đọc từ feature store, chỉ các ngày mới / đã đổi được tính lại
+    entries = ensure_features(files)
+    n_rows = sum(entry["rows"] for entry in entries)
+    if n_rows < K:
+        raise ValueError(f"Dữ liệu train sau khi làm sạch < {K} dòng")
+
+    df_fe = read_entries(entries)
+    df_cluster = df_fe[FEATURES].dropna().drop_duplicates()
+    if df_cluster.shape[0] <= K:
+        raise ValueError("Sau khi drop NaN/duplicates, dữ liệu train còn quá ít")
+
+    scaler = RobustScaler()
+    X_scaled = scaler.fit_transform(df_cluster[FEATURES])
+
+    model = KMeans(n_clusters=K, random_state=RANDOM_STATE, n_init=N_INIT)
+    labels = model.fit_predict(X_scaled)
+
+    pca = PCA(n_components=2).fit(X_scaled)
+
+    return {
+        "version": ARTIFACT_VERSION,
+        "fingerprint": fingerprint or fingerprint_files(files),
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+        "files": [os.path.basename(f) for f in files],
+        "features": list(FEATURES),
+        "scaler": scaler,
+        "model": model,
+        "pca": pca,
+        "n_rows": int(n_rows),
+        "n_train": int(df_cluster.shape[0]),
+        "raw_preview": df_fe.drop(columns=DERIVED_COLS).head(PREVIEW_ROWS),
+        "feature_preview": df_fe.head(PREVIEW_ROWS),
+        # Chiếu PCA sẵn (mẫu phân tầng + lưới mật độ), kích thước cố định
+        "projection": project(pca, X_scaled, labels, K),
+    }
+
+
+# ====================================
+#           SAVE / LOAD
+# ====================================
+def save_artifact(artifact: dict, model_dir: str = MODEL_DIR) -> str:
+    path = artifact_path(artifact["fingerprint"], model_dir)
+    os.makedirs(model_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    joblib.dump(artifact, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_artifact(path: str) -> dict:
+    artifact = joblib.load(path)
+    if artifact.get("version") != ARTIFACT_VERSION:
+        raise ValueError(f"Artifact {path} có version {artifact.get('version')}")
+    return artifact
+
+
+def load_or_train(
+    folder: str = PROCESSED_FOLDER, model_dir: str = MODEL_DIR, force: bool = False
+) -> dict:
+    """
+    Trả về artifact ứng với dữ liệu hiện tại trong folder.
+
+    Artifact được đặt tên theo fingerprint nội dung các file train nên chỉ
+    train lại khi dữ liệu (hoặc ARTIFACT_VERSION) thay đổi.
+    """
+    files = training_files(folder)
+    fingerprint = fingerprint_files(files)
+    path = artifact_path(fingerprint, model_dir)
+
+    if not force and os.path.exists(path):
+        return load_artifact(path)
+
+    log(f"Training model artifact from {len(files)} files...")
+    artifact = train_artifact(files, fingerprint)
+    path = save_artifact(artifact, model_dir)
+    log(f"Saved model artifact -> {path}")
+    return artifact
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Train và lưu artifact phân cụm (scaler, KMeans, PCA)"
+    )
+    parser.add_argument("--folder", default=PROCESSED_FOLDER)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--force", action="store_true", help="Train lại dù đã có")
+    args = parser.parse_args()
+
+    artifact = load_or_train(args.folder, args.model_dir, force=args.force)
+    print(
+        f"Artifact {artifact['fingerprint'][:16]}: {len(artifact['files'])} files, "
+        f"{artifact['n_train']} dòng train, trained at {artifact['trained_at']}"
+    )
@@ -0,0 +1,133 @@
+import argparse
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from src.ml.features import FEATURE_VERSION, NUMERIC_COLS, feature_engineering
+from src.utils.log_utils import log
+
+STORE_DIR = "data/features"
+MANIFEST_FILE = "manifest.json"
+
+
+# ====================================
+#           HELPERS
+# ====================================
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_training_data(files: list[str]) -> pd.DataFrame:
+    """Đọc các file processed, ép kiểu số và bỏ dòng thiếu NUMERIC_COLS (như app)."""
+    df = pd.concat([pd.read_csv(f) for f in files], ignore_index=True)
+    df[NUMERIC_COLS] = df[NUMERIC_COLS].apply(pd.to_numeric, errors="coerce")
+    return df.dropna(subset=NUMERIC_COLS)
+
+
+def feature_path(source: str, store_dir: str = STORE_DIR) -> str:
+    """data/processed/2025_11_23_cleaned.csv -> data/features/2025_11_23_features.parquet"""
+    day = os.path.basename(source).split("_cleaned")[0].removesuffix(".csv")
+    return os.path.join(store_dir, f"{day}_features.parquet")
+
+
+def load_manifest(store_dir: str = STORE_DIR) -> dict:
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, store_dir: str = STORE_DIR):
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+# ====================================
+#           BUILD / READ
+# ====================================
+def build_day(source: str, store_dir: str = STORE_DIR) -> dict:
+    """Tính feature cho một file processed và ghi Parquet (qua file tạm)."""
+    df_raw = load_training_data([source])
+    df_fe = feature_engineering(df_raw)
+
+    path = feature_path(source, store_dir)
+    tmp_path = f"{path}.tmp"
+    df_fe.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return {"rows": len(df_raw), "rows_features": len(df_fe)}
+
+
+def ensure_features(files: list[str], store_dir: str = STORE_DIR) -> list[dict]:
+    """
+    Đảm bảo mỗi file processed có file feature còn hợp lệ.
+
+    Cache key = SHA-256 nội dung file nguồn + FEATURE_VERSION; chỉ các ngày
+    mới, đã đổi nội dung hoặc tính bằng phiên bản feature cũ được tính lại.
+
+    Returns:
+        list[dict]: Mục manifest (path, rows, ...) theo thứ tự files.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = load_manifest(store_dir)
+    entries, rebuilt = [], 0
+
+    for source in files:
+        name = os.path.basename(source)
+        key = {"source_sha256": file_sha256(source), "feature_version": FEATURE_VERSION}
+        entry = manifest.get(name)
+        path = feature_path(source, store_dir)
+
+        stale = (
+            entry is None
+            or any(entry.get(k) != v for k, v in key.items())
+            or not os.path.exists(path)
+        )
+        if stale:
+            entry = {**key, "path": path, **build_day(source, store_dir)}
+            manifest[name] = entry
+            save_manifest(manifest, store_dir)
+            rebuilt += 1
+        entries.append(entry)
+
+    if rebuilt:
+        log(f"Feature store: tính lại {rebuilt}/{len(files)} ngày")
+    return entries
+
+
+def read_entries(entries: list[dict], columns: list[str] | None = None) -> pd.DataFrame:
+    dfs = [pd.read_parquet(entry["path"], columns=columns) for entry in entries]
+    return pd.concat(dfs, ignore_index=True)
+
+
+def read_features(
+    files: list[str], columns: list[str] | None = None, store_dir: str = STORE_DIR
+) -> pd.DataFrame:
+    """Feature (kết quả feature_engineering) của các file, đọc từ cache Parquet."""
+    return read_entries(ensure_features(files, store_dir), columns)
+
+
+if __name__ == "__main__":
+    from src.ml.artifacts import PROCESSED_FOLDER, training_files
+
+    parser = argparse.ArgumentParser(
+        description="Tính trước feature cho từng ngày trong data/processed"
+    )
+    parser.add_argument("--folder", default=PROCESSED_FOLDER)
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    args = parser.parse_args()
+
+    entries = ensure_features(training_files(args.folder), args.store_dir)
+    print(
+        f"Feature store {args.store_dir}: {len(entries)} ngày, "
+        f"{sum(e['rows_features'] for e in entries)} dòng (version {FEATURE_VERSION})"
+    )
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+
+# Các cột số đầu vào bắt buộc (đã bỏ duration_minutes, number_of_seat)
+NUMERIC_COLS = [
+    "price_original",
+    "price_discounted",
+    "rating_overall",
+    "rating_safety",
+    "rating_info_accuracy",
+    "rating_staff_attitude",
+    "rating_comfort",
+    "rating_service_quality",
+    "rating_punctuality",
+    "reviewer_count",
+]
+SERVICE_COLS = ["rating_staff_attitude", "rating_service_quality", "rating_comfort"]
+TRUST_COLS = ["rating_safety", "rating_punctuality", "rating_info_accuracy"]
+
+# Tăng khi đổi cách tính feature để cache feature / artifact cũ bị tính lại
+FEATURE_VERSION = 1
+
+# Các cột feature_engineering thêm vào (theo thứ tự)
+DERIVED_COLS = [
+    "real_price",
+    "log_price",
+    "discount_rate",
+    "service_score",
+    "trust_score",
+    "wilson_score",
+    "price_rating_ratio_stable",
+    "fairness_index",
+]
+
+# Feature dùng để phân cụm
+FEATURES = [
+    "wilson_score",
+    "log_price",
+    "fairness_index",
+    "trust_score",
+    "service_score",
+]
+
+
+# =========================================================
+# WILSON SCORE (VECTOR HÓA)
+# =========================================================
+def wilson_lower_bound(p, n, z: float = 1.96) -> np.ndarray:
+    """
+    Cận dưới khoảng tin cậy Wilson cho tỉ lệ p với n lượt đánh giá.
+
+    Tính trên cả mảng cùng lúc, cùng thứ tự phép tính với bản tính từng dòng
+    nên kết quả trùng khớp tuyệt đối. n = 0 -> 0.0.
+    """
+    p = np.asarray(p, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = 1 + z**2 / n
+        centre = p + z * z / (2 * n)
+        margin = z * np.sqrt((p * (1 - p) + z * z / (4 * n)) / n)
+        score = (centre - margin) / denom
+
+    return np.where(n == 0, 0.0, score)
+
+
+def compute_feature_arrays(
+    price_original,
+    price_discounted,
+    rating_overall,
+    reviewer_count,
+    service_score,
+    trust_score,
+) -> dict[str, np.ndarray]:
+    """
+    Tính toàn bộ feature từ các mảng numpy (không tạo DataFrame).
+
+    Dùng chung cho feature_engineering (theo DataFrame) và cho dự đoán
+    từng chuyến / theo lô. Thứ tự key giống thứ tự cột của feature_engineering.
+    """
+    # Giữ nguyên kiểu số của giá (int64 -> real_price int64 như bản gốc)
+    price_original = np.asarray(price_original)
+    price_discounted = np.asarray(price_discounted)
+
+    # 2. REAL PRICE
+    real_price = np.where(price_discounted == 0, price_original, price_discounted)
+
+    # 3. LOG PRICE
+    log_price = np.log1p(real_price)
+
+    # 7. WILSON SCORE
+    p = np.asarray(rating_overall, dtype=np.float64) / 5.0
+    wilson_score = wilson_lower_bound(p, reviewer_count)
+
+    return {
+        "real_price": real_price,
+        "log_price": log_price,
+        # 4. DISCOUNT RATE
+        "discount_rate": 1 - price_discounted / price_original,
+        # 5-6. SERVICE / TRUST SCORE
+        "service_score": np.asarray(service_score, dtype=np.float64),
+        "trust_score": np.asarray(trust_score, dtype=np.float64),
+        "wilson_score": wilson_score,
+        # 8. PRICE–RATING RATIO (ổn định)
+        "price_rating_ratio_stable": wilson_score / log_price,
+        # 9. FAIRNESS INDEX
+        "fairness_index": wilson_score / np.sqrt(real_price),
+    }
+
+
+def _numeric_values(series: pd.Series) -> np.ndarray:
+    """Mảng numpy của cột số; kiểu nullable (Int64, Int32...) -> float64 với NaN."""
+    if isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return series.to_numpy()
+
+
+# =========================================================
+# HÀM FEATURE ENGINEERING DÙNG CHUNG CHO TRAIN & PREDICT
+# =========================================================
+def feature_engineering(df_raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tạo feature cho train & predict, vector hóa toàn bộ (không apply theo dòng).
+
+    Chỉ tạo một bản sao duy nhất là các dòng price_original != 0;
+    mọi phép tính đều chạy trên mảng float64.
+    """
+    # 1. Loại các dòng price_original = 0 (take trả về bản mới, không phải view)
+    df = df_raw.take(np.flatnonzero(_numeric_values(df_raw["price_original"]) != 0))
+
+    # Trung bình theo dòng của pandas (bỏ qua NaN) như bản gốc
+    service_score = df[SERVICE_COLS].astype(np.float64).mean(axis=1)
+    trust_score = df[TRUST_COLS].astype(np.float64).mean(axis=1)
+
+    features = compute_feature_arrays(
+        _numeric_values(df["price_original"]),
+        _numeric_values(df["price_discounted"]),
+        _numeric_values(df["rating_overall"]),
+        _numeric_values(df["reviewer_count"]),
+        service_score.to_numpy(),
+        trust_score.to_numpy(),
+    )
+    for col, values in features.items():
+        df[col] = values
+
+    return df
+
+
+def feature_matrix(df: pd.DataFrame, features: list[str] = FEATURES) -> np.ndarray:
+    """Ma trận feature (n x len(features)) float64, chỉ gồm các dòng hợp lệ."""
+    return feature_engineering(df)[features].to_numpy(dtype=np.float64)
@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics import adjusted_rand_score
+from sklearn.preprocessing import RobustScaler
+
+from src.ml.artifacts import (
+    K,
+    MODEL_DIR,
+    PROCESSED_FOLDER,
+    RANDOM_STATE,
+    feature_table,
+    fingerprint_files,
+    latest_artifact_path,
+    load_artifact,
+    load_or_train,
+    training_files,
+)
+from src.ml.features import FEATURES
+from src.transform.cleaning.chunked_cleaning import RowDeduplicator
+from src.utils.log_utils import log
+from src.utils.metrics_utils import REPORT_DIR
+
+STATE_PATH = os.path.join(MODEL_DIR, "incremental_state.joblib")
+# Số dòng tối đa giữ lại để ước lượng median / IQR cho RobustScaler
+RESERVOIR_SIZE = 200_000
+BATCH_SIZE = 1024
+
+
+# ====================================
+#           HELPERS
+# ====================================
+def to_raw(centers: np.ndarray, scaler: RobustScaler) -> np.ndarray:
+    return scaler.inverse_transform(centers)
+
+
+def match_clusters(centers: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """
+    Ghép cụm theo khoảng cách tâm (Hungarian).
+
+    Returns:
+        np.ndarray: perm với centers[perm[i]] ứng với reference[i].
+    """
+    cost = ((reference[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+    ref_idx, center_idx = linear_sum_assignment(cost)
+    return center_idx[np.argsort(ref_idx)]
+
+
+def reference_centers(
+    folder: str = PROCESSED_FOLDER, model_dir: str = MODEL_DIR
+) -> np.ndarray:
+    """
+    Tâm cụm (đơn vị gốc) của artifact full-fit mới nhất.
+
+    Thứ tự tâm của artifact này là thứ tự dùng trong cluster_meanings; nếu
+    chưa có artifact nào thì train một lần trên dữ liệu hiện có.
+    """
+    path = latest_artifact_path(model_dir)
+    if path is not None:
+        artifact = load_artifact(path)
+    else:
+        artifact = load_or_train(folder, model_dir)
+    return to_raw(artifact["model"].cluster_centers_, artifact["scaler"])
+
+
+# ====================================
+#       INCREMENTAL CLUSTERER
+# ====================================
+class IncrementalClusterer:
+    """
+    MiniBatchKMeans cập nhật theo từng file processed bằng partial_fit.
+
+    RobustScaler được fit lại trên reservoir sample (toàn bộ dữ liệu khi còn
+    ít hơn RESERVOIR_SIZE dòng) sau mỗi file; tâm cụm được quy đổi sang thang
+    đo mới để không mất những gì đã học. Cụm được khởi tạo theo thứ tự tâm
+    của artifact full-fit (ý nghĩa trong cluster_meanings) và tắt reassignment
+    nên ID cụm không đổi giữa các lần cập nhật.
+    """
+
+    def __init__(self, anchors: np.ndarray | None = None, seed: int = RANDOM_STATE):
+        self.anchors = anchors
+        self.rng = np.random.default_rng(seed)
+        self.scaler: RobustScaler | None = None
+        self.model: MiniBatchKMeans | None = None
+        self.reservoir = np.empty((0, len(FEATURES)), dtype=np.float64)
+        # Dòng chờ tới khi đủ K dòng cho lần partial_fit đầu tiên
+        self.pending = np.empty((0, len(FEATURES)), dtype=np.float64)
+        self.n_seen = 0
+        self.files: dict[str, str] = {}
+        # Loại dòng feature trùng giữa các ngày giống drop_duplicates của full fit
+        self.dedup = RowDeduplicator()
+        self.updated_at = None
+
+    # ---------- SCALING STATS ----------
+    def _update_reservoir(self, X: np.ndarray):
+        """Reservoir sampling (Algorithm R) vector hóa theo batch."""
+        free = max(RESERVOIR_SIZE - len(self.reservoir), 0)
+        if free:
+            self.reservoir = np.vstack([self.reservoir, X[:free]])
+
+        rest = X[free:]
+        if len(rest):
+            seen = self.n_seen + free + np.arange(len(rest))
+            slots = self.rng.integers(0, seen + 1)
+            keep = slots < RESERVOIR_SIZE
+            self.reservoir[slots[keep]] = rest[keep]
+        self.n_seen += len(X)
+
+    def _refit_scaler(self):
+        old = self.scaler
+        self.scaler = RobustScaler().fit(self.reservoir)
+        if old is not None and self.model is not None:
+            # Giữ nguyên tâm cụm trong đơn vị gốc khi thang đo thay đổi
+            raw = to_raw(self.model.cluster_centers_, old)
+            self.model.cluster_centers_ = self.scaler.transform(raw)
+
+    # ---------- UPDATE ----------
+    def partial_fit(self, X: np.ndarray):
+        """
+        Học thêm X. Lần partial_fit đầu tiên của MiniBatchKMeans cần ít nhất
+        K dòng: khi chưa đủ, các dòng được giữ trong pending (lưu cùng state)
+        và học gộp với các file sau.
+        """
+        if len(X) == 0:
+            return self
+
+        self._update_reservoir(X)
+        self._refit_scaler()
+        if self.model is None:
+            X = np.vstack([self.pending, X])
+            if len(X) < K:
+                self.pending = X
+                log(f"Chưa đủ {K} dòng để khởi tạo model, chờ file sau ({len(X)} dòng)")
+                return self
+            self.pending = self.pending[:0]
+        X_scaled = self.scaler.transform(X)
+
+        if self.model is None:
+            if self.anchors is not None:
+                init = self.scaler.transform(self.anchors)
+            else:
+                init = "k-means++"
+            self.model = MiniBatchKMeans(
+                n_clusters=K,
+                init=init,
+                n_init=1,
+                batch_size=BATCH_SIZE,
+                reassignment_ratio=0.0,
+                random_state=RANDOM_STATE,
+            )
+
+        for start in range(0, len(X_scaled), BATCH_SIZE):
+            self.model.partial_fit(X_scaled[start : start + BATCH_SIZE])
+
+        if self.anchors is None:
+            self.anchors = self.centers_raw()
+        self.updated_at = datetime.now().isoformat(timespec="seconds")
+        return self
+
+    def update_from_file(self, path: str) -> bool:
+        """partial_fit với một file processed; bỏ qua nếu file đã được học."""
+        name = os.path.basename(path)
+        digest = fingerprint_files([path])
+        if name in self.files:
+            if self.files[name] != digest:
+                log(
+                    f"WARNING {name} đã thay đổi sau khi được học, "
+                    f"chạy lại với --rebuild để học lại từ đầu"
+                )
+            return False
+
+        X = self.dedup.drop_seen(feature_table([path]))
+        self.partial_fit(X.to_numpy(np.float64))
+        self.files[name] = digest
+        log(f"Incremental update {name}: {self.n_seen} dòng đã học")
+        return True
+
+    # ---------- PREDICT ----------
+    def centers_raw(self) -> np.ndarray:
+        return to_raw(self.model.cluster_centers_, self.scaler)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.model.predict(self.scaler.transform(X))
+
+    # ---------- PERSIST ----------
+    def save(self, path: str = STATE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        # Lưu dạng dict để load được dù ghi từ `python -m src.ml.incremental`
+        joblib.dump(dict(vars(self)), tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = STATE_PATH) -> "IncrementalClusterer":
+        clusterer = cls.__new__(cls)
+        clusterer.__dict__.update(joblib.load(path))
+        # State lưu trước khi có pending
+        clusterer.__dict__.setdefault(
+            "pending", np.empty((0, len(FEATURES)), dtype=np.float64)
+        )
+        return clusterer
+
+
+def update_incremental(
+    folder: str = PROCESSED_FOLDER,
+    state_path: str = STATE_PATH,
+    model_dir: str = MODEL_DIR,
+    rebuild: bool = False,
+) -> IncrementalClusterer:
+    """Học thêm các file processed mới (theo thứ tự ngày) rồi lưu state."""
+    if os.path.exists(state_path) and not rebuild:
+        clusterer = IncrementalClusterer.load(state_path)
+    else:
+        clusterer = IncrementalClusterer(anchors=reference_centers(folder, model_dir))
+
+    updated = [
+        path for path in training_files(folder) if clusterer.update_from_file(path)
+    ]
+    if updated:
+        clusterer.save(state_path)
+    log(f"Incremental model: {len(updated)} file mới, {len(clusterer.files)} file")
+    return clusterer
+
+
+# ====================================
+#           DRIFT REPORT
+# ====================================
+def drift_report(
+    clusterer: IncrementalClusterer,
+    folder: str = PROCESSED_FOLDER,
+    model_dir: str = MODEL_DIR,
+) -> dict:
+    """
+    So sánh model incremental với model full refit trên toàn bộ dữ liệu.
+
+    Cụm của full refit được ghép với cụm incremental bằng Hungarian theo tâm,
+    mọi khoảng cách / inertia tính trong thang đo của full refit.
+    """
+    full = load_or_train(folder, model_dir)
+    X = feature_table(training_files(folder))
+    X_full = full["scaler"].transform(X)
+
+    inc_centers = full["scaler"].transform(
+        pd.DataFrame(clusterer.centers_raw(), columns=FEATURES)
+    )
+    perm = match_clusters(full["model"].cluster_centers_, inc_centers)
+    full_centers = full["model"].cluster_centers_[perm]
+
+    inc_labels = clusterer.predict(X.to_numpy(np.float64))
+    full_labels = np.argsort(perm)[full["model"].predict(X_full)]
+
+    def inertia(centers, labels):
+        return float(((X_full - centers[labels]) ** 2).sum())
+
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "files": len(clusterer.files),
+        "rows": int(len(X)),
+        "full_fingerprint": full["fingerprint"],
+        "full_to_incremental_ids": {int(perm[i]): i for i in range(K)},
+        "center_shift": np.linalg.norm(inc_centers - full_centers, axis=1).tolist(),
+        "centers_incremental": clusterer.centers_raw().tolist(),
+        "centers_full": to_raw(full_centers, full["scaler"]).tolist(),
+        "label_agreement": float((inc_labels == full_labels).mean()),
+        "adjusted_rand_index": float(adjusted_rand_score(full_labels, inc_labels)),
+        "inertia_incremental": inertia(inc_centers, inc_labels),
+        "inertia_full": inertia(full_centers, full_labels),
+        "cluster_sizes_incremental": np.bincount(inc_labels, minlength=K).tolist(),
+        "cluster_sizes_full": np.bincount(full_labels, minlength=K).tolist(),
+    }
+
+
+def write_drift_report(report: dict, report_dir: str = REPORT_DIR) -> str:
+    path = os.path.join(report_dir, "cluster_drift.json")
+    os.makedirs(report_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cập nhật model phân cụm incremental theo file processed mới"
+    )
+    parser.add_argument("--folder", default=PROCESSED_FOLDER)
+    parser.add_argument("--state", default=STATE_PATH)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="Học lại từ đầu")
+    parser.add_argument(
+        "--drift-report", action="store_true", help="So sánh với full refit"
+    )
+    args = parser.parse_args()
+
+    clusterer = update_incremental(
+        args.folder, args.state, args.model_dir, rebuild=args.rebuild
+    )
+    if args.drift_report and clusterer.model is None:
+        print(f"Model chưa được khởi tạo (cần ít nhất {K} dòng), bỏ qua drift report")
+    elif args.drift_report:
+        report = drift_report(clusterer, args.folder, args.model_dir)
+        path = write_drift_report(report)
+        print(
+            f"ARI {report['adjusted_rand_index']:.3f} | "
+            f"label agreement {report['label_agreement']:.1%} | "
+            f"inertia {report['inertia_incremental']:.1f} vs "
+            f"{report['inertia_full']:.1f} (full) -> {path}"
+        )
@@ -0,0 +1,217 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.cluster import KMeans
+from sklearn.metrics import adjusted_rand_score, silhouette_score
+from sklearn.preprocessing import RobustScaler
+from threadpoolctl import threadpool_limits
+
+from src.ml.artifacts import (
+    MODEL_DIR,
+    N_INIT,
+    PROCESSED_FOLDER,
+    feature_table,
+    fingerprint_files,
+    training_files,
+)
+from src.utils.log_utils import log
+from src.utils.metrics_utils import REPORT_DIR
+
+CACHE_DIR = os.path.join(MODEL_DIR, "selection")
+DEFAULT_KS = [2, 3, 4, 5, 6, 7, 8]
+DEFAULT_SEEDS = [0, 1, 2, 3, 40]
+# Số dòng tối đa dùng để fit mỗi cấu hình / tính silhouette (O(n^2))
+DEFAULT_SAMPLE_SIZE = 200_000
+DEFAULT_SILHOUETTE_SAMPLE = 10_000
+
+
+# ====================================
+#       MA TRẬN FEATURE (MEMMAP)
+# ====================================
+def build_scaled_matrix(
+    folder: str = PROCESSED_FOLDER,
+    cache_dir: str = CACHE_DIR,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+) -> tuple[str, int, str]:
+    """
+    Tính ma trận FEATURES đã scale (RobustScaler fit trên toàn bộ dữ liệu) một lần
+    và lưu .npy theo fingerprint dữ liệu; lấy mẫu ngẫu nhiên nếu vượt sample_size.
+
+    Returns:
+        (đường dẫn .npy, số dòng gốc, fingerprint)
+    """
+    files = training_files(folder)
+    fingerprint = fingerprint_files(files)
+    path = os.path.join(cache_dir, f"X_{fingerprint[:16]}_{sample_size}.npy")
+    meta_path = f"{path}.json"
+
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            n_rows = json.load(f)["n_rows"]
+        log(f"Dùng lại ma trận feature đã cache: {path}")
+        return path, n_rows, fingerprint
+
+    X = RobustScaler().fit_transform(feature_table(files))
+    n_rows = len(X)
+    if n_rows > sample_size:
+        rng = np.random.default_rng(0)
+        X = X[np.sort(rng.choice(n_rows, sample_size, replace=False))]
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp.npy"
+    np.save(tmp_path, np.ascontiguousarray(X, dtype=np.float64))
+    os.replace(tmp_path, path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"n_rows": n_rows, "fingerprint": fingerprint}, f)
+    log(f"Đã lưu ma trận feature {X.shape} -> {path}")
+    return path, n_rows, fingerprint
+
+
+# ====================================
+#           FIT 1 CẤU HÌNH
+# ====================================
+def fit_one(
+    matrix_path: str,
+    k: int,
+    seed: int,
+    n_init: int,
+    eval_idx: np.ndarray,
+) -> dict:
+    """Fit KMeans(k, seed) trên ma trận memmap (mỗi worker 1 thread BLAS/OpenMP)."""
+    X = np.load(matrix_path, mmap_mode="r")
+    start = time.perf_counter()
+    with threadpool_limits(limits=1):
+        model = KMeans(n_clusters=k, random_state=seed, n_init=n_init).fit(X)
+
+    labels_eval = model.labels_[eval_idx]
+    silhouette = (
+        float(silhouette_score(X[eval_idx], labels_eval))
+        if len(np.unique(labels_eval)) > 1
+        else float("nan")
+    )
+    return {
+        "k": k,
+        "seed": seed,
+        "inertia": float(model.inertia_),
+        "silhouette": silhouette,
+        "n_iter": int(model.n_iter_),
+        "seconds": round(time.perf_counter() - start, 3),
+        "labels_eval": labels_eval.astype(np.int8),
+    }
+
+
+def stability(labels_by_seed: list[np.ndarray]) -> float:
+    """ARI trung bình giữa các cặp seed (1.0 = phân cụm không phụ thuộc seed)."""
+    pairs = list(itertools.combinations(labels_by_seed, 2))
+    if not pairs:
+        return float("nan")
+    return float(np.mean([adjusted_rand_score(a, b) for a, b in pairs]))
+
+
+# ====================================
+#           SWEEP
+# ====================================
+def run_sweep(
+    ks: list[int] = DEFAULT_KS,
+    seeds: list[int] = DEFAULT_SEEDS,
+    n_init: int = N_INIT,
+    folder: str = PROCESSED_FOLDER,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    silhouette_sample: int = DEFAULT_SILHOUETTE_SAMPLE,
+    workers: int = -1,
+) -> dict:
+    """Fit lưới k x seed song song và tổng hợp silhouette / inertia / stability."""
+    matrix_path, n_rows, fingerprint = build_scaled_matrix(
+        folder, sample_size=sample_size
+    )
+    n_fit = len(np.load(matrix_path, mmap_mode="r"))
+    # Cùng một tập đánh giá cho mọi cấu hình để silhouette / ARI so sánh được
+    rng = np.random.default_rng(0)
+    eval_idx = np.sort(rng.choice(n_fit, min(silhouette_sample, n_fit), replace=False))
+
+    grid = list(itertools.product(ks, seeds))
+    log(f"Sweep {len(grid)} cấu hình trên {n_fit}/{n_rows} dòng...")
+    start = time.perf_counter()
+    runs = Parallel(n_jobs=workers)(
+        delayed(fit_one)(matrix_path, k, seed, n_init, eval_idx) for k, seed in grid
+    )
+
+    summary = []
+    for k in ks:
+        runs_k = [r for r in runs if r["k"] == k]
+        summary.append(
+            {
+                "k": k,
+                "inertia_mean": float(np.mean([r["inertia"] for r in runs_k])),
+                "silhouette_mean": float(np.mean([r["silhouette"] for r in runs_k])),
+                "silhouette_std": float(np.std([r["silhouette"] for r in runs_k])),
+                "stability_ari": stability([r["labels_eval"] for r in runs_k]),
+            }
+        )
+
+    for r in runs:
+        del r["labels_eval"]
+
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "fingerprint": fingerprint,
+        "n_rows": n_rows,
+        "n_fit": n_fit,
+        "n_eval": len(eval_idx),
+        "n_init": n_init,
+        "seconds": round(time.perf_counter() - start, 3),
+        "summary": summary,
+        "runs": runs,
+    }
+
+
+def write_report(report: dict, report_dir: str = REPORT_DIR) -> str:
+    path = os.path.join(report_dir, "model_selection.json")
+    os.makedirs(report_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Quét song song k x seed cho KMeans, báo cáo silhouette / inertia / stability"
+    )
+    parser.add_argument("--k", type=int, nargs="+", default=DEFAULT_KS)
+    parser.add_argument("--seeds", type=int, nargs="+", default=DEFAULT_SEEDS)
+    parser.add_argument("--n-init", type=int, default=N_INIT)
+    parser.add_argument("--folder", default=PROCESSED_FOLDER)
+    parser.add_argument("--sample-size", type=int, default=DEFAULT_SAMPLE_SIZE)
+    parser.add_argument(
+        "--silhouette-sample", type=int, default=DEFAULT_SILHOUETTE_SAMPLE
+    )
+    parser.add_argument("--workers", type=int, default=-1, help="-1 = mọi core")
+    args = parser.parse_args()
+
+    report = run_sweep(
+        args.k,
+        args.seeds,
+        args.n_init,
+        args.folder,
+        args.sample_size,
+        args.silhouette_sample,
+        args.workers,
+    )
+    path = write_report(report)
+
+    print(f"{'k':>3} {'inertia':>12} {'silhouette':>16} {'stability':>10}")
+    for row in report["summary"]:
+        print(
+            f"{row['k']:>3} {row['inertia_mean']:>12.1f} "
+            f"{row['silhouette_mean']:>9.3f} ±{row['silhouette_std']:.3f} "
+            f"{row['stability_ari']:>10.3f}"
+        )
+    print(f"- Đã lưu report vào {path} ({report['seconds']}s)")
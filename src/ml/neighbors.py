@@ -0,0 +1,265 @@
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+from src.ml.artifacts import (
+    ARTIFACT_VERSION,
+    MODEL_DIR,
+    PROCESSED_FOLDER,
+    fingerprint_files,
+    load_or_train,
+    training_files,
+)
+from src.ml.feature_store import read_features
+from src.ml.features import feature_engineering
+from src.utils.log_utils import log
+
+# Thông tin chuyến trả về cùng kết quả tìm kiếm
+INFO_COLS = [
+    "company_name",
+    "start_point",
+    "destination",
+    "departure_date",
+    "departure_time",
+    "price_original",
+    "price_discounted",
+    "rating_overall",
+    "reviewer_count",
+]
+# Định danh chuyến: các lần crawl lại cùng một chuyến chỉ trả về một lần
+TRIP_ID_COLS = [
+    "company_name",
+    "start_point",
+    "destination",
+    "departure_date",
+    "departure_time",
+    "pickup_point",
+    "dropoff_point",
+    "number_of_seat",
+]
+ROW_COLS = INFO_COLS + [c for c in TRIP_ID_COLS if c not in INFO_COLS]
+LEAF_SIZE = 40
+# Tăng khi đổi nội dung index (vd. cột lưu kèm) để index cũ được build lại
+INDEX_VERSION = 2
+
+
+def index_path(model_dir: str = MODEL_DIR) -> str:
+    return os.path.join(model_dir, f"neighbors_v{ARTIFACT_VERSION}.joblib")
+
+
+# ====================================
+#           INDEX
+# ====================================
+class TripNeighborIndex:
+    """
+    Chỉ mục k chuyến gần nhất trong không gian FEATURES đã scale, tách theo tuyến.
+
+    Mỗi tuyến (start_point, destination) gồm nhiều segment, mỗi segment là một
+    KDTree + bảng thông tin chuyến. Ngày mới chỉ tạo segment mới; các segment
+    được gộp theo kích thước (giống RowDeduplicator) nên mỗi tuyến chỉ có
+    O(log n) cây và không phải build lại toàn bộ khi thêm ngày.
+
+    Index giữ scaler của artifact lúc build (không đổi khi thêm ngày) nên
+    chuyến cần tìm phải được scale bằng index.scaler / query_features.
+    """
+
+    def __init__(self, artifact: dict):
+        self.version = INDEX_VERSION
+        self.fingerprint = artifact["fingerprint"]
+        self.scaler = artifact["scaler"]
+        self.features = artifact["features"]
+        self.segments: dict[tuple[str, str], list[dict]] = {}
+        self.files: dict[str, str] = {}
+
+    # ---------- BUILD ----------
+    @staticmethod
+    def _segment(X: np.ndarray, rows: pd.DataFrame) -> dict:
+        return {
+            "X": X,
+            "tree": KDTree(X, leaf_size=LEAF_SIZE),
+            "rows": rows.reset_index(drop=True),
+        }
+
+    def _add_segment(self, route: tuple[str, str], X: np.ndarray, rows: pd.DataFrame):
+        segments = self.segments.setdefault(route, [])
+        segments.append(self._segment(X, rows))
+        while len(segments) > 1 and len(segments[-2]["X"]) <= 2 * len(
+            segments[-1]["X"]
+        ):
+            last = segments.pop()
+            prev = segments[-1]
+            segments[-1] = self._segment(
+                np.vstack([prev["X"], last["X"]]),
+                pd.concat([prev["rows"], last["rows"]], ignore_index=True),
+            )
+
+    def add_frame(self, df: pd.DataFrame) -> int:
+        """Thêm các chuyến của một DataFrame processed, trả về số chuyến đã thêm."""
+        return self.add_features(feature_engineering(df))
+
+    def add_features(self, df_fe: pd.DataFrame) -> int:
+        """Thêm các chuyến đã có feature (kết quả feature_engineering)."""
+        df_fe = df_fe.dropna(subset=self.features)
+        if df_fe.empty:
+            return 0
+
+        X = self.scaler.transform(df_fe[self.features])
+        routes = df_fe.groupby(["start_point", "destination"], sort=False).indices
+        rows = df_fe[ROW_COLS + self.features]
+        for route, idx in routes.items():
+            self._add_segment(route, X[idx], rows.iloc[idx])
+        return len(df_fe)
+
+    def add_file(self, path: str) -> bool:
+        name = os.path.basename(path)
+        digest = fingerprint_files([path])
+        if name in self.files:
+            if self.files[name] != digest:
+                log(f"WARNING {name} đã thay đổi sau khi index, chạy lại với --rebuild")
+            return False
+
+        added = self.add_features(read_features([path]))
+        self.files[name] = digest
+        log(f"Index {name}: +{added} chuyến")
+        return True
+
+    # ---------- QUERY ----------
+    @property
+    def routes(self) -> list[tuple[str, str]]:
+        return sorted(self.segments)
+
+    def __len__(self) -> int:
+        return sum(len(s["X"]) for segs in self.segments.values() for s in segs)
+
+    def query(
+        self, x_scaled: np.ndarray, k: int = 5, route: tuple[str, str] | None = None
+    ) -> pd.DataFrame:
+        """
+        k chuyến khác nhau (theo TRIP_ID_COLS) gần nhất với vector đã scale
+        x_scaled (1 chuyến). Mỗi chuyến chỉ giữ lần crawl gần nhất; nếu các lần
+        crawl lại chiếm chỗ thì lấy thêm ứng viên (gấp đôi) tới khi đủ k.
+
+        route = None -> tìm trên mọi tuyến.
+        """
+        x_scaled = np.asarray(x_scaled, dtype=np.float64).reshape(1, -1)
+        if route is not None:
+            segments = self.segments.get(tuple(route), [])
+        else:
+            segments = [s for segs in self.segments.values() for s in segs]
+        if not segments:
+            return pd.DataFrame(columns=ROW_COLS + self.features + ["distance"])
+
+        largest = max(len(seg["X"]) for seg in segments)
+        fetch = k
+        while True:
+            candidates = []
+            for seg in segments:
+                dist, idx = seg["tree"].query(x_scaled, k=min(fetch, len(seg["X"])))
+                part = seg["rows"].iloc[idx[0]].copy()
+                part["distance"] = dist[0]
+                candidates.append(part)
+            result = (
+                pd.concat(candidates, ignore_index=True)
+                .sort_values("distance", kind="stable")
+                .drop_duplicates(TRIP_ID_COLS)
+            )
+            if len(result) >= k or fetch >= largest:
+                return result.head(k).reset_index(drop=True)
+            fetch *= 2
+
+    def query_features(
+        self, features: pd.DataFrame, k: int = 5, route: tuple[str, str] | None = None
+    ) -> pd.DataFrame:
+        """Như query nhưng nhận feature chưa scale (dòng đầu tiên của features)."""
+        return self.query(self.scaler.transform(features[self.features])[0], k, route)
+
+    # ---------- PERSIST ----------
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        # Lưu dạng dict để load được dù ghi từ `python -m src.ml.neighbors`
+        joblib.dump(dict(vars(self)), tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TripNeighborIndex":
+        index = cls.__new__(cls)
+        index.__dict__.update(joblib.load(path))
+        return index
+
+
+def update_index(
+    folder: str = PROCESSED_FOLDER,
+    model_dir: str = MODEL_DIR,
+    artifact: dict | None = None,
+    rebuild: bool = False,
+) -> TripNeighborIndex:
+    """
+    Load index đã lưu và chỉ thêm các ngày mới.
+
+    Build từ đầu (với scaler của artifact hiện tại) khi chưa có index,
+    rebuild=True, index được build với artifact khác artifact hiện tại
+    (fingerprint khác: artifact đã train lại, scaler đổi) hoặc INDEX_VERSION cũ.
+    """
+    path = index_path(model_dir)
+    artifact = artifact or load_or_train(folder, model_dir)
+    index = None
+    if os.path.exists(path) and not rebuild:
+        index = TripNeighborIndex.load(path)
+        if getattr(index, "version", 1) != INDEX_VERSION:
+            log("Index neighbors cũ (INDEX_VERSION khác) -> build lại")
+            index = None
+        elif index.fingerprint != artifact["fingerprint"]:
+            log(
+                f"Index neighbors build với artifact {index.fingerprint[:16]}, "
+                f"artifact hiện tại {artifact['fingerprint'][:16]} -> build lại"
+            )
+            index = None
+    rebuilt = index is None
+    if rebuilt:
+        index = TripNeighborIndex(artifact)
+
+    added = [f for f in training_files(folder) if index.add_file(f)]
+    if added or rebuilt:
+        index.save(path)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build / cập nhật chỉ mục chuyến tương tự (KDTree theo tuyến)"
+    )
+    parser.add_argument("--folder", default=PROCESSED_FOLDER)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument(
+        "--bench", type=int, default=0, help="Đo latency N truy vấn ngẫu nhiên"
+    )
+    args = parser.parse_args()
+
+    index = update_index(args.folder, args.model_dir, rebuild=args.rebuild)
+    n_segments = sum(len(segs) for segs in index.segments.values())
+    print(
+        f"Index: {len(index)} chuyến, {len(index.routes)} tuyến, "
+        f"{n_segments} segment, {len(index.files)} file"
+    )
+
+    if args.bench:
+        rng = np.random.default_rng(0)
+        timings = []
+        for _ in range(args.bench):
+            route = index.routes[rng.integers(len(index.routes))]
+            seg = index.segments[route][0]
+            x = seg["X"][rng.integers(len(seg["X"]))]
+            start = time.perf_counter()
+            index.query(x, k=5, route=route)
+            timings.append(time.perf_counter() - start)
+        print(
+            f"Query theo tuyến (k=5): p50 {np.percentile(timings, 50) * 1000:.2f} ms, "
+            f"p99 {np.percentile(timings, 99) * 1000:.2f} ms"
+        )
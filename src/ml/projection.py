@@ -0,0 +1,67 @@
+import numpy as np
+
+# Số điểm tối đa vẽ trên scatter, không phụ thuộc kích thước dữ liệu
+POINT_BUDGET = 5_000
+DENSITY_BINS = 120
+
+
+def stratified_sample(labels: np.ndarray, budget: int = POINT_BUDGET, seed: int = 0):
+    """
+    Chỉ số mẫu phân tầng theo cụm, tổng cộng tối đa budget điểm.
+
+    Mỗi cụm nhận phần tỉ lệ với kích thước, nhưng ít nhất budget / (2K) điểm
+    (hoặc cả cụm nếu nhỏ hơn) để cụm nhỏ vẫn thấy được trên hình.
+    """
+    n = len(labels)
+    if n <= budget:
+        return np.arange(n)
+
+    rng = np.random.default_rng(seed)
+    clusters, sizes = np.unique(labels, return_counts=True)
+    floor = budget // (2 * len(clusters))
+    quotas = np.maximum(budget * sizes // n, np.minimum(sizes, floor))
+    # Bớt ở cụm lớn nhất nếu phần tối thiểu làm vượt budget
+    quotas[np.argmax(quotas)] -= max(quotas.sum() - budget, 0)
+
+    idx = [
+        rng.choice(np.flatnonzero(labels == cluster), quota, replace=False)
+        for cluster, quota in zip(clusters, quotas)
+    ]
+    return np.sort(np.concatenate(idx))
+
+
+def density_grid(
+    points: np.ndarray, labels: np.ndarray, n_clusters: int, bins: int = DENSITY_BINS
+) -> dict:
+    """
+    Đếm số điểm theo ô lưới bins x bins cho từng cụm (kích thước cố định).
+
+    Returns:
+        dict: counts (K, bins, bins) uint32 với trục [cụm, x, y] và extent
+        [xmin, xmax, ymin, ymax] của lưới.
+    """
+    # Cắt 0.1% hai đầu để vài điểm ngoại lai không làm lưới quá thưa
+    lo = np.percentile(points, 0.1, axis=0)
+    hi = np.percentile(points, 99.9, axis=0)
+    hi = np.where(hi > lo, hi, lo + 1.0)
+    edges = [np.linspace(lo[d], hi[d], bins + 1) for d in range(2)]
+
+    counts = np.zeros((n_clusters, bins, bins), dtype=np.uint32)
+    for cluster in range(n_clusters):
+        mask = labels == cluster
+        counts[cluster], _, _ = np.histogram2d(
+            points[mask, 0], points[mask, 1], bins=edges
+        )
+    return {"counts": counts, "extent": [lo[0], hi[0], lo[1], hi[1]]}
+
+
+def project(pca, X_scaled: np.ndarray, labels: np.ndarray, n_clusters: int) -> dict:
+    """Chiếu PCA 2D một lần và giữ lại mẫu phân tầng + lưới mật độ."""
+    points = pca.transform(X_scaled)
+    idx = stratified_sample(labels)
+    return {
+        "sample_points": points[idx].astype(np.float32),
+        "sample_labels": labels[idx].astype(np.int8),
+        "n_points": len(points),
+        "density": density_grid(points, labels, n_clusters),
+    }
@@ -0,0 +1,244 @@
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from src.ml.artifacts import MODEL_DIR, latest_artifact_path, load_artifact
+from src.ml.features import DERIVED_COLS, NUMERIC_COLS, feature_engineering
+from src.transform.cleaning.dtype_cleaner import (
+    CATEGORY_COLS,
+    INTEGER_COLS,
+    RATING_COLS,
+    ratings_as_float64,
+)
+from src.utils.log_utils import log
+from src.utils.metrics_utils import span, write_run_report
+
+DEFAULT_CHUNKSIZE = 200_000
+# Dòng không tạo được đủ feature (NaN) không được gán cụm
+UNSCORED = -1
+
+
+# ====================================
+#           SCORE
+# ====================================
+def score_frame(df: pd.DataFrame, artifact: dict) -> pd.DataFrame:
+    """
+    Thêm các feature và cột predicted_cluster cho một chunk.
+
+    Output giữ đủ số dòng và thứ tự của input: dòng price_original = 0 (bị
+    feature_engineering bỏ, giống app) hoặc còn NaN ở FEATURES nhận
+    predicted_cluster = UNSCORED (dòng bị bỏ có feature NaN).
+    """
+    # Parquet ghi từ DataFrame theo dtype policy có rating float32
+    df = ratings_as_float64(df).copy()
+    index = df.index
+    df = df.reset_index(drop=True)
+    df[NUMERIC_COLS] = df[NUMERIC_COLS].apply(pd.to_numeric, errors="coerce")
+    df_fe = feature_engineering(df)
+
+    features = artifact["features"]
+    valid = df_fe[features].notna().all(axis=1).to_numpy()
+    labels = np.full(len(df_fe), UNSCORED, dtype=np.int8)
+    if valid.any():
+        X = artifact["scaler"].transform(df_fe.loc[valid, features])
+        labels[valid] = artifact["model"].predict(X)
+
+    df_fe["predicted_cluster"] = labels
+    dropped = df.index.difference(df_fe.index)
+    if len(dropped):
+        df_fe = pd.concat([df_fe, df.loc[dropped]]).sort_index()
+        df_fe["predicted_cluster"] = (
+            df_fe["predicted_cluster"].fillna(UNSCORED).astype(np.int8)
+        )
+    df_fe.index = index
+    return df_fe
+
+
+# Artifact được load một lần trong mỗi process con
+_ARTIFACT = None
+
+
+def _init_worker(artifact_path: str):
+    global _ARTIFACT
+    _ARTIFACT = load_artifact(artifact_path)
+
+
+def _score_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    return score_frame(df, _ARTIFACT)
+
+
+# ====================================
+#           READERS
+# ====================================
+def iter_csv(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def iter_parquet(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Đọc một file Parquet hoặc cả thư mục partition theo batch."""
+    import pyarrow.dataset as ds
+
+    for batch in ds.dataset(path, format="parquet").to_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+def iter_query(query: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    from src.database.db_manager import DatabaseManager
+
+    with DatabaseManager.from_config() as db:
+        yield from pd.read_sql(query, db.conn, chunksize=chunksize)
+
+
+def iter_input(source: str, chunksize: int, query: bool = False):
+    if query:
+        return iter_query(source, chunksize)
+    if os.path.isdir(source) or source.endswith(".parquet"):
+        return iter_parquet(source, chunksize)
+    return iter_csv(source, chunksize)
+
+
+# ====================================
+#           WRITERS
+# ====================================
+def parquet_schema(df: pd.DataFrame):
+    """
+    Schema Parquet của output, lấy theo kiểu khai báo của từng cột.
+
+    Không dùng kiểu pandas suy ra từ chunk đầu: một cột toàn NaN ở chunk này
+    là float64 nhưng ở chunk sau lại là chuỗi. Cột không có trong khai báo
+    giữ kiểu của chunk đầu; nếu chunk đầu toàn NaN thì dùng string
+    (string nhận được cả giá trị số ở các chunk sau).
+    """
+    import pyarrow as pa
+
+    declared = (
+        {col: pa.string() for col in CATEGORY_COLS}
+        | {col: pa.from_numpy_dtype(np.dtype(t)) for col, t in INTEGER_COLS.items()}
+        # score_frame ép NUMERIC_COLS về số thực (to_numeric, NaN)
+        | {col: pa.float64() for col in RATING_COLS + NUMERIC_COLS + DERIVED_COLS}
+        | {"predicted_cluster": pa.int8()}
+    )
+    fields = []
+    for field in pa.Schema.from_pandas(df, preserve_index=False):
+        type_ = declared.get(field.name, field.type)
+        if field.name not in declared and df[field.name].isna().all():
+            type_ = pa.string()
+        fields.append(pa.field(field.name, type_))
+    return pa.schema(fields)
+
+
+class ChunkWriter:
+    """Ghi nối tiếp các chunk ra CSV hoặc Parquet (theo đuôi file)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.parquet = path.endswith(".parquet")
+        self._writer = None
+        self.rows = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def write(self, df: pd.DataFrame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._writer is None:
+                schema = parquet_schema(df)
+                self._writer = pq.ParquetWriter(self.tmp_path, schema)
+            schema = self._writer.schema
+            table = pa.Table.from_pandas(df[schema.names], preserve_index=False)
+            self._writer.write_table(table.cast(schema))
+        else:
+            df.to_csv(
+                self.tmp_path,
+                mode="w" if self.rows == 0 else "a",
+                header=self.rows == 0,
+                index=False,
+            )
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self.tmp_path):
+            os.replace(self.tmp_path, self.path)
+
+
+# ====================================
+#           BATCH SCORING
+# ====================================
+def score_batch(
+    chunks,
+    out_path: str,
+    artifact_path: str,
+    workers: int | None = None,
+) -> int:
+    """
+    Chấm cụm cho từng chunk trong process pool và ghi ra out_path theo thứ tự.
+
+    Số chunk đang xử lý bị giới hạn (2 x workers) nên bộ nhớ không phụ thuộc
+    kích thước đầu vào.
+    """
+    workers = workers or os.cpu_count() or 1
+    writer = ChunkWriter(out_path)
+    pending = deque()
+    start = time.perf_counter()
+
+    def write_next():
+        with span("score.write") as s:
+            df = pending.popleft().result()
+            writer.write(df)
+            s.rows_out = len(df)
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(artifact_path,)
+    ) as pool:
+        for chunk in chunks:
+            pending.append(pool.submit(_score_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                write_next()
+        while pending:
+            write_next()
+
+    writer.close()
+    seconds = time.perf_counter() - start
+    log(
+        f"Scored {writer.rows} rows -> {out_path} in {seconds:.1f}s "
+        f"({writer.rows / max(seconds, 1e-9):,.0f} rows/s, {workers} workers)"
+    )
+    return writer.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Gán cụm (predicted_cluster) + feature cho file processed / Parquet / DB"
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="File CSV, file Parquet hoặc thư mục Parquet")
+    source.add_argument("--query", help="Câu SQL đọc từ database trong config.json")
+    parser.add_argument("--output", required=True, help="File .csv hoặc .parquet")
+    parser.add_argument("--artifact", help="Mặc định: artifact mới nhất trong models/")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    artifact_path = args.artifact or latest_artifact_path(MODEL_DIR)
+    if artifact_path is None:
+        parser.error("Chưa có artifact, chạy `python -m src.ml.artifacts` trước")
+
+    chunks = iter_input(
+        args.query or args.input, args.chunksize, query=bool(args.query)
+    )
+    score_batch(chunks, args.output, artifact_path, workers=args.workers)
+    write_run_report("scoring")
+
+
+if __name__ == "__main__":
+    main()
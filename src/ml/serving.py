@@ -0,0 +1,196 @@
+import argparse
+import json
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from src.ml.artifacts import MODEL_DIR, latest_artifact_path, load_artifact
+from src.ml.features import (
+    NUMERIC_COLS,
+    SERVICE_COLS,
+    TRUST_COLS,
+    compute_feature_arrays,
+)
+from src.utils.log_utils import log
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8502
+MAX_BATCH = 10_000
+
+_COL_IDX = {col: i for i, col in enumerate(NUMERIC_COLS)}
+_SERVICE_IDX = [_COL_IDX[col] for col in SERVICE_COLS]
+_TRUST_IDX = [_COL_IDX[col] for col in TRUST_COLS]
+
+
+# ====================================
+#           SCORER
+# ====================================
+class CentroidScorer:
+    """
+    Dự đoán cụm bằng NumPy thuần từ scaler + tâm cụm của artifact.
+
+    Tâm cụm được quy đổi sẵn về đơn vị gốc: với RobustScaler (center, scale)
+    khoảng cách ((x - center) / scale - m)^2 = ((x - (center + scale * m)) / scale)^2,
+    nên mỗi request chỉ còn một phép trừ, nhân và argmin.
+    """
+
+    def __init__(self, artifact: dict):
+        scaler = artifact["scaler"]
+        center = scaler.center_ if scaler.center_ is not None else 0.0
+        scale = scaler.scale_ if scaler.scale_ is not None else 1.0
+
+        self.features = artifact["features"]
+        self.fingerprint = artifact["fingerprint"]
+        self.trained_at = artifact["trained_at"]
+        self.centroids = center + scale * artifact["model"].cluster_centers_
+        self.inv_scale = np.broadcast_to(1.0 / np.asarray(scale), (len(self.features),))
+
+    def score(self, values: np.ndarray) -> tuple[np.ndarray, dict]:
+        """
+        values: mảng (n, len(NUMERIC_COLS)) float64 theo thứ tự NUMERIC_COLS.
+
+        Returns:
+            (clusters, features): cụm (-1 nếu price_original = 0 hoặc feature NaN)
+            và dict feature -> mảng n phần tử.
+        """
+        # Dòng price_original = 0 cho ra inf/NaN, bị đánh dấu -1 bên dưới
+        with np.errstate(divide="ignore", invalid="ignore"):
+            feats = compute_feature_arrays(
+                values[:, _COL_IDX["price_original"]],
+                values[:, _COL_IDX["price_discounted"]],
+                values[:, _COL_IDX["rating_overall"]],
+                values[:, _COL_IDX["reviewer_count"]],
+                values[:, _SERVICE_IDX].mean(axis=1),
+                values[:, _TRUST_IDX].mean(axis=1),
+            )
+        X = np.column_stack([feats[name] for name in self.features])
+        diff = (X[:, None, :] - self.centroids[None, :, :]) * self.inv_scale
+        clusters = (diff * diff).sum(axis=2).argmin(axis=1)
+
+        # feature_engineering bỏ các dòng price_original = 0
+        zero_price = values[:, _COL_IDX["price_original"]] == 0
+        clusters[zero_price | ~np.isfinite(X).all(axis=1)] = -1
+        return clusters, feats
+
+
+def parse_trips(payload) -> np.ndarray:
+    """Body JSON (một chuyến, list chuyến hoặc {"trips": [...]}) -> mảng NUMERIC_COLS."""
+    if isinstance(payload, dict):
+        trips = payload.get("trips", [payload])
+    else:
+        trips = payload
+    if not isinstance(trips, list) or not trips:
+        raise ValueError("Body phải là một chuyến, list chuyến hoặc {'trips': [...]}")
+    if len(trips) > MAX_BATCH:
+        raise ValueError(f"Tối đa {MAX_BATCH} chuyến mỗi request")
+
+    try:
+        values = np.array(
+            [[float(trip[col]) for col in NUMERIC_COLS] for trip in trips],
+            dtype=np.float64,
+        )
+    except KeyError as e:
+        raise ValueError(f"Thiếu trường {e.args[0]}")
+    except (TypeError, ValueError):
+        raise ValueError(f"Các trường {NUMERIC_COLS} phải là số")
+    # json.loads chấp nhận NaN / Infinity
+    if not np.isfinite(values).all():
+        raise ValueError(f"Các trường {NUMERIC_COLS} phải là số hữu hạn")
+    return values
+
+
+def _json_floats(values: np.ndarray) -> list:
+    """Mảng float -> list cho JSON, inf / NaN (vd. price_original = 0) -> null."""
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+# ====================================
+#           HTTP SERVER
+# ====================================
+class ScoringHandler(BaseHTTPRequestHandler):
+    # Keep-alive để client tái sử dụng kết nối; tắt Nagle để header và body
+    # (ghi 2 lần) không bị giữ lại chờ ACK
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    scorer: CentroidScorer = None
+
+    def _send_json(self, status: HTTPStatus, body: dict):
+        data = json.dumps(body, ensure_ascii=False, allow_nan=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+        self._send_json(
+            HTTPStatus.OK,
+            {
+                "status": "ok",
+                "fingerprint": self.scorer.fingerprint,
+                "trained_at": self.scorer.trained_at,
+                "features": self.scorer.features,
+            },
+        )
+
+    def do_POST(self):
+        if self.path != "/predict":
+            return self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length))
+            values = parse_trips(payload)
+        except ValueError as e:  # gồm cả JSONDecodeError
+            return self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+
+        clusters, feats = self.scorer.score(values)
+        names = self.scorer.features
+        columns = [_json_floats(feats[name]) for name in names]
+        predictions = [
+            {
+                "cluster": int(cluster) if cluster >= 0 else None,
+                **{name: col[i] for name, col in zip(names, columns)},
+            }
+            for i, cluster in enumerate(clusters.tolist())
+        ]
+        self._send_json(HTTPStatus.OK, {"predictions": predictions})
+
+    def log_message(self, format, *args):
+        # Không log từng request (ảnh hưởng latency)
+        pass
+
+
+def make_server(
+    artifact_path: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
+) -> ThreadingHTTPServer:
+    handler = type(
+        "BoundScoringHandler",
+        (ScoringHandler,),
+        {"scorer": CentroidScorer(load_artifact(artifact_path))},
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP service dự đoán cụm chuyến xe")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--artifact", help="Mặc định: artifact mới nhất trong models/")
+    args = parser.parse_args()
+
+    artifact_path = args.artifact or latest_artifact_path(MODEL_DIR)
+    if artifact_path is None:
+        parser.error("Chưa có artifact, chạy `python -m src.ml.artifacts` trước")
+
+    server = make_server(artifact_path, args.host, args.port)
+    log(f"Scoring service ({artifact_path}) at http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
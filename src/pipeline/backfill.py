@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import re
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+
+from src.transform.cleaning.chunked_cleaning import clean_vexere_chunked
+from src.transform.cleaning.cleaning import clean_vexere, read_trips_with_address
+from src.utils.file_utils import (
+    DAYSOFF,
+    STAGE_SUFFIX,
+    crawl_date_from_file_path,
+    day_from_file_path,
+)
+from src.utils.log_utils import log
+from src.utils.metrics_utils import RUN_REPORT, write_run_report
+
+# File raw lớn hơn ngưỡng này được làm sạch theo chunk
+CHUNKED_THRESHOLD_BYTES = 200 * 1024 * 1024
+DEFAULT_PROGRESS_FILE = "data/backfill_progress.json"
+
+
+# ====================================
+#           PROGRESS FILE
+# ====================================
+def load_progress(progress_file: str) -> dict:
+    """
+    Tiến độ theo hai trạng thái riêng, khóa là tên lần crawl (tên file không
+    có hậu tố stage, vd. "2025_11_12", "2025_11_26_d5"):
+    - cleaned: lần crawl -> kết quả clean_file (file processed đã ghi);
+    - loaded: chế độ nạp ("snapshot" / "cdc") -> lần crawl -> ngày crawl đã nạp.
+    """
+    if not os.path.exists(progress_file):
+        return {"cleaned": {}, "loaded": {}}
+    with open(progress_file, "r", encoding="utf-8") as f:
+        progress = json.load(f)
+    if "done" in progress:
+        # Định dạng cũ: một mục "done" theo ngày kèm cờ loaded (không rõ chế độ
+        # nạp -> coi như chưa nạp, nạp lại được vì load giờ idempotent)
+        progress = {"cleaned": progress["done"], "loaded": {}}
+        for result in progress["cleaned"].values():
+            result.pop("loaded", None)
+    # Khóa cũ theo ngày ISO ("2025-11-12") -> tên file "2025_11_12"
+    progress["cleaned"] = _rename_day_keys(progress["cleaned"])
+    for mode, mode_loaded in progress["loaded"].items():
+        progress["loaded"][mode] = _rename_day_keys(mode_loaded)
+    return progress
+
+
+def _rename_day_keys(entries: dict) -> dict:
+    return {
+        (
+            key.replace("-", "_") if re.fullmatch(r"\d{4}-\d{2}-\d{2}", key) else key
+        ): value
+        for key, value in entries.items()
+    }
+
+
+def save_progress(progress: dict, progress_file: str):
+    """Ghi progress qua file tạm rồi rename để không hỏng file khi bị ngắt."""
+    os.makedirs(os.path.dirname(progress_file) or ".", exist_ok=True)
+    tmp_path = f"{progress_file}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(progress, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, progress_file)
+
+
+# ====================================
+#           WORKER TASK
+# ====================================
+def crawl_file_path(stage: str, name: str, base_path: str = "data") -> Path:
+    """("raw", "2025_11_26_d5") -> data/raw/2025_11_26_d5_raw.csv"""
+    return Path(base_path) / stage / f"{name}_{STAGE_SUFFIX[stage]}.csv"
+
+
+def crawl_names(
+    stage: str, start: date, end: date, base_path: str = "data"
+) -> list[str]:
+    """
+    Tên các lần crawl có file ở stage với ngày trong tên file thuộc [start, end]:
+    cả file mặc định (<ngày>_raw.csv) lẫn lần crawl offset khác (<ngày>_d<offset>_raw.csv).
+    """
+    suffix = f"_{STAGE_SUFFIX[stage]}.csv"
+    return sorted(
+        path.name.removesuffix(suffix)
+        for path in (Path(base_path) / stage).glob(f"*{suffix}")
+        if start <= day_from_file_path(path) <= end
+    )
+
+
+def clean_file(name: str, base_path: str = "data") -> dict:
+    """Làm sạch file raw của một lần crawl và ghi file processed (chạy trong process con)."""
+    RUN_REPORT.reset()  # process con được tái sử dụng giữa các task
+    start = time.perf_counter()
+    raw_path = crawl_file_path("raw", name, base_path)
+    out_path = crawl_file_path("processed", name, base_path)
+    tmp_path = out_path.with_suffix(".csv.tmp")
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if raw_path.stat().st_size > CHUNKED_THRESHOLD_BYTES:
+        rows = clean_vexere_chunked(str(raw_path), str(tmp_path))
+    else:
+        df = pd.read_csv(raw_path)
+        if not df.empty:
+            df = clean_vexere(df)
+        df.to_csv(tmp_path, index=False)
+        rows = len(df)
+
+    os.replace(tmp_path, out_path)
+    return {
+        "file": name,
+        "rows": rows,
+        "seconds": round(time.perf_counter() - start, 3),
+        "metrics": RUN_REPORT.to_dict(),
+    }
+
+
+# ====================================
+#           BACKFILL
+# ====================================
+def load_file(
+    db, name: str, base_path: str = "data", daysoff: int = DAYSOFF, cdc: bool = False
+) -> str:
+    """
+    Nạp file processed của một lần crawl, trả về ngày crawl. Nạp lại cùng
+    file không tạo dòng trùng: snapshot xóa chuyến cũ của lần crawl trước khi
+    insert, CDC sửa tại chỗ phiên bản cùng ngày crawl.
+    """
+    # import tại chỗ để chế độ chỉ làm sạch không cần psycopg2
+    from src.load.cdc import insert_trips_cdc
+    from src.load.loading import insert_trips_from_dataframe
+
+    path = crawl_file_path("processed", name, base_path)
+    crawl_date = str(crawl_date_from_file_path(path, daysoff))
+    if cdc:
+        # Khóa chuyến CDC cần địa chỉ gốc: làm sạch lại file raw cùng tên
+        insert_trips_cdc(db, read_trips_with_address(path), crawl_date=crawl_date)
+    else:
+        df = pd.read_csv(path)
+        insert_trips_from_dataframe(db, df, crawl_date=crawl_date, replace=True)
+    return crawl_date
+
+
+def run_backfill(
+    start: date,
+    end: date,
+    workers: int | None = None,
+    db=None,
+    base_path: str = "data",
+    progress_file: str = DEFAULT_PROGRESS_FILE,
+    daysoff: int = DAYSOFF,
+    cdc: bool = False,
+    redo: bool = False,
+) -> dict:
+    """
+    Làm sạch lại (và nạp DB nếu có db) toàn bộ các ngày trong [start, end].
+
+    Ngày là ngày trong tên file; mỗi file raw của các ngày đó (kể cả lần
+    crawl offset khác, _d<offset>) là một task trong process pool. Kết quả
+    được nạp DB và ghi progress theo đúng thứ tự ngày crawl nên có thể chạy
+    tiếp sau khi bị ngắt. Trạng thái clean và load được lưu riêng: file đã
+    clean nhưng chưa nạp (chạy trước không có --load, hoặc bị ngắt giữa lúc
+    nạp) chỉ được nạp. redo=True clean lại (và nạp lại) cả các file đã xong,
+    vd. sau khi đổi quy tắc làm sạch. cdc=True nạp theo kiểu change-data
+    capture (src.load.cdc); thứ tự ngày crawl tăng dần ở đây cũng là điều
+    kiện để các khoảng hiệu lực đúng.
+    """
+    progress = load_progress(progress_file)
+    cleaned = progress["cleaned"]
+    loaded = progress["loaded"].setdefault("cdc" if cdc else "snapshot", {})
+
+    to_clean = [
+        name
+        for name in crawl_names("raw", start, end, base_path)
+        if redo or name not in cleaned
+    ]
+    to_load = (
+        [
+            name
+            for name in set(to_clean)
+            | set(crawl_names("processed", start, end, base_path))
+            if name not in loaded or name in to_clean
+        ]
+        if db is not None
+        else []
+    )
+    pending = sorted(
+        set(to_clean) | set(to_load),
+        key=lambda name: (
+            crawl_date_from_file_path(f"{name}_raw.csv", daysoff),
+            name,
+        ),
+    )
+    log(
+        f"Backfill {start} → {end}: {len(to_clean)} file cần làm sạch, "
+        f"{len(to_load)} file cần nạp "
+        f"({len(cleaned)} file đã làm sạch trước đó)"
+    )
+    if not pending:
+        return progress
+
+    began = time.perf_counter()
+    # File chỉ cần nạp có kết quả clean rỗng ngay từ đầu
+    finished: dict[str, dict | None] = {
+        name: {} for name in pending if name not in to_clean
+    }
+    next_idx = 0
+
+    def drain():
+        """Nạp DB + ghi progress theo thứ tự ngày crawl cho các file đã sẵn sàng."""
+        nonlocal next_idx
+        while next_idx < len(pending) and pending[next_idx] in finished:
+            key = pending[next_idx]
+            result = finished.pop(key)
+            next_idx += 1
+            if result is None:
+                continue
+            if result:
+                RUN_REPORT.merge(result.pop("metrics"))
+                cleaned[key] = result
+                # File processed mới -> các lần nạp trước của file này đã cũ
+                for mode_loaded in progress["loaded"].values():
+                    mode_loaded.pop(key, None)
+                save_progress(progress, progress_file)
+
+            if db is not None:
+                loaded[key] = load_file(db, key, base_path, daysoff, cdc)
+                save_progress(progress, progress_file)
+
+            minutes = (time.perf_counter() - began) / 60
+            steps = ["clean"] * bool(result) + ["load"] * (db is not None)
+            log(
+                f"Done {key} ({' + '.join(steps)}) | "
+                f"{next_idx}/{len(pending)} file | "
+                f"{next_idx / minutes:.1f} file/phút"
+            )
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(clean_file, name, base_path): name for name in to_clean}
+        drain()
+
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                finished[name] = future.result()
+            except Exception as e:
+                log(f"ERROR cleaning {name}: {type(e).__name__}: {e}")
+                finished[name] = None
+            drain()
+
+    minutes = (time.perf_counter() - began) / 60
+    log(
+        f"Backfill complete: {len(pending)} file trong {minutes:.2f} phút "
+        f"({len(pending) / minutes:.1f} file/phút)"
+    )
+    return progress
+
+
+def parse_day(text: str) -> date:
+    return datetime.strptime(text, "%Y-%m-%d").date()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Làm sạch lại và nạp DB song song cho nhiều ngày"
+    )
+    parser.add_argument("--start", type=parse_day, required=True, help="YYYY-MM-DD")
+    parser.add_argument("--end", type=parse_day, required=True, help="YYYY-MM-DD")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--load", action="store_true", help="Nạp kết quả vào DB")
+    parser.add_argument("--base-path", default="data")
+    parser.add_argument("--progress-file", default=DEFAULT_PROGRESS_FILE)
+    parser.add_argument("--daysoff", type=int, default=DAYSOFF)
+    parser.add_argument(
+        "--cdc", action="store_true", help="Nạp kiểu CDC (chỉ ghi giá trị thay đổi)"
+    )
+    parser.add_argument(
+        "--redo",
+        action="store_true",
+        help="Làm sạch / nạp lại cả các ngày đã xong (sau khi đổi quy tắc làm sạch)",
+    )
+    args = parser.parse_args()
+
+    if args.load:
+        from src.database.db_manager import DatabaseManager
+
+        db_ctx = DatabaseManager.from_config()
+    else:
+        db_ctx = nullcontext()
+
+    with db_ctx as db:
+        run_backfill(
+            args.start,
+            args.end,
+            workers=args.workers,
+            db=db,
+            base_path=args.base_path,
+            progress_file=args.progress_file,
+            daysoff=args.daysoff,
+            cdc=args.cdc,
+            redo=args.redo,
+        )
+
+    write_run_report(f"backfill_{args.start:%Y_%m_%d}_{args.end:%Y_%m_%d}")
+
+
+if __name__ == "__main__":
+    main()
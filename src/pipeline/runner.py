@@ -0,0 +1,400 @@
+import argparse
+import io
+import os
+import queue
+import threading
+import time
+from contextlib import ExitStack
+from datetime import date, timedelta
+
+import pandas as pd
+
+from src.transform.cleaning.chunked_cleaning import RowDeduplicator
+from src.transform.cleaning.cleaning import (
+    dedup_cols,
+    finalize_vexere,
+    prepare_vexere,
+    rating_cols,
+)
+from src.transform.cleaning.location_cleaner import ADDRESS_COLS
+from src.transform.cleaning.rating_cleaner import (
+    RENAME_RATING_COLS,
+    median_from_value_counts,
+    merge_value_counts,
+    rating_value_counts,
+)
+from src.utils.file_utils import crawl_file_name, load_routes
+from src.utils.log_utils import log
+from src.utils.metrics_utils import RUN_REPORT, span, write_run_report
+
+DAYSOFF = 2
+# Số frame tối đa chờ ở mỗi hàng đợi: crawl nhanh hơn clean/load thì crawl bị
+# chặn ở put() (backpressure) thay vì dồn frame trong bộ nhớ
+QUEUE_SIZE = 2
+# Nghỉ giữa hai tuyến như main.py (tránh bị chặn)
+PAUSE_S = 8
+_DONE = object()
+
+
+# ====================================
+#           CLEAN STAGE
+# ====================================
+class StreamingCleaner:
+    """
+    Làm sạch từng frame tuyến ngay khi crawl xong, kết quả giống clean_vexere
+    trên toàn bộ frame gộp của ngày:
+    - dòng có rating thiếu cần median của cả ngày -> hoãn tới cuối (flush),
+      median tính từ bảng tần suất cộng dồn qua các tuyến (như chunked_cleaning);
+    - dòng trùng giữa các tuyến bị loại bằng RowDeduplicator.
+    keep_address=True giữ thêm địa chỉ gốc cho khóa chuyến của CDC
+    (như clean_vexere(keep_address=True)).
+    """
+
+    def __init__(self, keep_address: bool = False):
+        self.keep_address = keep_address
+        self.counts: dict[str, pd.Series] = {}
+        self.deferred: list[pd.DataFrame] = []
+        self.dedup = RowDeduplicator()
+        self.columns: list[str] | None = None
+
+    @staticmethod
+    def _as_raw_csv(df: pd.DataFrame) -> pd.DataFrame:
+        # Như main.py: đủ cột rating (tuyến thiếu cột -> NaN như khi concat) và
+        # kiểu dữ liệu suy ra qua to_csv / read_csv giống file raw
+        missing = [col for col in RENAME_RATING_COLS if col not in df.columns]
+        df = df.reindex(columns=[*df.columns, *missing])
+        return pd.read_csv(io.StringIO(df.to_csv(index=False)))
+
+    def _finalize(self, df: pd.DataFrame, medians: dict | None) -> pd.DataFrame:
+        df = finalize_vexere(df, rating_cols, medians)
+        if self.columns is None:
+            self.columns = list(df.columns)
+        # Cùng thứ tự cột để hash của RowDeduplicator khớp giữa các tuyến
+        df = df[self.columns]
+        return self.dedup.drop_seen(df, subset=dedup_cols(df))
+
+    def add(self, raw: pd.DataFrame) -> pd.DataFrame:
+        """Làm sạch một frame tuyến, trả về các dòng đã xong (có thể rỗng)."""
+        df = prepare_vexere(self._as_raw_csv(raw), self.keep_address)
+        self.counts = merge_value_counts(
+            self.counts, rating_value_counts(df, rating_cols)
+        )
+
+        incomplete = df[rating_cols].isna().any(axis=1)
+        if incomplete.any():
+            self.deferred.append(df[incomplete])
+        return self._finalize(df[~incomplete].copy(), None)
+
+    def flush(self) -> pd.DataFrame:
+        """Điền median toàn cục cho các dòng đã hoãn."""
+        if not self.deferred:
+            return pd.DataFrame()
+        medians = {
+            col: median_from_value_counts(self.counts[col]) for col in rating_cols
+        }
+        df = pd.concat(self.deferred, ignore_index=True)
+        self.deferred = []
+        return self._finalize(df, medians)
+
+
+# ====================================
+#           PIPELINE
+# ====================================
+class _Stage(threading.Thread):
+    """
+    Thread đọc inbox tới _DONE. Lỗi được ghi lại (run_pipeline raise sau
+    cùng) và stage vẫn đọc hết inbox để stage phía trước không bị chặn mãi.
+    """
+
+    def __init__(self, name: str, inbox: queue.Queue, handle, finish=None):
+        super().__init__(name=name, daemon=True)
+        self.inbox = inbox
+        self.handle = handle
+        self.finish = finish
+        self.error: BaseException | None = None
+        self.idle_s = 0.0
+
+    def run(self):
+        while True:
+            start = time.perf_counter()
+            item = self.inbox.get()
+            self.idle_s += time.perf_counter() - start
+            if item is _DONE:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.handle(item)
+            except BaseException as e:
+                log(f"[ERROR] pipeline stage {self.name}: {type(e).__name__}: {e}")
+                self.error = e
+        if self.finish is not None and self.error is None:
+            try:
+                self.finish()
+            except BaseException as e:
+                self.error = e
+
+
+def run_pipeline(
+    crawl_plan: list[tuple[str, str, int]],
+    crawl=None,
+    connect=None,
+    load_mode: str = "snapshot",
+    crawl_day: date | None = None,
+    base_path: str = "data",
+    queue_size: int = QUEUE_SIZE,
+    pause_s: float = PAUSE_S,
+) -> dict:
+    """
+    Crawl → clean → load chồng lấn nhau: trong lúc trình duyệt crawl tuyến
+    tiếp theo, frame của tuyến vừa xong đi qua hàng đợi có giới hạn sang
+    thread làm sạch rồi thread nạp DB. Hàng đợi đầy (load chậm hơn crawl)
+    thì crawl chờ ở put(). Thời gian tổng vì vậy xấp xỉ thời gian crawl cộng
+    phần clean + load của tuyến cuối. Riêng load_mode="cdc" nạp mỗi ngày đi
+    một lần sau khi clean xong (cần cả lần crawl để đóng các chuyến không
+    còn bán), crawl và clean vẫn chồng lấn.
+
+    Mỗi days_offset trong crawl_plan là một ngày đi, được làm sạch riêng và
+    ghi ra data/raw/<name>_raw.csv, data/processed/<name>_cleaned.csv với
+    <name> = crawl_file_name(crawl_day + days_offset, days_offset) như main.py,
+    kể cả khi một stage lỗi (file raw luôn được ghi để không mất dữ liệu đã
+    crawl; file processed chỉ ghi khi clean chạy hết). Số dòng đã nạp của
+    từng tuyến được log để lần chạy lại biết tuyến nào đã vào DB.
+
+    Parameters:
+        crawl_plan: list (from_city, to_city, days_offset).
+        crawl_day: ngày crawl (mặc định hôm nay), dùng cho cả tên file lẫn
+            crawl_date của các dòng nạp DB (chạy qua nửa đêm vẫn khớp file).
+        crawl: hàm crawl(start_city, dest_city, days) -> DataFrame,
+            mặc định crawl_vexere.
+        connect: hàm không tham số trả về DatabaseManager (vd.
+            DatabaseManager.from_config), chỉ được gọi khi frame đầu tiên tới
+            stage load. None thì bỏ qua bước nạp DB.
+
+    Returns:
+        dict: số tuyến / dòng và thời gian từng stage.
+    """
+    if crawl is None:
+        from src.extract.crawling import crawl_vexere as crawl
+    crawl_day = crawl_day or date.today()
+
+    clean_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    load_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    # Theo days_offset: mỗi offset là một ngày đi / một file như clean_vexere
+    cleaners: dict[int, StreamingCleaner] = {}
+    raw_frames: dict[int, list[pd.DataFrame]] = {}
+    cleaned_frames: dict[int, list[pd.DataFrame]] = {}
+    # load_mode="cdc": frame đã clean chờ nạp theo ngày đi
+    cdc_frames: dict[int, list[pd.DataFrame]] = {}
+    stats = {
+        "routes": 0,
+        "raw_rows": 0,
+        "clean_rows": 0,
+        "loaded_rows": 0,
+        # Thời gian bị chặn ở put() vì hàng đợi phía sau đầy
+        "crawl_blocked_s": 0.0,
+        "clean_blocked_s": 0.0,
+    }
+
+    db_stack = ExitStack()
+    db = None
+    loaded_routes: dict[str, int] = {}
+    if connect is not None:
+        from src.load.cdc import insert_trips_cdc
+        from src.load.loading import insert_trips_from_dataframe
+
+        insert = insert_trips_cdc if load_mode == "cdc" else insert_trips_from_dataframe
+
+    def put(q: queue.Queue, item, blocked_key: str):
+        start = time.perf_counter()
+        q.put(item)
+        stats[blocked_key] += time.perf_counter() - start
+
+    def clean(item: tuple[int, pd.DataFrame]):
+        days, raw = item
+        cleaner = cleaners.setdefault(
+            days, StreamingCleaner(keep_address=load_mode == "cdc")
+        )
+        with span("pipeline.clean", rows_in=len(raw)) as s:
+            df = cleaner.add(raw)
+            s.rows_out = len(df)
+        emit(days, df)
+
+    def clean_finish():
+        for days, cleaner in cleaners.items():
+            rows = sum(len(df) for df in cleaner.deferred)
+            with span("pipeline.clean_deferred", rows_in=rows) as s:
+                df = cleaner.flush()
+                s.rows_out = len(df)
+            emit(days, df)
+
+    def emit(days: int, df: pd.DataFrame):
+        # Giữ kết quả clean ở đây (không phải ở load) để file processed vẫn đủ
+        # khi stage load lỗi giữa chừng
+        if len(df):
+            cleaned_frames.setdefault(days, []).append(df)
+            stats["clean_rows"] += len(df)
+            put(load_q, (days, df), "clean_blocked_s")
+
+    def load(item: tuple[int, pd.DataFrame]):
+        days, df = item
+        if connect is None:
+            return
+        if load_mode == "cdc":
+            cdc_frames.setdefault(days, []).append(df)
+        else:
+            insert_frame(df)
+
+    def load_finish():
+        for frames in cdc_frames.values():
+            insert_frame(pd.concat(frames, ignore_index=True))
+
+    def insert_frame(df: pd.DataFrame):
+        nonlocal db
+        if db is None:
+            db = db_stack.enter_context(connect())
+        with span("pipeline.load", rows_in=len(df)) as s:
+            insert(db, df, crawl_date=str(crawl_day))
+            s.rows_out = len(df)
+        stats["loaded_rows"] += len(df)
+        for (start, dest), n in (
+            df.groupby(["start_point", "destination"], observed=True).size().items()
+        ):
+            route = f"{start} → {dest}"
+            loaded_routes[route] = loaded_routes.get(route, 0) + int(n)
+
+    clean_stage = _Stage("clean", clean_q, clean, clean_finish)
+    load_stage = _Stage("load", load_q, load, load_finish)
+    clean_stage.start()
+    load_stage.start()
+
+    began = time.perf_counter()
+    crawl_s = 0.0
+    try:
+        for i, (from_city, to_city, days) in enumerate(crawl_plan):
+            if clean_stage.error or load_stage.error:
+                break
+            if i and pause_s:
+                time.sleep(pause_s)
+            start = time.perf_counter()
+            df = crawl(from_city, to_city, days)
+            crawl_s += time.perf_counter() - start
+            stats["routes"] += 1
+            if df is None or df.empty:
+                continue
+            raw_frames.setdefault(days, []).append(df)
+            stats["raw_rows"] += len(df)
+            put(clean_q, (days, df), "crawl_blocked_s")
+    finally:
+        # Báo hết dữ liệu theo thứ tự: clean flush xong mới tới load
+        clean_q.put(_DONE)
+        clean_stage.join()
+        load_q.put(_DONE)
+        load_stage.join()
+        if load_stage.error is not None:
+            error = load_stage.error
+            db_stack.__exit__(type(error), error, error.__traceback__)
+        else:
+            db_stack.close()
+        for days, frames in raw_frames.items():
+            _write_outputs(
+                frames,
+                cleaned_frames.get(days, []) if clean_stage.error is None else None,
+                base_path,
+                crawl_file_name(crawl_day + timedelta(days=days), days),
+            )
+        if connect is not None:
+            _log_loaded_routes(loaded_routes)
+
+    for stage in (clean_stage, load_stage):
+        if stage.error is not None:
+            raise stage.error
+
+    stats["crawl_blocked_s"] = round(stats["crawl_blocked_s"], 3)
+    stats["clean_blocked_s"] = round(stats["clean_blocked_s"], 3)
+    stats["wall_s"] = round(time.perf_counter() - began, 3)
+    stats["crawl_s"] = round(crawl_s, 3)
+    stats["clean_idle_s"] = round(clean_stage.idle_s, 3)
+    stats["load_idle_s"] = round(load_stage.idle_s, 3)
+    RUN_REPORT.add_stats("pipeline", **stats)
+    log(
+        f"Pipeline: {stats['routes']} tuyến, {stats['raw_rows']} → "
+        f"{stats['clean_rows']} dòng | wall {stats['wall_s']:.1f}s, "
+        f"crawl {stats['crawl_s']:.1f}s"
+    )
+    return stats
+
+
+def _write_outputs(
+    raw_frames: list[pd.DataFrame],
+    cleaned_frames: list[pd.DataFrame] | None,
+    base_path: str,
+    file_name: str,
+):
+    """Ghi file raw và (nếu clean chạy hết, cleaned_frames khác None) processed."""
+    if not raw_frames:
+        return
+    _write_csv(
+        pd.concat(raw_frames, axis=0),
+        os.path.join(base_path, "raw", f"{file_name}_raw.csv"),
+    )
+    if cleaned_frames is None:
+        log(f"[WARN] clean lỗi, chỉ ghi file raw {file_name}_raw.csv")
+        return
+    cleaned = (
+        pd.concat(cleaned_frames, ignore_index=True)
+        if cleaned_frames
+        else pd.DataFrame()
+    )
+    # Địa chỉ gốc (CDC) không thuộc schema file processed
+    cleaned = cleaned.drop(columns=list(ADDRESS_COLS.values()), errors="ignore")
+    _write_csv(
+        cleaned, os.path.join(base_path, "processed", f"{file_name}_cleaned.csv")
+    )
+
+
+def _log_loaded_routes(loaded_routes: dict[str, int]):
+    for route, n in loaded_routes.items():
+        RUN_REPORT.add_stats(f"pipeline.loaded {route}", rows=n)
+    log(
+        f"Đã nạp DB {len(loaded_routes)} tuyến: "
+        + (", ".join(f"{r} ({n})" for r, n in loaded_routes.items()) or "-")
+    )
+
+
+def _write_csv(df: pd.DataFrame, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Crawl → clean → load chồng lấn theo từng tuyến"
+    )
+    parser.add_argument("--routes", default="routes.json")
+    parser.add_argument("--days", type=int, default=DAYSOFF)
+    parser.add_argument("--load", action="store_true", help="Nạp kết quả vào DB")
+    parser.add_argument("--cdc", action="store_true", help="Nạp kiểu CDC")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--pause", type=float, default=PAUSE_S)
+    args = parser.parse_args()
+
+    connect = None
+    if args.load:
+        from src.database.db_manager import DatabaseManager
+
+        connect = DatabaseManager.from_config
+
+    plan = [(start, dest, args.days) for start, dest in load_routes(args.routes)]
+    run_pipeline(
+        plan,
+        connect=connect,
+        load_mode="cdc" if args.cdc else "snapshot",
+        queue_size=args.queue_size,
+        pause_s=args.pause,
+    )
+    write_run_report(
+        crawl_file_name(date.today() + timedelta(days=args.days), args.days)
+    )
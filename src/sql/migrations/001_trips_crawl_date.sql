@@ -0,0 +1,5 @@
+-- trips.crawl_date: ngày crawl của mỗi dòng để nạp lại (backfill) theo
+-- (crawl_date, departure_date) không tạo dòng trùng.
+-- Chạy lại nhiều lần không lỗi; các dòng đã có nhận ngày chạy migration.
+ALTER TABLE trips ADD COLUMN IF NOT EXISTS crawl_date DATE NOT NULL DEFAULT CURRENT_DATE;
+CREATE INDEX IF NOT EXISTS trips_crawl_departure ON trips (crawl_date, departure_date);
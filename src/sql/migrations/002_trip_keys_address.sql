@@ -0,0 +1,33 @@
+-- trip_keys: địa chỉ đón/trả gốc là một phần khóa chuyến của CDC
+-- (pickup_point / dropoff_point chỉ còn 3 loại nên không đủ phân biệt).
+-- Chạy lại nhiều lần không lỗi. Khóa cũ nhận địa chỉ '' nên không khớp với
+-- lần nạp CDC tiếp theo: các phiên bản đó được đóng khi chuyến không còn
+-- trong lần crawl (xem close_missing_trip_versions).
+ALTER TABLE trip_keys ADD COLUMN IF NOT EXISTS pickup_address VARCHAR(255) NOT NULL DEFAULT '';
+ALTER TABLE trip_keys ADD COLUMN IF NOT EXISTS dropoff_address VARCHAR(255) NOT NULL DEFAULT '';
+
+DO $$
+DECLARE
+    c record;
+BEGIN
+    -- Bỏ ràng buộc UNIQUE cũ (không có địa chỉ): nó chặn khóa mới cùng chuyến
+    -- nhưng khác địa chỉ
+    FOR c IN
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'trip_keys'::regclass AND contype = 'u'
+          AND conname <> 'trip_keys_identity'
+    LOOP
+        EXECUTE format('ALTER TABLE trip_keys DROP CONSTRAINT %I', c.conname);
+    END LOOP;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'trip_keys'::regclass AND conname = 'trip_keys_identity'
+    ) THEN
+        ALTER TABLE trip_keys ADD CONSTRAINT trip_keys_identity UNIQUE (
+            company_id, route_id, departure_date, departure_time,
+            pickup_point, dropoff_point, pickup_address, dropoff_address,
+            number_of_seat
+        );
+    END IF;
+END $$;
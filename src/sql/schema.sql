@@ -32,8 +32,11 @@ CREATE TABLE trips (
     pickup_point VARCHAR(100),
     dropoff_point VARCHAR(100),
     price_original NUMERIC(10,0) NOT NULL CHECK (price_original >= 0),
-    price_discounted NUMERIC(10,0) CHECK (price_discounted >= 0)
+    price_discounted NUMERIC(10,0) CHECK (price_discounted >= 0),
+    crawl_date DATE NOT NULL DEFAULT CURRENT_DATE
 );
+-- Nạp lại một lần crawl (backfill) = xóa theo (crawl_date, departure_date) rồi insert
+CREATE INDEX trips_crawl_departure ON trips (crawl_date, departure_date);
 
 -- COMPANY ROUTE RATINGS
 CREATE TABLE company_route_ratings (
@@ -52,3 +55,66 @@ CREATE TABLE company_route_ratings (
     rating_punctuality NUMERIC(3,2),
     UNIQUE (company_id, route_id, crawl_date)
 );
+
+-- ==================================================
+-- CHANGE-DATA CAPTURE (nạp bằng src/load/cdc.py)
+-- Chỉ lưu giá trị khi thay đổi, kèm khoảng hiệu lực [valid_from, valid_to)
+-- valid_to = NULL: phiên bản hiện tại
+-- ==================================================
+
+-- TRIP KEYS: định danh ổn định của một chuyến giữa các lần crawl
+CREATE TABLE trip_keys (
+    trip_key_id SERIAL PRIMARY KEY,
+    company_id INT NOT NULL REFERENCES bus_companies(company_id) ON DELETE CASCADE,
+    route_id INT NOT NULL REFERENCES routes(route_id) ON DELETE CASCADE,
+    departure_date DATE NOT NULL,
+    departure_time TIME WITHOUT TIME ZONE NOT NULL,
+    pickup_point VARCHAR(100) NOT NULL DEFAULT '',
+    dropoff_point VARCHAR(100) NOT NULL DEFAULT '',
+    pickup_address VARCHAR(255) NOT NULL DEFAULT '',
+    dropoff_address VARCHAR(255) NOT NULL DEFAULT '',
+    number_of_seat INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT trip_keys_identity UNIQUE (
+        company_id, route_id, departure_date, departure_time,
+        pickup_point, dropoff_point, pickup_address, dropoff_address,
+        number_of_seat
+    )
+);
+
+-- TRIP VERSIONS: giá / giờ đến của chuyến theo thời gian
+CREATE TABLE trip_versions (
+    version_id SERIAL PRIMARY KEY,
+    trip_key_id INT NOT NULL REFERENCES trip_keys(trip_key_id) ON DELETE CASCADE,
+    valid_from DATE NOT NULL,
+    valid_to DATE,
+    arrival_time TIME WITHOUT TIME ZONE,
+    duration_minutes INTEGER CHECK (duration_minutes > 0),
+    price_original NUMERIC(10,0) NOT NULL CHECK (price_original >= 0),
+    price_discounted NUMERIC(10,0) CHECK (price_discounted >= 0),
+    CHECK (valid_to IS NULL OR valid_to > valid_from)
+);
+CREATE UNIQUE INDEX trip_versions_current
+    ON trip_versions (trip_key_id) WHERE valid_to IS NULL;
+CREATE INDEX trip_versions_validity
+    ON trip_versions (valid_from, valid_to);
+
+-- COMPANY ROUTE RATING VERSIONS: rating theo tuyến theo thời gian
+CREATE TABLE company_route_rating_versions (
+    version_id SERIAL PRIMARY KEY,
+    company_id INT NOT NULL REFERENCES bus_companies(company_id) ON DELETE CASCADE,
+    route_id INT NOT NULL REFERENCES routes(route_id) ON DELETE CASCADE,
+    valid_from DATE NOT NULL,
+    valid_to DATE,
+    reviewer_count INT NOT NULL DEFAULT 0 CHECK (reviewer_count >= 0),
+    rating_overall NUMERIC(3,2),
+    rating_safety NUMERIC(3,2),
+    rating_info_accuracy NUMERIC(3,2),
+    rating_info_completeness NUMERIC(3,2),
+    rating_staff_attitude NUMERIC(3,2),
+    rating_comfort NUMERIC(3,2),
+    rating_service_quality NUMERIC(3,2),
+    rating_punctuality NUMERIC(3,2),
+    CHECK (valid_to IS NULL OR valid_to > valid_from)
+);
+CREATE UNIQUE INDEX company_route_rating_versions_current
+    ON company_route_rating_versions (company_id, route_id) WHERE valid_to IS NULL;
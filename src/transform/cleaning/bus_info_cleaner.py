@@ -1,6 +1,9 @@
 import pandas as pd
 
+from src.utils.metrics_utils import timed
 
+
+@timed("clean.extract_number_of_seats")
 def extract_number_of_seats(df: pd.DataFrame, col: str) -> pd.DataFrame:
     """
     Trích xuất số lượng ghế từ cột 'seat_type' và tạo cột mới 'number_of_seat'.
@@ -26,6 +29,7 @@ def extract_number_of_seats(df: pd.DataFrame, col: str) -> pd.DataFrame:
     return df
 
 
+@timed("clean.clean_bus_company_name")
 def clean_bus_company_name(df: pd.DataFrame, col: str) -> pd.DataFrame:
     """
     Chuẩn hóa tên nhà xe bằng cách loại bỏ phần trong ngoặc.
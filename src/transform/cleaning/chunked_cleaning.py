@@ -0,0 +1,184 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.utils.log_utils import log
+from src.utils.metrics_utils import timed
+from src.transform.cleaning.bus_info_cleaner import extract_number_of_seats
+from src.transform.cleaning.cleaning import (
+    filter_logic,
+    finalize_vexere,
+    prepare_vexere,
+    rating_cols,
+)
+from src.transform.cleaning.rating_cleaner import (
+    RENAME_RATING_COLS,
+    extract_overall_and_num_reviews,
+    median_from_value_counts,
+    merge_value_counts,
+    rating_value_counts,
+    rename_rating_title,
+)
+from src.transform.cleaning.schedule_price_cleaner import (
+    convert_duration_to_minutes,
+    normalize_fare_values,
+)
+
+DEFAULT_CHUNKSIZE = 50_000
+
+# Các cột thô đủ để tái hiện filter_logic + cột rating (pass 1)
+MEDIAN_PASS_COLS = [
+    "bus_rating",
+    "seat_type",
+    "price_original",
+    "price_discounted",
+    "duration",
+    *RENAME_RATING_COLS.keys(),
+]
+
+
+# ====================================
+#       PASS 1: MEDIAN TOÀN CỤC
+# ====================================
+@timed("clean.compute_rating_medians")
+def compute_rating_medians(
+    raw_path: str, rating_cols=rating_cols, chunksize: int = DEFAULT_CHUNKSIZE
+) -> dict[str, float]:
+    """
+    Tính median toàn cục của các cột rating bằng một lượt đọc nhẹ.
+
+    Chỉ đọc các cột cần cho filter_logic và rating, lọc theo đúng quy tắc
+    của clean_vexere rồi cộng dồn bảng tần suất rating qua từng chunk.
+    Median thu được trùng khớp với median tính trên toàn bộ file.
+    """
+    header = pd.read_csv(raw_path, nrows=0).columns
+    usecols = [col for col in MEDIAN_PASS_COLS if col in header]
+
+    counts: dict[str, pd.Series] = {}
+    for chunk in pd.read_csv(raw_path, usecols=usecols, chunksize=chunksize):
+        chunk = extract_overall_and_num_reviews(chunk, "bus_rating")
+        chunk = extract_number_of_seats(chunk, "seat_type")
+        chunk = normalize_fare_values(chunk, ["price_original", "price_discounted"])
+        chunk = convert_duration_to_minutes(chunk, "duration")
+        chunk = rename_rating_title(chunk)
+        chunk = filter_logic(chunk)
+
+        present = [col for col in rating_cols if col in chunk.columns]
+        counts = merge_value_counts(counts, rating_value_counts(chunk, present))
+
+    return {
+        col: median_from_value_counts(counts[col]) if col in counts else np.nan
+        for col in rating_cols
+    }
+
+
+# ====================================
+#       LOẠI TRÙNG GIỮA CÁC CHUNK
+# ====================================
+class RowDeduplicator:
+    """
+    Ghi nhớ hash (uint64) của các dòng đã ghi để loại trùng giữa các chunk.
+
+    Hash được giữ trong các mảng numpy đã sắp xếp, gộp theo kích thước
+    (giống LSM) nên tốn khoảng 8 byte cho mỗi dòng duy nhất.
+    """
+
+    def __init__(self):
+        self._blocks: list[np.ndarray] = []
+
+    def _seen(self, hashes: np.ndarray) -> np.ndarray:
+        seen = np.zeros(len(hashes), dtype=bool)
+        for block in self._blocks:
+            pos = np.searchsorted(block, hashes)
+            pos[pos == len(block)] = 0
+            seen |= block[pos] == hashes
+        return seen
+
+    def _add(self, hashes: np.ndarray):
+        self._blocks.append(np.sort(hashes))
+        while len(self._blocks) > 1 and len(self._blocks[-2]) <= 2 * len(
+            self._blocks[-1]
+        ):
+            last = self._blocks.pop()
+            self._blocks[-1] = np.union1d(self._blocks[-1], last)
+
+    def drop_seen(
+        self, df: pd.DataFrame, subset: list[str] | None = None
+    ) -> pd.DataFrame:
+        """
+        Bỏ các dòng đã xuất hiện ở chunk trước (hoặc trùng trong chunk),
+        so sánh trên các cột subset (mặc định mọi cột).
+        """
+        if df.empty:
+            return df
+
+        values = df if subset is None else df[subset]
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        keep = ~self._seen(hashes) & ~pd.Series(hashes).duplicated().to_numpy()
+        self._add(hashes[keep])
+        return df[keep]
+
+
+# ====================================
+#       PASS 2: LÀM SẠCH THEO CHUNK
+# ====================================
+@timed("clean.clean_vexere_chunked")
+def clean_vexere_chunked(
+    raw_path: str,
+    out_path: str,
+    rating_cols=rating_cols,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    rating_medians: dict[str, float] | None = None,
+) -> int:
+    """
+    Làm sạch file raw theo từng chunk, bộ nhớ không phụ thuộc kích thước file.
+
+    Kết quả giống clean_vexere trên toàn bộ file: median rating được tính
+    toàn cục ở pass 1 và các dòng trùng giữa các chunk được loại bỏ.
+
+    Parameters:
+        raw_path (str): Đường dẫn file *_raw.csv.
+        out_path (str): Đường dẫn file *_cleaned.csv cần ghi.
+        chunksize (int): Số dòng raw mỗi chunk.
+        rating_medians (dict | None): Median tính sẵn (bỏ qua pass 1).
+
+    Returns:
+        int: Số dòng đã ghi.
+    """
+    print(f"Start chunked cleaning {raw_path} (chunksize={chunksize})...")
+
+    if rating_medians is None:
+        rating_medians = compute_rating_medians(raw_path, rating_cols, chunksize)
+
+    if os.path.dirname(out_path):
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+
+    dedup = RowDeduplicator()
+    written = 0
+    for chunk in pd.read_csv(raw_path, chunksize=chunksize):
+        chunk = prepare_vexere(chunk)
+        chunk = finalize_vexere(chunk, rating_cols, rating_medians)
+        chunk = dedup.drop_seen(chunk)
+
+        chunk.to_csv(
+            out_path,
+            mode="w" if written == 0 else "a",
+            header=written == 0,
+            index=False,
+        )
+        written += len(chunk)
+
+    log(f"Chunked clean complete: {written} rows -> {out_path}")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Làm sạch file raw theo chunk")
+    parser.add_argument("raw_path")
+    parser.add_argument("out_path")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+
+    clean_vexere_chunked(args.raw_path, args.out_path, chunksize=args.chunksize)
@@ -1,11 +1,21 @@
+from pathlib import Path
+
 import pandas as pd
 
+from src.utils.file_utils import read_processed_csv, stage_file_path
 from src.utils.log_utils import log
+from src.utils.metrics_utils import span, timed
 from src.transform.cleaning.bus_info_cleaner import (
     clean_bus_company_name,
     extract_number_of_seats,
 )
-from src.transform.cleaning.location_cleaner import normalize_location_type
+from src.transform.cleaning.company_name_index import canonicalize_company_names
+from src.transform.cleaning.dtype_cleaner import apply_dtype_policy
+from src.transform.cleaning.location_cleaner import (
+    ADDRESS_COLS,
+    extract_location_address,
+    normalize_location_type,
+)
 from src.transform.cleaning.rating_cleaner import (
     extract_overall_and_num_reviews,
     rename_rating_title,
@@ -29,6 +39,7 @@ rating_cols = [
 ]
 
 
+@timed("clean.filter_logic")
 def filter_logic(df: pd.DataFrame) -> pd.DataFrame:
     """Lọc dữ liệu theo quy tắc hợp lý."""
     before = len(df)
@@ -42,6 +53,7 @@ def filter_logic(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@timed("clean.remove_useless_cols")
 def remove_useless_cols(df: pd.DataFrame) -> pd.DataFrame:
     drop_cols = [
         "bus_rating",
@@ -53,10 +65,13 @@ def remove_useless_cols(df: pd.DataFrame) -> pd.DataFrame:
     return df.drop(columns=drop_cols, errors="ignore")
 
 
-def clean_vexere(df: pd.DataFrame, rating_cols=rating_cols) -> pd.DataFrame:
-    """Làm sạch dữ liệu Vexere."""
+def prepare_vexere(df: pd.DataFrame, keep_address: bool = False) -> pd.DataFrame:
+    """
+    Tách, chuẩn hóa và lọc dữ liệu Vexere (các bước trước khi điền median).
 
-    print("Start cleaning data...")
+    keep_address=True giữ thêm địa chỉ đón/trả gốc (ADDRESS_COLS) làm khóa
+    chuyến cho CDC; file processed không có các cột này.
+    """
 
     # 1. Tách và chuẩn hóa dữ liệu
     df = extract_overall_and_num_reviews(df, "bus_rating")
@@ -70,20 +85,84 @@ def clean_vexere(df: pd.DataFrame, rating_cols=rating_cols) -> pd.DataFrame:
 
     # 3. Làm sạch văn bản
     df = clean_bus_company_name(df, "company_name")
+    df = canonicalize_company_names(df, "company_name")
+    if keep_address:
+        for col, address_col in ADDRESS_COLS.items():
+            df = extract_location_address(df, col, address_col)
     df = normalize_location_type(df, "pickup_point")
     df = normalize_location_type(df, "dropoff_point")
     df = rename_rating_title(df)
 
-    # 4. Lọc và xử lý logic
+    # 4. Lọc theo logic
     df = filter_logic(df)
-    df = fill_na_rating_cols(df, rating_cols)
+    return df
+
+
+def finalize_vexere(
+    df: pd.DataFrame,
+    rating_cols=rating_cols,
+    rating_medians: dict[str, float] | None = None,
+) -> pd.DataFrame:
+    """Điền median rating, bỏ cột thừa, loại thiếu/trùng và ép kiểu."""
+
+    # 4. Xử lý giá trị thiếu của rating
+    df = fill_na_rating_cols(df, rating_cols, rating_medians)
 
     # 6. Loại bỏ cột thừa
     df = remove_useless_cols(df)
 
-    # 5. Loại bỏ thiếu và trùng
-    df.dropna(axis=0, how="any", inplace=True)
-    df.drop_duplicates(keep="first", inplace=True)
+    # 5. Loại bỏ thiếu và trùng (không xét địa chỉ gốc -> cùng số dòng với
+    # file processed khi keep_address=True)
+    with span("clean.drop_na_and_duplicates", rows_in=len(df)) as s:
+        df.dropna(axis=0, how="any", inplace=True)
+        df.drop_duplicates(subset=dedup_cols(df), keep="first", inplace=True)
+        s.rows_out = len(df)
+
+    # 7. Ép kiểu gọn nhẹ (category, int32/int16, float32)
+    df = apply_dtype_policy(df)
+    return df
+
+
+def dedup_cols(df: pd.DataFrame) -> list[str]:
+    """Các cột dùng để loại dòng trùng: mọi cột trừ địa chỉ gốc."""
+    return [col for col in df.columns if col not in ADDRESS_COLS.values()]
+
+
+@timed("clean.clean_vexere")
+def clean_vexere(
+    df: pd.DataFrame, rating_cols=rating_cols, keep_address: bool = False
+) -> pd.DataFrame:
+    """
+    Làm sạch dữ liệu Vexere.
+
+    keep_address=True (chỉ dùng cho khóa chuyến của CDC / price curves): thêm
+    pickup_address, dropoff_address, các dòng giữ lại giống hệt bản mặc định.
+    """
+
+    print("Start cleaning data...")
+
+    df = prepare_vexere(df, keep_address)
+    df = finalize_vexere(df, rating_cols)
 
     log("Clean data set complete")
     return df
+
+
+def read_trips_with_address(processed_path: str | Path) -> pd.DataFrame:
+    """
+    Các chuyến của một file processed kèm địa chỉ đón/trả gốc, để làm khóa
+    chuyến (CDC, price curves): làm sạch lại file raw cùng tên với
+    keep_address=True -> cùng các dòng như file processed.
+
+    Không còn file raw thì đọc file processed, địa chỉ gốc = "".
+    """
+    raw_path = stage_file_path(processed_path, "raw")
+    if not raw_path.exists():
+        log(f"[WARN] Không có {raw_path}, khóa chuyến không có địa chỉ gốc")
+        df = read_processed_csv(processed_path)
+        return df.assign(**{col: "" for col in ADDRESS_COLS.values()})
+
+    df = pd.read_csv(raw_path)
+    if df.empty:
+        return read_processed_csv(processed_path)
+    return clean_vexere(df, keep_address=True)
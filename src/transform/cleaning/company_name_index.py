@@ -0,0 +1,398 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+
+import pandas as pd
+
+from src.utils.log_utils import log
+from src.utils.metrics_utils import RUN_REPORT, timed
+
+INDEX_PATH = "data/reference/company_names.json"
+INDEX_VERSION = 1
+NGRAM = 3
+# Số ứng viên (nhiều n-gram chung nhất) được so khớp chi tiết cho mỗi tên
+MAX_CANDIDATES = 10
+# N-gram xuất hiện trong quá nhiều tên ("lim", "ous"...) gần như không phân biệt
+# được gì mà làm chậm việc đếm, nên bị bỏ qua khi chặn
+MAX_POSTING = 500
+# Ứng viên có hệ số Dice theo n-gram thấp hơn ngưỡng này không cần SequenceMatcher
+MIN_NGRAM_DICE = 0.5
+# Ngưỡng giống nhau (SequenceMatcher trên chuỗi bỏ dấu) để xét gộp / ghi vào review
+MIN_RATIO = 0.85
+# "Phú" / "Phúc", "Thanh" / "Khanh" là nhà xe khác nhau: chỉ chấp nhận lỗi chính tả
+# trong token dài hơn mọi âm tiết tiếng Việt (tối đa 7 chữ, "nghiêng"),
+# tức từ mượn như Limousine / Limosine
+MIN_FUZZY_TOKEN_LEN = 8
+MIN_TOKEN_RATIO = 0.8
+
+_TOKEN_RE = re.compile(r"\w+")
+# Index chỉ đọc cho cleaning, load một lần mỗi process: path -> (mtime, size), index
+_LOADED: dict[str, tuple[tuple | None, "CompanyNameIndex"]] = {}
+
+
+# ====================================
+#           CHUẨN HÓA
+# ====================================
+def display_name(name: str) -> str:
+    """NFC + gộp khoảng trắng, giữ nguyên hoa/thường (dùng làm tên chuẩn)."""
+    return " ".join(unicodedata.normalize("NFC", name).split())
+
+
+def _split_marks(token: str) -> tuple[str, str]:
+    """ "thuỷ" -> ("thuy", dấu hỏi); đ được coi là d + dấu."""
+    letters, marks = [], []
+    for ch in unicodedata.normalize("NFD", token):
+        if unicodedata.combining(ch):
+            marks.append(ch)
+        elif ch == "đ":
+            letters.append("d")
+            marks.append("đ")
+        else:
+            letters.append(ch)
+    return "".join(letters), "".join(sorted(marks))
+
+
+def name_keys(name: str) -> tuple[str, str, list[tuple[str, str]]]:
+    """
+    Các khóa so khớp của một tên.
+
+    Returns:
+        (tone_key, stripped, tokens):
+        - tone_key: mỗi token = chữ bỏ dấu + tập dấu của token, nối liền không
+          khoảng trắng -> bỏ qua hoa/thường, khoảng trắng, dấu câu, dạng Unicode
+          và vị trí đặt dấu ("Hoàng Thuỷ" = "hoàng  thủy" = "HoàngThủy").
+        - stripped: chuỗi bỏ dấu liền nhau, dùng để chặn (blocking) và so khớp gần đúng.
+        - tokens: (chữ bỏ dấu, dấu) từng token.
+    """
+    text = unicodedata.normalize("NFC", name).casefold()
+    tokens = [_split_marks(tok) for tok in _TOKEN_RE.findall(text)]
+    tone_key = "".join(letters + marks for letters, marks in tokens)
+    stripped = "".join(letters for letters, _ in tokens)
+    return tone_key, stripped, tokens
+
+
+def ngrams(stripped: str, n: int = NGRAM) -> set[str]:
+    padded = f"^{stripped}$"
+    return {padded[i : i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+
+def _tokens_compatible(a: list[tuple[str, str]], b: list[tuple[str, str]]) -> bool:
+    """
+    Hai tên chỉ được gộp tự động khi khác nhau ở lỗi chính tả trong token dài.
+
+    Token ngắn (âm tiết tiếng Việt) phải giống hệt sau khi bỏ dấu; dấu chỉ
+    được khác khi một bên hoàn toàn không có dấu (gõ không dấu).
+    """
+    if len(a) != len(b):
+        # Chỉ khác cách tách từ ("MexBus" / "Mex Bus", "HoàngThủy" / "Hoàng Thuỷ")
+        return "".join(la for la, _ in a) == "".join(lb for lb, _ in b) and sorted(
+            "".join(ma for _, ma in a)
+        ) == sorted("".join(mb for _, mb in b))
+    a_has_marks = any(marks for _, marks in a)
+    b_has_marks = any(marks for _, marks in b)
+    for (la, ma), (lb, mb) in zip(a, b):
+        if la == lb:
+            if ma != mb and a_has_marks and b_has_marks:
+                return False
+            continue
+        if min(len(la), len(lb)) < MIN_FUZZY_TOKEN_LEN:
+            return False
+        if SequenceMatcher(None, la, lb).ratio() < MIN_TOKEN_RATIO:
+            return False
+    return True
+
+
+# ====================================
+#           INDEX
+# ====================================
+class CompanyNameIndex:
+    """
+    Index tên nhà xe chuẩn, lưu JSON trong data/reference.
+
+    Tra cứu theo 3 bước, không so từng cặp tên:
+    1. tone_key trùng -> cùng nhà xe (khác hoa/thường, khoảng trắng, vị trí dấu).
+    2. Chặn theo n-gram của chuỗi bỏ dấu: chỉ MAX_CANDIDATES tên chuẩn có nhiều
+       n-gram chung nhất được so bằng SequenceMatcher.
+    3. Ứng viên tốt nhất đạt MIN_RATIO và qua _tokens_compatible -> gộp; chỉ
+       đạt MIN_RATIO -> tạo tên chuẩn mới và ghi vào review để kiểm tra tay.
+    """
+
+    def __init__(self):
+        self.canonical: list[str] = []
+        self.aliases: dict[str, int] = {}
+        self.review: list[dict] = []
+        # sha256 (16 ký tự đầu) của file đã load, None nếu chưa có file
+        self.digest: str | None = None
+        self._rebuild_lookup()
+
+    # ---------- LOOKUP STRUCTURES ----------
+    def _rebuild_lookup(self):
+        self._tokens: list[list[tuple[str, str]]] = []
+        self._stripped: list[str] = []
+        self._n_grams: list[int] = []
+        self._postings: dict[str, list[int]] = {}
+        for cid, name in enumerate(self.canonical):
+            self._register(cid, name)
+
+    def _register(self, cid: int, name: str):
+        _, stripped, tokens = name_keys(name)
+        self._tokens.append(tokens)
+        self._stripped.append(stripped)
+        grams = ngrams(stripped)
+        self._n_grams.append(len(grams))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(cid)
+
+    def _candidates(self, stripped: str) -> list[int]:
+        grams = ngrams(stripped)
+        postings = [self._postings[g] for g in grams if g in self._postings]
+        selective = [p for p in postings if len(p) <= MAX_POSTING]
+        counts = Counter()
+        for posting in selective or postings:
+            counts.update(posting)
+        return [
+            cid
+            for cid, shared in counts.most_common(MAX_CANDIDATES)
+            if 2 * shared / (len(grams) + self._n_grams[cid]) >= MIN_NGRAM_DICE
+        ]
+
+    def _best_match(self, stripped: str) -> tuple[int | None, float]:
+        best, best_ratio = None, 0.0
+        # seq2 được tiền xử lý (chain_b) một lần cho mọi ứng viên
+        matcher = SequenceMatcher(None, b=stripped)
+        for cid in self._candidates(stripped):
+            matcher.set_seq1(self._stripped[cid])
+            if matcher.quick_ratio() <= best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio > best_ratio:
+                best, best_ratio = cid, ratio
+        return best, best_ratio
+
+    # ---------- RESOLVE ----------
+    def __len__(self) -> int:
+        return len(self.canonical)
+
+    def resolve(self, name: str, learn: bool = True) -> str:
+        """Tên chuẩn của name; learn=False trả về tên đã chuẩn hóa nếu chưa có trong index."""
+        tone_key, stripped, tokens = name_keys(name)
+        if tone_key in self.aliases:
+            return self.canonical[self.aliases[tone_key]]
+        if not tone_key:
+            return display_name(name)
+
+        cid, ratio = self._best_match(stripped)
+        if cid is not None and ratio >= MIN_RATIO:
+            if _tokens_compatible(tokens, self._tokens[cid]):
+                if learn:
+                    self.aliases[tone_key] = cid
+                    # Tên chuẩn gõ không dấu được thay bằng bản có dấu gặp đầu tiên
+                    if (
+                        not any(m for _, m in self._tokens[cid])
+                        and tone_key != stripped
+                    ):
+                        self.canonical[cid] = display_name(name)
+                        self._tokens[cid] = tokens
+                return self.canonical[cid]
+            if learn:
+                self.review.append(
+                    {
+                        "name": display_name(name),
+                        "candidate": self.canonical[cid],
+                        "ratio": round(ratio, 3),
+                    }
+                )
+
+        if not learn:
+            return display_name(name)
+        cid = len(self.canonical)
+        self.canonical.append(display_name(name))
+        self.aliases[tone_key] = cid
+        self._register(cid, self.canonical[cid])
+        return self.canonical[cid]
+
+    def resolve_series(self, names: pd.Series, learn: bool = False) -> pd.Series:
+        """Resolve hàng loạt (mặc định chỉ đọc): mỗi tên khác nhau chỉ tra một lần."""
+        uniques = names.dropna().unique()
+        mapping = {name: self.resolve(str(name), learn) for name in uniques}
+        return names.map(mapping)
+
+    def learn(self, names: pd.Series) -> int:
+        """
+        Thêm các tên mới vào index, không phụ thuộc thứ tự dòng / file: tên
+        được resolve theo số lần xuất hiện giảm dần rồi theo thứ tự chữ cái,
+        nên tên chuẩn của một nhóm mới là cách viết phổ biến nhất (hòa thì
+        nhỏ nhất theo thứ tự chữ cái). Tên chuẩn đã có trong index giữ nguyên.
+
+        Returns:
+            int: số tên chuẩn mới.
+        """
+        n_before = len(self)
+        counts = names.dropna().astype(str).map(display_name).value_counts()
+        for name in sorted(counts.index, key=lambda n: (-counts[n], n)):
+            self.resolve(name, learn=True)
+        return len(self) - n_before
+
+    # ---------- PERSIST ----------
+    def to_dict(self) -> dict:
+        return {
+            "version": INDEX_VERSION,
+            "canonical": self.canonical,
+            "aliases": self.aliases,
+            "review": self.review,
+        }
+
+    @classmethod
+    def load(cls, path: str = INDEX_PATH) -> "CompanyNameIndex":
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with open(path, "rb") as f:
+            raw = f.read()
+        # Phiên bản của file index (ghi vào run report của bước làm sạch)
+        index.digest = hashlib.sha256(raw).hexdigest()[:16]
+        data = json.loads(raw.decode("utf-8"))
+        if data.get("version") != INDEX_VERSION:
+            log(f"WARNING {path} có version {data.get('version')}, build lại index")
+            return index
+        index.canonical = data["canonical"]
+        index.aliases = data["aliases"]
+        index.review = data.get("review", [])
+        index._rebuild_lookup()
+        return index
+
+    def save(self, path: str = INDEX_PATH):
+        """Ghi index qua file tạm + os.replace (người đọc không thấy file ghi dở)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+
+# ====================================
+#           CLEANING STEP
+# ====================================
+def load_cached(path: str = INDEX_PATH) -> CompanyNameIndex:
+    """
+    Index chỉ đọc dùng chung trong process: chỉ load lại khi file đổi
+    (build_company_name_index ghi index mới), không đọc JSON mỗi lần làm sạch.
+    """
+    try:
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        signature = None
+    cached = _LOADED.get(path)
+    if cached is None or cached[0] != signature:
+        cached = _LOADED[path] = (signature, CompanyNameIndex.load(path))
+    return cached[1]
+
+
+@timed("clean.canonicalize_company_names")
+def canonicalize_company_names(
+    df: pd.DataFrame, col: str, index_path: str = INDEX_PATH
+) -> pd.DataFrame:
+    """
+    Thay tên nhà xe bằng tên chuẩn trong index (chạy sau clean_bus_company_name).
+
+    Chỉ đọc index: tên chưa có giữ nguyên (đã chuẩn hóa khoảng trắng / NFC) và
+    được học ở bước build_company_name_index, nên làm sạch song song (backfill,
+    chunk, pipeline) không ghi đè file index của nhau.
+
+    Ví dụ:
+        "Hoàng Thủy", "hoàng  thuỷ" -> "Hoàng Thuỷ" (tên chuẩn trong index)
+    """
+    index = load_cached(index_path)
+    RUN_REPORT.set_reference("company_names", index.digest or "missing")
+    n_names = df[col].nunique()
+    df[col] = index.resolve_series(df[col])
+
+    canonical = set(index.canonical)
+    RUN_REPORT.add_stats(
+        "clean.company_names",
+        names=n_names,
+        canonical=df[col].nunique(),
+        unknown=sum(name not in canonical for name in df[col].dropna().unique()),
+    )
+    return df
+
+
+@timed("build_company_name_index")
+def build_company_name_index(files: list[str], index_path: str = INDEX_PATH) -> int:
+    """
+    Học tên nhà xe mới từ cột company_name của các CSV (thường là file processed
+    vừa ghi) rồi ghi index. Chỉ chạy ở một process (main.py / CLI --build).
+
+    Returns:
+        int: số tên chuẩn mới.
+    """
+    if not files:
+        return 0
+    index = CompanyNameIndex.load(index_path)
+    n_aliases = len(index.aliases)
+    names = pd.concat(
+        [pd.read_csv(f, usecols=["company_name"])["company_name"] for f in files]
+    )
+    new = index.learn(names)
+    if len(index.aliases) != n_aliases:
+        index.save(index_path)
+    RUN_REPORT.add_stats("company_name_index", names=names.nunique(), new=new)
+    log(f"Index tên nhà xe: +{new} tên chuẩn, tổng {len(index)} ({index_path})")
+    return new
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build / kiểm tra index tên nhà xe chuẩn"
+    )
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument(
+        "--build", metavar="FOLDER", help="Resolve mọi tên trong các CSV của FOLDER"
+    )
+    parser.add_argument("--review", action="store_true", help="In các cặp cần xem tay")
+    parser.add_argument(
+        "--bench", type=int, default=0, help="Đo thời gian resolve N tên tổng hợp"
+    )
+    args = parser.parse_args()
+
+    if args.build:
+        files = sorted(glob.glob(os.path.join(args.build, "*.csv")))
+        build_company_name_index(files, args.index)
+        names = pd.concat(
+            [pd.read_csv(f, usecols=["company_name"])["company_name"] for f in files]
+        )
+        resolved = CompanyNameIndex.load(args.index).resolve_series(names)
+        print(f"- {names.nunique()} tên -> {resolved.nunique()} nhà xe")
+
+    if args.review:
+        for item in CompanyNameIndex.load(args.index).review:
+            print(f"{item['ratio']:.3f}  {item['name']!r} ~ {item['candidate']!r}")
+
+    if args.bench:
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        syllables = ["hoàng", "thuỷ", "phương", "trang", "minh", "quốc", "tấn",
+                     "hưng", "limousine", "express", "gia", "lai", "phú", "an",
+                     "đức", "đạt", "kim", "thành", "việt", "nam", "hải", "long"]  # fmt: skip
+        names = [
+            " ".join(rng.choice(syllables, rng.integers(2, 5)))
+            + f" {rng.integers(1000)}"
+            for _ in range(args.bench)
+        ]
+        index = CompanyNameIndex()
+        start = time.perf_counter()
+        resolved = index.resolve_series(pd.Series(names), learn=True)
+        elapsed = time.perf_counter() - start
+        print(
+            f"Resolve {len(names)} tên ({len(set(names))} khác nhau) -> "
+            f"{len(index)} tên chuẩn trong {elapsed:.2f}s"
+        )
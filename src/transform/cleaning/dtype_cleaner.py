@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from src.utils.metrics_utils import timed
+
+# ====== DTYPE POLICY ======
+# Các cột văn bản chỉ có vài trăm giá trị khác nhau -> category
+CATEGORY_COLS = [
+    "company_name",
+    "start_point",
+    "destination",
+    "pickup_point",
+    "dropoff_point",
+    "departure_date",
+    "departure_time",
+    "arrival_time",
+]
+
+# Giá vé (VND) và số lượt đánh giá vượt quá int16 -> int32
+# Số ghế và thời lượng (phút) luôn < 32767 -> int16
+INTEGER_COLS = {
+    "price_original": "int32",
+    "price_discounted": "int32",
+    "reviewer_count": "int32",
+    "number_of_seat": "int16",
+    "duration_minutes": "int16",
+}
+
+# Rating thang 0–5, tối đa 2 chữ số thập phân (DB lưu NUMERIC(3,2)) -> float32.
+# float32 không biểu diễn đúng 4.7 (4.69999980926 khi đổi sang float64) nên mọi
+# chỗ đổi sang float64 (DB, Parquet, index) đi qua ratings_as_float64: làm tròn
+# về RATING_DECIMALS chữ số -> đúng giá trị như pd.read_csv đọc file processed
+RATING_COLS = [
+    "rating_overall",
+    "rating_safety",
+    "rating_info_accuracy",
+    "rating_info_completeness",
+    "rating_staff_attitude",
+    "rating_comfort",
+    "rating_service_quality",
+    "rating_punctuality",
+]
+RATING_DECIMALS = 2
+
+PROCESSED_DTYPES = (
+    {col: "category" for col in CATEGORY_COLS}
+    | INTEGER_COLS
+    | {col: "float32" for col in RATING_COLS}
+)
+
+
+@timed("clean.apply_dtype_policy")
+def apply_dtype_policy(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ép kiểu DataFrame đã làm sạch về các kiểu dữ liệu gọn nhẹ.
+
+    Ví dụ:
+        company_name (object)  -> category
+        price_original (Int64) -> int32
+        rating_safety (float64) -> float32
+
+    Cột số nguyên còn giá trị thiếu sẽ giữ kiểu nullable tương ứng
+    (Int32/Int16) thay vì báo lỗi.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame đã qua các bước làm sạch.
+
+    Returns:
+        pd.DataFrame: DataFrame với kiểu dữ liệu theo PROCESSED_DTYPES.
+    """
+    for col in CATEGORY_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
+    for col, dtype in INTEGER_COLS.items():
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors="coerce")
+        if values.isna().any():
+            dtype = dtype.capitalize()  # int32 -> Int32 (nullable)
+        df[col] = values.astype(dtype)
+
+    for col in RATING_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(np.float32)
+
+    return df
+
+
+def ratings_as_float64(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Trả về df với các cột rating float32 đổi sang float64 đã làm tròn
+    RATING_DECIMALS chữ số (4.69999980926 -> 4.7), các cột khác giữ nguyên.
+
+    Dùng ở ranh giới ra khỏi dtype policy (nạp DB, export Parquet, index) để
+    mọi nơi thấy cùng giá trị với file CSV.
+    """
+    cols = [
+        col for col in RATING_COLS if col in df.columns and df[col].dtype == np.float32
+    ]
+    if not cols:
+        return df
+    return df.assign(
+        **{col: df[col].astype(np.float64).round(RATING_DECIMALS) for col in cols}
+    )
+
+
+def memory_bytes_per_row(df: pd.DataFrame) -> float:
+    """Số byte bộ nhớ trung bình trên mỗi dòng (tính cả chuỗi Python)."""
+    if df.empty:
+        return 0.0
+    return df.memory_usage(deep=True).sum() / len(df)
@@ -1,6 +1,27 @@
 import pandas as pd
 
+from src.utils.metrics_utils import timed
 
+# Cột điểm đón/trả -> cột địa chỉ gốc (chỉ có khi clean_vexere(keep_address=True))
+ADDRESS_COLS = {"pickup_point": "pickup_address", "dropoff_point": "dropoff_address"}
+
+
+@timed("clean.extract_location_address")
+def extract_location_address(
+    df: pd.DataFrame, col: str, address_col: str
+) -> pd.DataFrame:
+    """
+    Giữ địa chỉ gốc của điểm đón/trả (trước khi normalize_location_type gộp
+    về 3 loại) vào cột address_col, dùng làm khóa phân biệt các chuyến.
+
+    Ví dụ:
+        "• Bến xe Miền Đông - Quầy vé 37" -> "Bến xe Miền Đông - Quầy vé 37"
+    """
+    df[address_col] = df[col].str.lstrip("•").str.split().str.join(" ").fillna("")
+    return df
+
+
+@timed("clean.normalize_location_type")
 def normalize_location_type(df: pd.DataFrame, col: str) -> pd.DataFrame:
     """
     Chuẩn hóa loại địa điểm (ví dụ: 'Bến xe', 'Văn phòng', 'Other')
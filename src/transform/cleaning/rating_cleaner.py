@@ -1,6 +1,20 @@
 import pandas as pd
 
+from src.utils.metrics_utils import timed
 
+RENAME_RATING_COLS = {
+    # ratings
+    "An toàn": "rating_safety",
+    "Thông tin chính xác": "rating_info_accuracy",
+    "Thông tin đầy đủ": "rating_info_completeness",
+    "Thái độ nhân viên": "rating_staff_attitude",
+    "Tiện nghi & thoải mái": "rating_comfort",
+    "Chất lượng dịch vụ": "rating_service_quality",
+    "Đúng giờ": "rating_punctuality",
+}
+
+
+@timed("clean.extract_overall_and_num_reviews")
 def extract_overall_and_num_reviews(df: pd.DataFrame, col: str) -> pd.DataFrame:
     """
     Tách điểm trung bình và số lượt đánh giá từ cột 'bus_rating'.
@@ -24,23 +38,72 @@ def extract_overall_and_num_reviews(df: pd.DataFrame, col: str) -> pd.DataFrame:
     return df
 
 
-def fill_na_rating_cols(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+@timed("clean.fill_na_rating_cols")
+def fill_na_rating_cols(
+    df: pd.DataFrame, cols: list[str], medians: dict[str, float] | None = None
+) -> pd.DataFrame:
+    """
+    Điền giá trị thiếu của các cột rating bằng median.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame chứa dữ liệu cần xử lý.
+        cols (list[str]): Danh sách cột rating.
+        medians (dict | None): Median tính sẵn cho từng cột (ví dụ median toàn cục
+            khi làm sạch theo chunk). Mặc định tính median trên chính df.
+
+    Returns:
+        pd.DataFrame: DataFrame đã điền giá trị thiếu.
+    """
     for rate_tile in cols:
-        df[rate_tile].fillna(df[rate_tile].median(), inplace=True)
+        median = medians[rate_tile] if medians else df[rate_tile].median()
+        df[rate_tile] = df[rate_tile].fillna(median)
 
     return df
 
 
-def rename_rating_title(df: pd.DataFrame) -> pd.DataFrame:
-    RENAME_RATING_COLS = {
-        # ratings
-        "An toàn": "rating_safety",
-        "Thông tin chính xác": "rating_info_accuracy",
-        "Thông tin đầy đủ": "rating_info_completeness",
-        "Thái độ nhân viên": "rating_staff_attitude",
-        "Tiện nghi & thoải mái": "rating_comfort",
-        "Chất lượng dịch vụ": "rating_service_quality",
-        "Đúng giờ": "rating_punctuality",
-    }
+def rating_value_counts(df: pd.DataFrame, cols: list[str]) -> dict[str, pd.Series]:
+    """
+    Đếm tần suất từng giá trị rating (bỏ NaN) của mỗi cột.
+
+    Rating là số rời rạc (thang 0–5, 1 chữ số thập phân) nên bảng tần suất
+    rất nhỏ, cộng dồn được giữa các chunk và cho ra median chính xác.
+    """
+    return {col: df[col].dropna().value_counts() for col in cols}
 
+
+def merge_value_counts(
+    total: dict[str, pd.Series], part: dict[str, pd.Series]
+) -> dict[str, pd.Series]:
+    """Cộng dồn bảng tần suất của một chunk vào bảng tổng."""
+    for col, counts in part.items():
+        if col in total:
+            total[col] = total[col].add(counts, fill_value=0)
+        else:
+            total[col] = counts
+    return total
+
+
+def median_from_value_counts(counts: pd.Series) -> float:
+    """
+    Tính median từ bảng tần suất, cho kết quả giống Series.median().
+
+    Ví dụ:
+        {4.5: 1, 4.7: 2, 4.9: 1} -> 4.7
+    """
+    counts = counts[counts > 0].sort_index()
+    n = int(counts.sum())
+    if n == 0:
+        return float("nan")
+
+    cum = counts.cumsum().to_numpy()
+    values = counts.index.to_numpy(dtype=float)
+
+    # vị trí (0-based) của phần tử giữa
+    lower = values[(cum > (n - 1) // 2).argmax()]
+    upper = values[(cum > n // 2).argmax()]
+    return float((lower + upper) / 2)
+
+
+@timed("clean.rename_rating_title")
+def rename_rating_title(df: pd.DataFrame) -> pd.DataFrame:
     return df.rename(columns=RENAME_RATING_COLS)
@@ -1,6 +1,9 @@
 import pandas as pd
 
+from src.utils.metrics_utils import timed
 
+
+@timed("clean.normalize_fare_values")
 def normalize_fare_values(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
     """
     Chuẩn hoá giá vé về dạng số nguyên (VND).
@@ -30,6 +33,7 @@ def normalize_fare_values(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
     return df
 
 
+@timed("clean.normalize_time_format")
 def normalize_time_format(df: pd.DataFrame, col: str) -> pd.DataFrame:
     """
     Chuyển đổi cột thời gian từ chuỗi (string) sang kiểu datetime.time.
@@ -50,6 +54,7 @@ def normalize_time_format(df: pd.DataFrame, col: str) -> pd.DataFrame:
     return df
 
 
+@timed("clean.normalize_date_format")
 def normalize_date_format(df: pd.DataFrame, col: str) -> pd.DataFrame:
     """
     Chuẩn hóa cột ngày tháng từ chuỗi sang định dạng 'YYYY-MM-DD'.
@@ -72,6 +77,7 @@ def normalize_date_format(df: pd.DataFrame, col: str) -> pd.DataFrame:
     return df
 
 
+@timed("clean.convert_duration_to_minutes")
 def convert_duration_to_minutes(df: pd.DataFrame, col: str) -> pd.DataFrame:
     """
     Chuẩn hóa cột thời lượng di chuyển sang tổng số phút (int).
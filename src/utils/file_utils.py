@@ -22,12 +22,22 @@ def read_csv(file_path: str) -> pd.DataFrame:
     return data
 
 
+import re
 import pandas as pd
 from pathlib import Path
-from datetime import date
+from datetime import date, datetime, timedelta
+from pandas.api.types import union_categoricals
+
+from src.transform.cleaning.dtype_cleaner import CATEGORY_COLS, apply_dtype_policy
 
 # ====== CONFIG ======
 BASE_PATH = Path("data")
+# data/raw/2025_11_12_raw.csv, data/processed/2025_11_12_cleaned.csv
+STAGE_SUFFIX = {"raw": "raw", "processed": "cleaned"}
+# main.py crawl trước DAYSOFF ngày -> ngày crawl = ngày trong tên file - DAYSOFF
+DAYSOFF = 2
+# Lần crawl với offset khác DAYSOFF: 2025_11_20_d5_cleaned.csv
+_OFFSET_RE = re.compile(r"\d{4}_\d{2}_\d{2}_d(\d+)_")
 
 
 def get_today_str() -> str:
@@ -59,6 +69,106 @@ def read_df(stage: str, name: str = "trips", day: str = None) -> pd.DataFrame:
     return df
 
 
+def read_processed_csv(file_path: str | Path) -> pd.DataFrame:
+    """
+    Đọc file CSV đã làm sạch theo dtype policy (category, int32/int16, float32)
+    để giảm bộ nhớ so với pd.read_csv mặc định.
+    """
+    df = pd.read_csv(
+        file_path, encoding="utf-8", dtype={col: "category" for col in CATEGORY_COLS}
+    )
+    return apply_dtype_policy(df)
+
+
+def concat_processed(dfs: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Ghép nhiều DataFrame đã áp dtype policy mà không làm rơi cột category
+    về object (pd.concat chỉ giữ category khi các file có cùng categories).
+    """
+    if not dfs:
+        return pd.DataFrame()
+
+    cat_cols = [
+        col
+        for col in dfs[0].columns
+        if isinstance(dfs[0][col].dtype, pd.CategoricalDtype)
+    ]
+    for col in cat_cols:
+        categories = union_categoricals(
+            [df[col] for df in dfs], ignore_order=True
+        ).categories
+        for df in dfs:
+            df[col] = df[col].cat.set_categories(categories)
+
+    return pd.concat(dfs, ignore_index=True)
+
+
+def read_processed_history(folder: str | Path = "data/processed") -> pd.DataFrame:
+    """Đọc toàn bộ lịch sử file *_cleaned.csv theo dtype policy."""
+    files = sorted(Path(folder).glob("*_cleaned.csv"))
+    return concat_processed([read_processed_csv(f) for f in files])
+
+
+def day_file_path(stage: str, day: date, base_path: Path = BASE_PATH) -> Path:
+    """
+    Đường dẫn file CSV của một ngày theo quy ước của main.py.
+
+    Ví dụ:
+        ("raw", 2025-11-12)       -> data/raw/2025_11_12_raw.csv
+        ("processed", 2025-11-12) -> data/processed/2025_11_12_cleaned.csv
+    """
+    return Path(base_path) / stage / f"{day:%Y_%m_%d}_{STAGE_SUFFIX[stage]}.csv"
+
+
+def stage_file_path(file_path: str | Path, stage: str) -> Path:
+    """
+    File cùng lần crawl ở stage khác (thư mục <base>/<stage>).
+
+    Ví dụ:
+        (data/processed/2025_11_23_d5_cleaned.csv, "raw") -> data/raw/2025_11_23_d5_raw.csv
+    """
+    path = Path(file_path)
+    name = path.name.rsplit("_", 1)[0]
+    return path.parent.parent / stage / f"{name}_{STAGE_SUFFIX[stage]}.csv"
+
+
+def day_from_file_path(file_path: str | Path) -> date:
+    """Lấy ngày (ngày đi) từ tên file dạng YYYY_MM_DD_<stage>.csv."""
+    return datetime.strptime(Path(file_path).name[:10], "%Y_%m_%d").date()
+
+
+def crawl_file_name(
+    departure_day: date, days_offset: int, daysoff: int = DAYSOFF
+) -> str:
+    """
+    Tên file (không có hậu tố stage) của một lần crawl ngày đi departure_day,
+    crawl trước days_offset ngày. Lần crawl mặc định của main.py (days_offset =
+    DAYSOFF) giữ tên cũ; offset khác (CRAWL_BUDGET) có thêm _d<offset> để không
+    ghi đè file của ngày crawl khác và ngày crawl vẫn suy ra được từ tên file.
+
+    Ví dụ:
+        (2025-11-23, 2) -> "2025_11_23"
+        (2025-11-23, 5) -> "2025_11_23_d5"
+    """
+    if days_offset == daysoff:
+        return f"{departure_day:%Y_%m_%d}"
+    return f"{departure_day:%Y_%m_%d}_d{days_offset}"
+
+
+def crawl_date_from_file_path(file_path: str | Path, daysoff: int = DAYSOFF) -> date:
+    """
+    Ngày crawl của file: ngày đi trong tên file - days_offset (_d<offset>,
+    mặc định DAYSOFF).
+
+    Ví dụ:
+        2025_11_23_cleaned.csv    -> 2025-11-21
+        2025_11_23_d5_cleaned.csv -> 2025-11-18
+    """
+    match = _OFFSET_RE.match(Path(file_path).name)
+    offset = int(match.group(1)) if match else daysoff
+    return day_from_file_path(file_path) - timedelta(days=offset)
+
+
 def list_files(stage: str) -> list[Path]:
     """
     Liệt kê tất cả file trong một stage (raw/interim/processed)
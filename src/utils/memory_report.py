@@ -0,0 +1,62 @@
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+from src.transform.cleaning.dtype_cleaner import memory_bytes_per_row
+from src.utils.file_utils import read_processed_history
+from src.utils.log_utils import log
+
+
+def build_memory_report(folder: str = "data/processed") -> pd.DataFrame:
+    """
+    So sánh bộ nhớ (byte/dòng) của toàn bộ lịch sử data/processed
+    khi đọc bằng pd.read_csv mặc định và khi đọc theo dtype policy.
+    """
+    files = sorted(Path(folder).glob("*_cleaned.csv"))
+    if not files:
+        log(f"Không tìm thấy file *_cleaned.csv trong {folder}")
+        return pd.DataFrame()
+
+    before = pd.concat([pd.read_csv(f) for f in files], ignore_index=True)
+    after = read_processed_history(folder)
+
+    rows = []
+    for col in before.columns:
+        rows.append(
+            {
+                "column": col,
+                "dtype_before": str(before[col].dtype),
+                "dtype_after": str(after[col].dtype),
+                "bytes_per_row_before": before[col].memory_usage(deep=True)
+                / len(before),
+                "bytes_per_row_after": after[col].memory_usage(deep=True) / len(after),
+            }
+        )
+    rows.append(
+        {
+            "column": "TOTAL",
+            "dtype_before": "",
+            "dtype_after": "",
+            "bytes_per_row_before": memory_bytes_per_row(before),
+            "bytes_per_row_after": memory_bytes_per_row(after),
+        }
+    )
+
+    report = pd.DataFrame(rows)
+    report["saving_pct"] = (
+        1 - report["bytes_per_row_after"] / report["bytes_per_row_before"]
+    ) * 100
+    log(f"Memory report: {len(files)} files, {len(before)} rows")
+    return report.round(2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Báo cáo bộ nhớ trước/sau khi áp dtype policy"
+    )
+    parser.add_argument("--folder", default="data/processed")
+    args = parser.parse_args()
+
+    with pd.option_context("display.width", 200, "display.max_rows", 100):
+        print(build_memory_report(args.folder).to_string(index=False))
@@ -0,0 +1,414 @@
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource  # Linux / macOS
+except ImportError:  # Windows
+    resource = None
+
+
+# ====================================
+#           RSS
+# ====================================
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):  # Windows
+    _PAGE_SIZE = None
+
+
+def current_rss_bytes() -> int | None:
+    """RSS hiện tại của process (byte), None nếu không đo được."""
+    if _PAGE_SIZE is not None:
+        try:
+            with open("/proc/self/statm", "rb") as f:
+                return int(f.read().split()[1]) * _PAGE_SIZE
+        except OSError:  # macOS không có /proc
+            pass
+
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+def peak_rss_bytes() -> int | None:
+    """
+    Peak RSS từ lúc process khởi động (byte), None nếu không đo được.
+    Không gắn được cho một stage: peak của từng span do _RssSampler đo.
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux trả về KB, macOS trả về byte
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    except ImportError:
+        return None
+
+
+class _RssSampler:
+    """
+    Một thread daemon dùng chung cho cả process: khi còn span đang mở, cứ
+    interval_s lại đọc RSS và nâng peak của mọi span đang mở, để bắt được
+    đỉnh bộ nhớ tạm thời giữa lúc bắt đầu và kết thúc span. Không có span
+    nào mở thì thread ngủ (không tốn CPU).
+    """
+
+    def __init__(self, interval_s: float = 0.01):
+        self.interval_s = interval_s
+        self._lock = threading.Lock()
+        self._active: set = set()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, s: "span"):
+        with self._lock:
+            self._active.add(s)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="rss-sampler", daemon=True
+                )
+                self._thread.start()
+        self._wake.set()
+
+    def remove(self, s: "span"):
+        with self._lock:
+            self._active.discard(s)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._active
+                if idle:
+                    self._wake.clear()
+            if idle:
+                self._wake.wait()
+                continue
+            rss = current_rss_bytes()
+            if rss is None:
+                return
+            with self._lock:
+                for s in self._active:
+                    s.observe_rss(rss)
+            time.sleep(self.interval_s)
+
+
+_RSS_SAMPLER = _RssSampler()
+
+
+def count_rows(obj) -> int | None:
+    """Số dòng của DataFrame/Series/list, None nếu không phải dữ liệu dạng bảng."""
+    if isinstance(obj, (pd.DataFrame, pd.Series, list)):
+        return len(obj)
+    return None
+
+
+# ====================================
+#           RUN REPORT
+# ====================================
+class RunReport:
+    """
+    Gom số liệu của các span (gộp theo tên) trong một lần chạy pipeline.
+
+    Mỗi span ghi: số lần gọi, wall time, CPU time của thread chạy span, peak
+    RSS trong lúc span chạy và mức tăng của peak đó so với lúc bắt đầu span
+    (lấy lớn nhất qua các lần gọi), số dòng vào/ra và số lần lỗi. Peak RSS
+    của cả process nằm ở mức report (process_peak_rss_bytes).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = datetime.now().isoformat(timespec="seconds")
+            self.spans: dict[str, dict] = {}
+            self.stats: dict[str, dict] = {}
+            self.references: dict[str, str] = {}
+
+    def record(
+        self,
+        name: str,
+        wall_s: float,
+        cpu_s: float,
+        peak_rss: int | None = None,
+        peak_rss_delta: int | None = None,
+        rows_in: int | None = None,
+        rows_out: int | None = None,
+        error: bool = False,
+    ):
+        with self._lock:
+            entry = self.spans.setdefault(
+                name,
+                {
+                    "calls": 0,
+                    "errors": 0,
+                    "wall_s": 0.0,
+                    "cpu_s": 0.0,
+                    "peak_rss_bytes": None,
+                    "peak_rss_delta_bytes": None,
+                    "rows_in": 0,
+                    "rows_out": 0,
+                },
+            )
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["wall_s"] += wall_s
+            entry["cpu_s"] += cpu_s
+            entry["rows_in"] += rows_in or 0
+            entry["rows_out"] += rows_out or 0
+            _keep_max(entry, "peak_rss_bytes", peak_rss)
+            _keep_max(entry, "peak_rss_delta_bytes", peak_rss_delta)
+
+    def add_stats(self, name: str, **values):
+        """Cộng dồn số liệu đếm tự do (ví dụ thống kê retry theo tuyến)."""
+        with self._lock:
+            entry = self.stats.setdefault(name, {})
+            for key, value in values.items():
+                entry[key] = entry.get(key, 0) + value
+
+    def set_reference(self, name: str, digest: str):
+        """Ghi phiên bản (hash) của file tham chiếu đã dùng, vd. index tên nhà xe."""
+        with self._lock:
+            self.references[name] = digest
+
+    def merge(self, other: dict):
+        """Gộp report (dạng to_dict) từ process con vào report hiện tại."""
+        with self._lock:
+            for name, entry in other.get("spans", {}).items():
+                mine = self.spans.get(name)
+                if mine is None:
+                    self.spans[name] = dict(entry)
+                    continue
+                for key in (
+                    "calls",
+                    "errors",
+                    "wall_s",
+                    "cpu_s",
+                    "rows_in",
+                    "rows_out",
+                ):
+                    mine[key] += entry[key]
+                _keep_max(mine, "peak_rss_bytes", entry.get("peak_rss_bytes"))
+                _keep_max(
+                    mine, "peak_rss_delta_bytes", entry.get("peak_rss_delta_bytes")
+                )
+        for name, values in other.get("stats", {}).items():
+            self.add_stats(name, **values)
+        for name, digest in other.get("references", {}).items():
+            self.set_reference(name, digest)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+                "process_peak_rss_bytes": peak_rss_bytes(),
+                "spans": {name: dict(entry) for name, entry in self.spans.items()},
+                "stats": {name: dict(entry) for name, entry in self.stats.items()},
+                "references": dict(self.references),
+            }
+
+    # ---------- OUTPUT ----------
+    def write_json(self, file_path: str):
+        """Ghi report dạng JSON (máy đọc được)."""
+        _atomic_write(
+            file_path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        )
+        print(f"- Đã lưu run report vào {file_path}")
+
+    def write_prometheus(self, file_path: str, prefix: str = "vexere_etl"):
+        """Ghi report theo Prometheus textfile format (node_exporter textfile collector)."""
+        report = self.to_dict()
+        metrics = [
+            ("calls", "calls_total", "counter", "Số lần chạy stage"),
+            ("errors", "errors_total", "counter", "Số lần stage lỗi"),
+            ("wall_s", "wall_seconds_total", "counter", "Tổng wall time của stage"),
+            (
+                "cpu_s",
+                "cpu_seconds_total",
+                "counter",
+                "Tổng CPU time (thread chạy stage) của stage",
+            ),
+            ("rows_in", "rows_in_total", "counter", "Tổng số dòng vào stage"),
+            ("rows_out", "rows_out_total", "counter", "Tổng số dòng ra khỏi stage"),
+            (
+                "peak_rss_bytes",
+                "peak_rss_bytes",
+                "gauge",
+                "Peak RSS của process trong lúc stage chạy",
+            ),
+            (
+                "peak_rss_delta_bytes",
+                "peak_rss_delta_bytes",
+                "gauge",
+                "Peak RSS trong stage trừ RSS lúc bắt đầu (lớn nhất qua các lần chạy)",
+            ),
+        ]
+
+        lines = []
+        for key, metric, metric_type, help_text in metrics:
+            lines.append(f"# HELP {prefix}_stage_{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}_stage_{metric} {metric_type}")
+            for name, entry in sorted(report["spans"].items()):
+                if entry.get(key) is None:
+                    continue
+                lines.append(
+                    f"{prefix}_stage_{metric}{{stage={_label(name)}}} {entry[key]}"
+                )
+
+        # stats: mỗi key là một metric, mỗi mục (vd. tuyến) là một nhãn name
+        stats: dict[str, list[tuple[str, float]]] = {}
+        for name, values in sorted(report["stats"].items()):
+            for key, value in values.items():
+                stats.setdefault(_metric_name(key), []).append((name, value))
+        for key, samples in sorted(stats.items()):
+            lines.append(f"# HELP {prefix}_{key} Số liệu đếm '{key}' của lần chạy")
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            for name, value in samples:
+                lines.append(f"{prefix}_{key}{{name={_label(name)}}} {value}")
+
+        if report["process_peak_rss_bytes"] is not None:
+            lines.append(
+                f"# HELP {prefix}_process_peak_rss_bytes Peak RSS của cả process"
+            )
+            lines.append(f"# TYPE {prefix}_process_peak_rss_bytes gauge")
+            lines.append(
+                f"{prefix}_process_peak_rss_bytes {report['process_peak_rss_bytes']}"
+            )
+        lines.append(f"# HELP {prefix}_last_run_timestamp_seconds Thời điểm ghi report")
+        lines.append(f"# TYPE {prefix}_last_run_timestamp_seconds gauge")
+        lines.append(f"{prefix}_last_run_timestamp_seconds {time.time():.0f}")
+        _atomic_write(file_path, "\n".join(lines) + "\n")
+        print(f"- Đã lưu Prometheus metrics vào {file_path}")
+
+
+def _label(value: str) -> str:
+    """Giá trị nhãn Prometheus trong ngoặc kép (escape \\, " và xuống dòng)."""
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def _metric_name(key: str) -> str:
+    """Tên metric hợp lệ (chỉ [a-zA-Z0-9_]) từ key của stats."""
+    return re.sub(r"[^a-zA-Z0-9_]", "_", key)
+
+
+def _keep_max(entry: dict, key: str, value: int | None):
+    if value is not None:
+        entry[key] = value if entry.get(key) is None else max(entry[key], value)
+
+
+def _atomic_write(file_path: str, content: str):
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, file_path)
+
+
+# Report mặc định cho cả process
+RUN_REPORT = RunReport()
+REPORT_DIR = "data/reports"
+
+
+def write_run_report(run_name: str, report_dir: str = REPORT_DIR) -> dict:
+    """
+    Ghi RUN_REPORT ra <report_dir>/<run_name>_run.json và
+    <report_dir>/vexere_etl.prom (file textfile collector, ghi đè mỗi lần chạy).
+    """
+    RUN_REPORT.write_json(os.path.join(report_dir, f"{run_name}_run.json"))
+    RUN_REPORT.write_prometheus(os.path.join(report_dir, "vexere_etl.prom"))
+    return RUN_REPORT.to_dict()
+
+
+# ====================================
+#           SPAN & DECORATOR
+# ====================================
+class span:
+    """
+    Context manager đo wall time, CPU time (time.thread_time: chỉ thread chạy
+    span, không lẫn CPU của stage khác chạy song song trên thread khác), peak
+    RSS trong lúc chạy (lấy mẫu bởi _RssSampler) và số dòng của một đoạn code.
+
+    Ví dụ:
+        with span("load.batch", rows_in=len(batch)) as s:
+            ...
+            s.rows_out = inserted
+    """
+
+    def __init__(self, name: str, rows_in: int | None = None, report: RunReport = None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.report = report or RUN_REPORT
+
+    def observe_rss(self, rss: int | None):
+        if rss is not None:
+            self._peak_rss = rss if self._peak_rss is None else max(self._peak_rss, rss)
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        self._start_rss = self._peak_rss = current_rss_bytes()
+        if self._start_rss is not None:
+            _RSS_SAMPLER.add(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _RSS_SAMPLER.remove(self)
+        self.observe_rss(current_rss_bytes())
+        peak, start = self._peak_rss, self._start_rss
+        self.report.record(
+            self.name,
+            wall_s=time.perf_counter() - self._wall,
+            cpu_s=time.thread_time() - self._cpu,
+            peak_rss=peak,
+            peak_rss_delta=None if peak is None or start is None else peak - start,
+            rows_in=self.rows_in,
+            rows_out=self.rows_out,
+            error=exc_type is not None,
+        )
+        return False
+
+
+def timed(name: str):
+    """
+    Decorator bọc hàm trong một span.
+
+    rows_in lấy từ DataFrame (hoặc list) đầu tiên trong tham số,
+    rows_out lấy từ giá trị trả về nếu là DataFrame.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows_in = None
+            for arg in (*args, *kwargs.values()):
+                rows_in = count_rows(arg)
+                if rows_in is not None:
+                    break
+
+            with span(name, rows_in=rows_in) as s:
+                result = func(*args, **kwargs)
+                s.rows_out = count_rows(result)
+            return result
+
+        return wrapper
+
+    return decorator